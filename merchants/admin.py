@@ -1,21 +1,81 @@
 """
 Admin configuration for merchant KYB.
 """
+import json
+
+from django import forms
 from django.contrib import admin
 from django.utils import timezone
 from django.utils.html import format_html
 from django.contrib import messages
 
-from .models import Merchant, BeneficialOwner, Document, RiskAssessment
+from .forms import MerchantRegistrationForm
+from .models import (
+    REVIEW_STATUSES, Merchant, BeneficialOwner, CorporateEntity, Document, EntityOwnership, ReviewDecision,
+    RiskAssessment, RiskRuleSet, normalize_registration_number,
+)
+from .review_queue import decide_cases
+from .risk_engine import validate_rules
+from .ubo import resolve_entity_owners
 from screening.models import ScreeningResult
 
 
+class MerchantAdminForm(forms.ModelForm):
+    """Merchant form that reports a clashing registration number instead of failing on save."""
+
+    class Meta:
+        model = Merchant
+        fields = '__all__'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        number = cleaned_data.get('registration_number')
+        if number and 'registration_number' not in self.errors:
+            normalized = normalize_registration_number(number, cleaned_data.get('country'))
+            if Merchant.objects.filter(registration_number_normalized=normalized).exclude(pk=self.instance.pk).exists():
+                self.add_error('registration_number', MerchantRegistrationForm.DUPLICATE_REGISTRATION_NUMBER)
+        return cleaned_data
+
+
+class BeneficialOwnerAdminForm(forms.ModelForm):
+    """Owner form where identity fields are only required for natural persons."""
+
+    PERSON_FIELDS = ('full_name', 'nationality', 'id_document_type', 'id_document_number')
+
+    class Meta:
+        model = BeneficialOwner
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in self.PERSON_FIELDS:
+            if name in self.fields:
+                self.fields[name].required = False
+
+    def clean(self):
+        cleaned_data = super().clean()
+        entity = cleaned_data.get('corporate_entity')
+        if entity is not None:
+            cleaned_data['full_name'] = cleaned_data.get('full_name') or entity.name
+            cleaned_data['nationality'] = cleaned_data.get('nationality') or entity.country
+        else:
+            for name in self.PERSON_FIELDS:
+                if name in self.fields and not cleaned_data.get(name) and name not in self.errors:
+                    self.add_error(name, 'This field is required for a natural person.')
+        return cleaned_data
+
+
 class BeneficialOwnerInline(admin.TabularInline):
     """Inline admin for beneficial owners."""
     model = BeneficialOwner
+    form = BeneficialOwnerAdminForm
     extra = 0
     readonly_fields = ('created_at',)
-    fields = ('full_name', 'nationality', 'ownership_percentage', 'id_document_type', 'id_document_number', 'is_pep')
+    raw_id_fields = ('corporate_entity',)
+    fields = (
+        'corporate_entity', 'full_name', 'nationality', 'ownership_percentage',
+        'id_document_type', 'id_document_number', 'is_pep',
+    )
 
 
 class DocumentInline(admin.TabularInline):
@@ -30,7 +90,18 @@ class ScreeningResultInline(admin.TabularInline):
     """Inline admin for screening results."""
     model = ScreeningResult
     extra = 0
-    readonly_fields = ('screening_type', 'status', 'matched_list', 'match_details', 'screened_at')
+    readonly_fields = ('run', 'screening_type', 'status', 'matched_list', 'match_details', 'screened_at')
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class ReviewDecisionInline(admin.TabularInline):
+    """Inline admin for the audit trail of officer decisions."""
+    model = ReviewDecision
+    extra = 0
+    readonly_fields = ('previous_status', 'status', 'decided_by', 'decided_at', 'notes')
     can_delete = False
 
     def has_add_permission(self, request, obj=None):
@@ -41,7 +112,7 @@ class RiskAssessmentInline(admin.TabularInline):
     """Inline admin for risk assessments."""
     model = RiskAssessment
     extra = 0
-    readonly_fields = ('risk_score', 'risk_factors', 'assessment_date', 'assessed_by', 'assessor_user')
+    readonly_fields = ('risk_score', 'risk_factors', 'assessment_date', 'assessed_by', 'assessor_user', 'rule_version')
     can_delete = False
 
     def has_add_permission(self, request, obj=None):
@@ -51,6 +122,7 @@ class RiskAssessmentInline(admin.TabularInline):
 @admin.register(Merchant)
 class MerchantAdmin(admin.ModelAdmin):
     """Admin for merchants with approval workflow."""
+    form = MerchantAdminForm
 
     list_display = (
         'business_name',
@@ -59,12 +131,17 @@ class MerchantAdmin(admin.ModelAdmin):
         'business_category',
         'risk_level_display',
         'status_display',
+        'screening_status_display',
         'created_at',
     )
 
-    list_filter = ('status', 'risk_level', 'country', 'business_category')
+    list_filter = ('status', 'risk_level', 'screening_status', 'country', 'business_category')
     search_fields = ('business_name', 'registration_number', 'email')
-    readonly_fields = ('created_at', 'updated_at', 'reviewed_by', 'review_date')
+    readonly_fields = (
+        'screening_status', 'owner_count', 'minority_owner_count', 'pep_owner_count', 'link_cluster',
+        'review_flags_display', 'created_at', 'updated_at', 'reviewed_by', 'review_date', 'risk_score',
+        'claimed_by', 'claimed_until',
+    )
 
     fieldsets = (
         ('Business Information', {
@@ -74,10 +151,15 @@ class MerchantAdmin(admin.ModelAdmin):
             'fields': ('email', 'phone', 'address')
         }),
         ('Risk & Status', {
-            'fields': ('risk_level', 'status')
+            'fields': (
+                'risk_level', 'risk_score', 'status', 'screening_status', 'owner_count', 'minority_owner_count',
+                'pep_owner_count', 'link_cluster',
+            )
         }),
         ('Review Information', {
-            'fields': ('review_notes', 'reviewed_by', 'review_date'),
+            'fields': (
+                'review_flags_display', 'review_notes', 'reviewed_by', 'review_date', 'claimed_by', 'claimed_until',
+            ),
             'classes': ('collapse',)
         }),
         ('Audit Information', {
@@ -86,7 +168,9 @@ class MerchantAdmin(admin.ModelAdmin):
         }),
     )
 
-    inlines = [BeneficialOwnerInline, DocumentInline, ScreeningResultInline, RiskAssessmentInline]
+    inlines = [
+        BeneficialOwnerInline, DocumentInline, ScreeningResultInline, RiskAssessmentInline, ReviewDecisionInline,
+    ]
 
     actions = ['approve_merchants', 'reject_merchants', 'mark_under_review']
 
@@ -123,17 +207,40 @@ class MerchantAdmin(admin.ModelAdmin):
     status_display.short_description = 'Status'
     status_display.admin_order_field = 'status'
 
-    def approve_merchants(self, request, queryset):
-        """Bulk approve selected merchants."""
-        count = 0
-        for merchant in queryset:
-            if merchant.status in ['PENDING', 'UNDER_REVIEW']:
-                merchant.status = 'APPROVED'
-                merchant.reviewed_by = request.user
-                merchant.review_date = timezone.now()
-                merchant.save()
-                count += 1
+    def screening_status_display(self, obj):
+        """Display screening status with color coding."""
+        colors = {
+            'CLEAR': 'green',
+            'POTENTIAL_MATCH': 'orange',
+            'MATCH': 'red',
+        }
+        color = colors.get(obj.screening_status, 'gray')
+        return format_html(
+            '<span style="color: {}; font-weight: bold;">{}</span>',
+            color,
+            obj.get_screening_status_display()
+        )
+    screening_status_display.short_description = 'Screening'
+    screening_status_display.admin_order_field = 'screening_status'
+
+    def review_flags_display(self, obj):
+        """List similar earlier merchants found at registration."""
+        flags = [flag for flag in obj.review_flags if flag.get('type') == 'SIMILAR_MERCHANT']
+        if not flags:
+            return '-'
+        return format_html(
+            '<pre>{}</pre>',
+            '\n'.join(
+                f"{flag['business_name']} ({flag['registration_number']}, {flag['status']}): "
+                f"{flag['similarity']:.0%} similar"
+                for flag in flags
+            ),
+        )
+    review_flags_display.short_description = 'Similar merchants'
 
+    def approve_merchants(self, request, queryset):
+        """Bulk approve selected merchants awaiting review."""
+        count = len(decide_cases(queryset, 'APPROVED', request.user))
         self.message_user(
             request,
             f'{count} merchant(s) approved successfully.',
@@ -142,16 +249,8 @@ class MerchantAdmin(admin.ModelAdmin):
     approve_merchants.short_description = 'Approve selected merchants'
 
     def reject_merchants(self, request, queryset):
-        """Bulk reject selected merchants."""
-        count = 0
-        for merchant in queryset:
-            if merchant.status in ['PENDING', 'UNDER_REVIEW']:
-                merchant.status = 'REJECTED'
-                merchant.reviewed_by = request.user
-                merchant.review_date = timezone.now()
-                merchant.save()
-                count += 1
-
+        """Bulk reject selected merchants awaiting review."""
+        count = len(decide_cases(queryset, 'REJECTED', request.user))
         self.message_user(
             request,
             f'{count} merchant(s) rejected.',
@@ -170,19 +269,68 @@ class MerchantAdmin(admin.ModelAdmin):
     mark_under_review.short_description = 'Mark for review'
 
     def save_model(self, request, obj, form, change):
-        """Track who reviewed the merchant."""
-        if change and 'status' in form.changed_data:
+        """Track who reviewed the merchant, releasing its review queue claim once decided."""
+        status_changed = change and 'status' in form.changed_data
+        if status_changed:
             obj.reviewed_by = request.user
             obj.review_date = timezone.now()
+            if obj.status not in REVIEW_STATUSES:
+                obj.claimed_by = obj.claimed_until = None
         super().save_model(request, obj, form, change)
+        if status_changed:
+            ReviewDecision.objects.create(
+                merchant=obj, previous_status=form.initial['status'], status=obj.status, decided_by=request.user,
+                decided_at=obj.review_date, notes=obj.review_notes,
+            )
 
 
 @admin.register(BeneficialOwner)
 class BeneficialOwnerAdmin(admin.ModelAdmin):
     """Admin for beneficial owners."""
-    list_display = ('full_name', 'merchant', 'ownership_percentage', 'is_pep')
+    form = BeneficialOwnerAdminForm
+    list_display = ('full_name', 'merchant', 'ownership_percentage', 'corporate_entity', 'is_pep')
     list_filter = ('is_pep', 'nationality')
     search_fields = ('full_name', 'merchant__business_name')
+    raw_id_fields = ('merchant', 'corporate_entity')
+
+
+class EntityOwnershipInline(admin.TabularInline):
+    """Inline admin for the shareholders of a corporate entity."""
+    model = EntityOwnership
+    fk_name = 'entity'
+    extra = 0
+    raw_id_fields = ('owner_entity',)
+    fields = (
+        'owner_entity', 'full_name', 'nationality', 'ownership_percentage',
+        'id_document_type', 'id_document_number', 'is_pep',
+    )
+
+
+@admin.register(CorporateEntity)
+class CorporateEntityAdmin(admin.ModelAdmin):
+    """Admin for corporate shareholders and their ownership chains."""
+    list_display = ('name', 'registration_number', 'country')
+    list_filter = ('country',)
+    search_fields = ('name', 'registration_number')
+    readonly_fields = ('ultimate_owners', 'created_at')
+    inlines = [EntityOwnershipInline]
+
+    def ultimate_owners(self, obj):
+        """Natural persons behind the entity, with effective ownership."""
+        if obj.pk is None:
+            return '-'
+        owners = sorted(resolve_entity_owners(obj.pk), key=lambda owner: -owner.share)
+        if not owners:
+            return 'No natural-person owners resolved'
+        return format_html(
+            '<pre>{}</pre>',
+            '\n'.join(
+                f"{owner.full_name}: {owner.ownership_percentage}%"
+                + (f" via {' > '.join(owner.via)}" if owner.via else '')
+                for owner in owners
+            ),
+        )
+    ultimate_owners.short_description = 'Ultimate beneficial owners'
 
 
 @admin.register(Document)
@@ -209,7 +357,53 @@ class DocumentAdmin(admin.ModelAdmin):
 @admin.register(RiskAssessment)
 class RiskAssessmentAdmin(admin.ModelAdmin):
     """Admin for risk assessments."""
-    list_display = ('merchant', 'risk_score', 'assessed_by', 'assessment_date')
-    list_filter = ('assessed_by',)
+    list_display = ('merchant', 'risk_score', 'assessed_by', 'rule_version', 'assessment_date')
+    list_filter = ('assessed_by', 'rule_version')
     search_fields = ('merchant__business_name',)
     readonly_fields = ('assessment_date',)
+
+
+class RiskRuleSetForm(forms.ModelForm):
+    """Validates rule definitions before they can be activated."""
+
+    class Meta:
+        model = RiskRuleSet
+        fields = ('version', 'rules', 'is_active', 'notes')
+
+    def clean_rules(self):
+        rules = self.cleaned_data.get('rules')
+        try:
+            validate_rules(rules)
+        except ValueError as exc:
+            raise forms.ValidationError(str(exc))
+        return rules
+
+
+@admin.register(RiskRuleSet)
+class RiskRuleSetAdmin(admin.ModelAdmin):
+    """Admin for versioned risk scoring rules."""
+    form = RiskRuleSetForm
+    list_display = ('version', 'is_active', 'created_by', 'created_at')
+    list_filter = ('is_active',)
+    readonly_fields = ('created_by', 'created_at', 'effective_rules')
+
+    def effective_rules(self, obj):
+        """Show the complete rule set after merging onto the built-in rules."""
+        try:
+            rules = validate_rules(obj.rules)
+        except ValueError as exc:
+            return f'Invalid: {exc}'
+        return format_html('<pre>{}</pre>', json.dumps(rules, indent=2, sort_keys=True))
+    effective_rules.short_description = 'Effective rules'
+
+    def get_readonly_fields(self, request, obj=None):
+        """Published versions are immutable apart from activation and notes."""
+        if obj is not None:
+            return ('version', 'rules') + self.readonly_fields
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        """Track who published the rule set."""
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
@@ -0,0 +1,141 @@
+"""
+JSON API for merchant registration and staff listings.
+"""
+import json
+from functools import wraps
+
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .forms import MerchantRegistrationForm
+from .idempotency import idempotent
+from .models import REVIEW_EVENT_FIELDS, REVIEW_QUEUE_ORDER, Merchant, review_summary
+from .pagination import CREATED_ORDER, UPDATED_ORDER, InvalidCursor, keyset_page
+from .registration import REGISTRATION_BATCH_LIMIT, register_merchants
+from .review_queue import review_queue
+
+LIST_PAGE_SIZE = 20
+LIST_PAGE_SIZE_LIMIT = 100
+LIST_ORDERINGS = {'created': CREATED_ORDER, 'updated': UPDATED_ORDER}
+
+
+def _json_body(request):
+    try:
+        return json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+@csrf_exempt
+@require_POST
+@idempotent('api_register_merchant')
+def register_merchant(request):
+    """Register one merchant from a JSON object; owners go in an 'owners' list."""
+    data = _json_body(request)
+    if not isinstance(data, dict):
+        return _error('Request body must be a JSON object.')
+
+    [registration] = register_merchants([data])
+    if registration.is_valid:
+        return JsonResponse(registration.result(), status=201)
+    duplicate = registration.errors.get('registration_number') == [MerchantRegistrationForm.DUPLICATE_REGISTRATION_NUMBER]
+    return JsonResponse(registration.result(), status=409 if duplicate else 400)
+
+
+@csrf_exempt
+@require_POST
+@idempotent('api_register_merchants_batch')
+def register_merchants_batch(request):
+    """
+    Register up to REGISTRATION_BATCH_LIMIT merchants from {"merchants": [...]}.
+
+    Responds with one result per item, in order; invalid items carry their
+    errors and do not prevent the others from registering.
+    """
+    data = _json_body(request)
+    items = data.get('merchants') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return _error('Request body must be a JSON object with a non-empty "merchants" list.')
+    if len(items) > REGISTRATION_BATCH_LIMIT:
+        return _error(f'At most {REGISTRATION_BATCH_LIMIT} merchants can be registered per request.')
+
+    registrations = register_merchants(items)
+    registered = sum(registration.is_valid for registration in registrations)
+    return JsonResponse({
+        'registered': registered,
+        'rejected': len(registrations) - registered,
+        'results': [registration.result() for registration in registrations],
+    })
+
+
+def _staff_only(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_staff:
+            return _error('Staff login required.', status=403)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _merchant_result(merchant):
+    result = review_summary({field: getattr(merchant, field) for field in REVIEW_EVENT_FIELDS})
+    result['risk_score'] = merchant.risk_score
+    result['updated_at'] = merchant.updated_at.isoformat()
+    return result
+
+
+def _page_response(request, queryset, ordering, result):
+    """A keyset page of queryset as {"results": [...], "next_cursor": ...}, per the cursor and limit parameters."""
+    try:
+        size = int(request.GET.get('limit', LIST_PAGE_SIZE))
+    except ValueError:
+        return _error('limit must be an integer.')
+    if not 1 <= size <= LIST_PAGE_SIZE_LIMIT:
+        return _error(f'limit must be between 1 and {LIST_PAGE_SIZE_LIMIT}.')
+    try:
+        page = keyset_page(queryset, ordering, request.GET.get('cursor'), size=size)
+    except InvalidCursor as exc:
+        return _error(str(exc))
+    return JsonResponse({'results': [result(item) for item in page.items], 'next_cursor': page.next_cursor})
+
+
+@require_GET
+@_staff_only
+def list_merchants(request):
+    """
+    Merchants newest first, or most recently updated first with sort=updated.
+
+    Optionally filtered by status. Paged by cursor: pass a response's
+    next_cursor as cursor for the next page.
+    """
+    ordering = LIST_ORDERINGS.get(request.GET.get('sort', 'created'))
+    if ordering is None:
+        return _error(f'sort must be one of {", ".join(LIST_ORDERINGS)}.')
+    merchants = Merchant.objects.all()
+    status = request.GET.get('status')
+    if status:
+        if status not in dict(Merchant.STATUS_CHOICES):
+            return _error(f"Unknown status '{status}'.")
+        merchants = merchants.filter(status=status)
+    return _page_response(request, merchants, ordering, _merchant_result)
+
+
+def _queue_result(merchant):
+    result = _merchant_result(merchant)
+    result['review_priority'] = merchant.review_priority
+    result['claimed_by'] = merchant.claimed_by.username if merchant.claimed_by else None
+    result['claimed_until'] = merchant.claimed_until.isoformat() if merchant.claimed_until else None
+    return result
+
+
+@require_GET
+@_staff_only
+def list_review_queue(request):
+    """The review queue in priority order, with each case's claim, paged by cursor."""
+    return _page_response(request, review_queue().select_related('claimed_by'), REVIEW_QUEUE_ORDER, _queue_result)
+
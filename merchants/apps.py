@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class MerchantsConfig(AppConfig):
+    name = 'merchants'
+
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
@@ -0,0 +1,62 @@
+"""
+Compliance dashboard statistics.
+
+Counts come from one aggregate query over merchants, or, with the
+DASHBOARD_COUNTERS setting on, from the DashboardCounter rows that merchant
+writes keep up to date, so the dashboard costs the same however many
+merchants there are. reconcile_counters recounts and corrects the rows.
+"""
+import logging
+
+from django.db import transaction
+
+from .models import DASHBOARD_STATS, DashboardCounter, Merchant, dashboard_counters_enabled
+
+logger = logging.getLogger(__name__)
+
+STAT_NAMES = ('total',) + tuple(DASHBOARD_STATS)
+
+
+def dashboard_stats():
+    """
+    Merchant total and counts per status and risk level.
+
+    Read from the counters when they are enabled and have been created,
+    otherwise aggregated from merchants.
+
+    Returns:
+        dict: Stat name -> count
+    """
+    if dashboard_counters_enabled():
+        counts = dict(DashboardCounter.objects.values_list('name', 'count'))
+        if all(name in counts for name in STAT_NAMES):
+            return {name: counts[name] for name in STAT_NAMES}
+        logger.warning("Dashboard counters enabled but not initialized; run reconcile_dashboard_counters")
+    return Merchant.objects.dashboard_stats()
+
+
+def reconcile_counters(dry_run=False):
+    """
+    Recount merchants and correct the dashboard counters, creating any missing.
+
+    The counter rows are locked first, so writers changing merchants
+    meanwhile apply their changes after the correction rather than being
+    overwritten by it.
+
+    Returns:
+        dict: Stat name -> (stored count or None, actual count) for each counter that drifted
+    """
+    with transaction.atomic():
+        stored = dict(DashboardCounter.objects.select_for_update().values_list('name', 'count'))
+        actual = Merchant.objects.dashboard_stats()
+        drift = {name: (stored.get(name), actual[name]) for name in STAT_NAMES if stored.get(name) != actual[name]}
+        if drift and not dry_run:
+            DashboardCounter.objects.bulk_create(
+                [DashboardCounter(name=name, count=actual[name]) for name in drift],
+                update_conflicts=True,
+                unique_fields=['name'],
+                update_fields=['count'],
+            )
+    if drift:
+        logger.warning(f"Dashboard counter drift{' (not corrected)' if dry_run else ' corrected'}: {drift}")
+    return drift
@@ -0,0 +1,145 @@
+"""
+In-process publish/subscribe for live dashboard updates.
+
+Merchant writes that change a status or risk level publish the dashboard
+counter changes, and merchants entering review publish their summary, once
+their transaction commits. Each open dashboard event stream holds a
+subscription and receives every message as a small server-sent event, so a
+change costs one message per open dashboard rather than a full recount.
+
+Messages only reach subscribers in the process that made the change. A
+subscriber that falls too far behind is marked stale and its stream resends
+a full snapshot instead of the messages it missed.
+"""
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Messages buffered per subscriber before it is marked stale
+SUBSCRIBER_BUFFER = 100
+# Seconds between keepalive comments on an idle stream
+EVENT_STREAM_KEEPALIVE_SECONDS = 15
+# Longest a stream stays open; the browser then reconnects and gets a fresh snapshot
+EVENT_STREAM_MAX_SECONDS = getattr(settings, 'DASHBOARD_EVENTS_MAX_SECONDS', 60)
+# Milliseconds the browser waits before reconnecting
+EVENT_STREAM_RETRY_MS = 3000
+
+
+class Subscription:
+    """One subscriber's buffered messages."""
+
+    def __init__(self, buffer=SUBSCRIBER_BUFFER):
+        self.messages = queue.Queue(maxsize=buffer)
+        self.stale = threading.Event()
+
+    def get(self, timeout=None):
+        """Next (event, data, id) message, or None if none arrives within timeout."""
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self):
+        """Discard buffered messages and clear the stale mark, e.g. before resending a snapshot."""
+        self.stale.clear()
+        while True:
+            try:
+                self.messages.get_nowait()
+            except queue.Empty:
+                return
+
+
+class Broker:
+    """Fans published messages out to every current subscription."""
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, buffer=SUBSCRIBER_BUFFER):
+        subscription = Subscription(buffer)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def has_subscribers(self):
+        return bool(self._subscriptions)
+
+    def publish(self, event, data):
+        """Send a JSON-serializable message to every subscriber without blocking."""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        message = (event, data, next(self._ids))
+        for subscription in subscriptions:
+            try:
+                subscription.messages.put_nowait(message)
+            except queue.Full:
+                if not subscription.stale.is_set():
+                    logger.warning("Dashboard event subscriber fell behind; it will be sent a snapshot")
+                subscription.stale.set()
+
+
+broker = Broker()
+
+
+def has_subscribers():
+    return broker.has_subscribers()
+
+
+def publish_on_commit(event, data, using=None):
+    """Publish once the current transaction commits, or at once outside one."""
+    transaction.on_commit(lambda: broker.publish(event, data), using=using)
+
+
+def format_event(event, data, event_id=None):
+    """A message in text/event-stream format."""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def event_stream(snapshot):
+    """
+    Yield dashboard messages as server-sent events until the stream's time is up.
+
+    Subscribes before taking the first snapshot, so no change falls between
+    the two, and sends another snapshot in place of the messages a stale
+    subscription missed.
+
+    Args:
+        snapshot: Callable returning the snapshot event's data
+    """
+    subscription = broker.subscribe()
+    try:
+        yield f"retry: {EVENT_STREAM_RETRY_MS}\n\n"
+        yield format_event('snapshot', snapshot())
+        deadline = time.monotonic() + EVENT_STREAM_MAX_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            message = subscription.get(timeout=min(EVENT_STREAM_KEEPALIVE_SECONDS, remaining))
+            if subscription.stale.is_set():
+                subscription.drain()
+                yield format_event('snapshot', snapshot())
+            elif message is not None:
+                yield format_event(*message)
+            else:
+                yield ": keepalive\n\n"
+    finally:
+        broker.unsubscribe(subscription)
@@ -3,7 +3,7 @@ Forms for merchant registration.
 """
 from django import forms
 from django.forms import inlineformset_factory
-from .models import Merchant, BeneficialOwner, Document
+from .models import Merchant, BeneficialOwner, Document, normalize_registration_number
 
 
 class MerchantRegistrationForm(forms.ModelForm):
@@ -46,11 +46,17 @@ class MerchantRegistrationForm(forms.ModelForm):
             }),
         }
 
+    DUPLICATE_REGISTRATION_NUMBER = 'A merchant with this registration number already exists.'
+
     def clean_registration_number(self):
-        """Validate registration number is unique."""
+        """Reject numbers with nothing but separators.
+
+        Uniqueness is enforced by the unique canonical registration number
+        when the merchant is saved, see register_merchant.
+        """
         reg_num = self.cleaned_data.get('registration_number')
-        if Merchant.objects.filter(registration_number=reg_num).exists():
-            raise forms.ValidationError('A merchant with this registration number already exists.')
+        if not normalize_registration_number(reg_num):
+            raise forms.ValidationError('Enter a registration number containing letters or digits.')
         return reg_num
 
 
@@ -0,0 +1,258 @@
+"""
+Idempotency keys for registration submissions.
+
+Clients send a key with a POST, in the Idempotency-Key header (API) or the
+idempotency_key form field (registration page). Keys are scoped to the
+client that sent them: the logged-in user, else the session, else the
+remote address. The first request with a key claims it and runs; its
+response is stored and replayed to every retry with the same key until the
+key expires, so a retried submission neither registers twice nor trips the
+duplicate registration number check. A retry that arrives while the first
+request is still running waits for its response instead of scoring and
+screening again.
+
+Server errors are not stored: the key is released so a retry runs afresh.
+A request holds its key under a lease of IDEMPOTENCY_LOCK_SECONDS, renewed
+on a thread for as long as the request runs, so a slow request keeps its
+key. A request that dies without releasing its key stops renewing it, and
+a waiting retry takes it over once the lease runs out.
+"""
+import hashlib
+import logging
+import threading
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+# How long a key and its stored response are kept
+IDEMPOTENCY_KEY_TTL = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+# How long a request's lease on its key lasts unless renewed; renewed every third of it
+IDEMPOTENCY_LOCK_SECONDS = getattr(settings, 'IDEMPOTENCY_LOCK_SECONDS', 60)
+# How long a retry waits for the in-flight request before answering 409
+IDEMPOTENCY_WAIT_SECONDS = getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 10)
+IDEMPOTENCY_POLL_INTERVAL = 0.1
+
+KEY_HEADER = 'Idempotency-Key'
+KEY_FIELD = 'idempotency_key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+STORED_HEADERS = ('Content-Type', 'Location')
+FORM_CONTENT_TYPES = ('application/x-www-form-urlencoded', 'multipart/form-data')
+
+
+def request_key(request):
+    """The idempotency key a request carries, or ''."""
+    key = request.headers.get(KEY_HEADER)
+    if key is None and request.content_type in FORM_CONTENT_TYPES:
+        key = request.POST.get(KEY_FIELD)
+    return (key or '').strip()[:255]
+
+
+def request_client(request):
+    """Who sent a request, for scoping its idempotency key."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        return f"session:{session.session_key}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"[:100]
+
+
+def request_fingerprint(request):
+    """Hash of what a request submits, to refuse a key reused for a different submission."""
+    if request.content_type in FORM_CONTENT_TYPES:
+        # The CSRF token is re-masked on every page load, so leave it out
+        fields = sorted(
+            (name, request.POST.getlist(name))
+            for name in request.POST if name not in ('csrfmiddlewaretoken', KEY_FIELD)
+        )
+        content = repr(fields).encode()
+    else:
+        content = request.body
+    return hashlib.sha256(content).hexdigest()
+
+
+def _error(message, status, **headers):
+    response = JsonResponse({'error': message}, status=status)
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def _replay(record):
+    response = HttpResponse(bytes(record.response_body), status=record.response_status)
+    for name, value in record.response_headers.items():
+        response[name] = value
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _get_or_claim(scope, client, key, fingerprint):
+    """
+    Claim a key, or load the live record already holding it.
+
+    Returns:
+        tuple: (IdempotencyKey or None, whether this request claimed it)
+    """
+    now = timezone.now()
+    existing = IdempotencyKey.objects.filter(scope=scope, client=client, key=key, expires_at__gt=now).first()
+    if existing is not None:
+        return existing, False
+    IdempotencyKey.objects.filter(scope=scope, client=client, key=key, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                scope=scope,
+                client=client,
+                key=key,
+                request_fingerprint=fingerprint,
+                locked_until=now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+                expires_at=now + timedelta(seconds=IDEMPOTENCY_KEY_TTL),
+            ), True
+    except IntegrityError:
+        # Claimed by a concurrent request since the lookup
+        return IdempotencyKey.objects.filter(scope=scope, client=client, key=key).first(), False
+
+
+def _extend_lease(record):
+    """
+    Extend the lease on an in-flight key, unless someone else changed it.
+
+    Compare-and-swap on the lease expiry, so of a renewal and a take-over
+    racing for the same lease only one succeeds.
+    """
+    locked_until = timezone.now() + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+    extended = IdempotencyKey.objects.filter(
+        pk=record.pk, status='IN_PROGRESS', locked_until=record.locked_until,
+    ).update(locked_until=locked_until)
+    if extended:
+        record.locked_until = locked_until
+    return bool(extended)
+
+
+def _take_over(record):
+    """Claim an in-flight key whose holder's lease has run out."""
+    if record.locked_until is None or record.locked_until >= timezone.now():
+        return False
+    taken = _extend_lease(record)
+    if taken:
+        logger.warning(f"Idempotency key {record} taken over after its lease expired")
+    return taken
+
+
+class _LeaseRenewal:
+    """Keeps renewing a claimed key's lease on a thread while its request runs."""
+
+    def __init__(self, record):
+        self.record = record
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stopped.wait(IDEMPOTENCY_LOCK_SECONDS / 3):
+                try:
+                    renewed = _extend_lease(self.record)
+                except Exception:
+                    # E.g. SQLite locked by the request's own transaction; the next round retries
+                    logger.exception(f"Renewing the lease on idempotency key {self.record} failed")
+                    continue
+                if not renewed:
+                    logger.warning(f"Lease on idempotency key {self.record} was lost while its request ran")
+                    return
+        finally:
+            connection.close()
+
+
+def _acquire(scope, client, key, fingerprint):
+    """
+    Claim the key for this request, or produce the response a duplicate gets.
+
+    Returns:
+        IdempotencyKey or HttpResponse: The claimed key, or a replayed or
+            refusing response
+    """
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        record, claimed = _get_or_claim(scope, client, key, fingerprint)
+        if claimed:
+            return record
+        if record is not None:
+            if record.request_fingerprint != fingerprint:
+                return _error('This idempotency key was used for a different request.', status=422)
+            if record.status == 'COMPLETE':
+                return _replay(record)
+            if _take_over(record):
+                return record
+        if time.monotonic() >= deadline:
+            return _error(
+                'A request with this idempotency key is still being processed.', status=409,
+                **{'Retry-After': '1'},
+            )
+        time.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+
+def _complete(record, response):
+    if response.status_code >= 500 or response.streaming:
+        record.delete()
+        return
+    record.status = 'COMPLETE'
+    record.locked_until = None
+    record.response_status = response.status_code
+    record.response_headers = {name: response[name] for name in STORED_HEADERS if response.has_header(name)}
+    record.response_body = response.content
+    record.save(update_fields=['status', 'locked_until', 'response_status', 'response_headers', 'response_body'])
+
+
+def idempotent(scope):
+    """
+    Make a view's POSTs idempotent per client and client-supplied key.
+
+    POSTs without a key are handled as usual.
+
+    Args:
+        scope: Name each client's keys are unique within, normally the view's URL name
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request_key(request) if request.method == 'POST' else ''
+            if not key:
+                return view(request, *args, **kwargs)
+
+            outcome = _acquire(scope, request_client(request), key, request_fingerprint(request))
+            if isinstance(outcome, HttpResponse):
+                return outcome
+            try:
+                with _LeaseRenewal(outcome):
+                    response = view(request, *args, **kwargs)
+            except Exception:
+                outcome.delete()
+                raise
+            _complete(outcome, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired_keys():
+    """Delete expired keys. Returns the number deleted."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,209 @@
+"""
+Streaming merchant import from CSV or NDJSON.
+
+Rows are read one at a time and registered in chunks by three pipelined
+stages joined by bounded queues, so memory stays flat however long the file
+and each stage works on a different chunk at once:
+
+1. parse: read rows and validate them with the registration form rules
+2. match: screen the chunk's names against the sanctions and PEP lists
+3. write: duplicate check, bulk inserts, then linking, scoring, screening
+   records and decisions in one transaction per chunk
+
+Parsing and matching need no database access and run on their own threads;
+only the calling thread writes. Rows that fail validation or duplicate an
+existing registration number are written to a reject file with their errors.
+"""
+import csv
+import json
+import logging
+import queue
+import re
+import threading
+import time
+
+from screening.services import match_merchants
+
+from .registration import Registration, save_registrations, validate_registration
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+
+# Chunks each stage may have waiting for the next one
+PIPELINE_DEPTH = 2
+
+# CSV columns holding owner fields, e.g. owner1_full_name
+OWNER_COLUMN = re.compile(r'^owner(\d+)_(\w+)$')
+
+_DONE = object()
+
+
+def csv_records(stream):
+    """
+    Yield (line number, registration dict) for each CSV row.
+
+    Owners come from numbered columns such as owner1_full_name and
+    owner1_ownership_percentage; owners whose columns are all blank are left out.
+    """
+    reader = csv.DictReader(stream)
+    for row in reader:
+        data, owners = {}, {}
+        for column, value in row.items():
+            if column is None:
+                continue
+            match = OWNER_COLUMN.match(column)
+            if match:
+                owners.setdefault(int(match.group(1)), {})[match.group(2)] = value
+            else:
+                data[column] = value
+        data['owners'] = [
+            owner for _, owner in sorted(owners.items()) if any((value or '').strip() for value in owner.values())
+        ]
+        yield reader.line_num, data
+
+
+def ndjson_records(stream):
+    """Yield (line number, registration dict) for each non-blank NDJSON line, or the raw line if unparseable."""
+    for line_num, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_num, json.loads(line)
+        except ValueError:
+            yield line_num, line.rstrip('\n')
+
+
+def _parse(record):
+    line_num, data = record
+    if isinstance(data, str):
+        return Registration(line_num, errors={'__all__': ['Line is not valid JSON.']})
+    return validate_registration(line_num, data)
+
+
+class _Stage(threading.Thread):
+    """Pipeline stage turning each chunk from its source into one for the next stage."""
+
+    def __init__(self, name, source, work, stop):
+        super().__init__(name=f"import-{name}", daemon=True)
+        self.source = source
+        self.work = work
+        self.stop = stop
+        self.output = queue.Queue(maxsize=PIPELINE_DEPTH)
+
+    def put(self, item):
+        # Give up once the writer has stopped, rather than block on a full queue
+        while not self.stop.is_set():
+            try:
+                self.output.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def run(self):
+        try:
+            for chunk in self.source:
+                if self.stop.is_set():
+                    return
+                self.put(self.work(chunk))
+        except BaseException as exc:
+            self.put(exc)
+        else:
+            self.put(_DONE)
+
+    def __iter__(self):
+        while True:
+            try:
+                item = self.output.get(timeout=0.1)
+            except queue.Empty:
+                if self.stop.is_set():
+                    return
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+def _chunks(records, chunk_size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _validate_chunk(records):
+    return [(record, _parse(record)) for record in records]
+
+
+def _match_chunk(chunk):
+    valid = [registration for _, registration in chunk if registration.is_valid]
+    matches = match_merchants(
+        [registration.merchant for registration in valid], [registration.owners for registration in valid],
+    )
+    for registration, match in zip(valid, matches):
+        registration.match = match
+    return chunk
+
+
+def import_merchants(stream, file_format='csv', chunk_size=500, rejects=None, progress=None):
+    """
+    Register every merchant in a CSV or NDJSON stream.
+
+    Each chunk is decided in the same transaction that inserts it, whether
+    or not tasks run eagerly.
+
+    Args:
+        stream: Text file to read
+        file_format: 'csv' or 'ndjson'
+        chunk_size: Rows inserted and decided per transaction
+        rejects: Text file to write rejected rows to, one JSON object per line
+            with the line number, the row and its errors
+        progress: Called with the running report after each chunk
+
+    Returns:
+        dict: rows, imported, rejected, seconds and rows_per_second
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown import format '{file_format}', expected one of {', '.join(FORMATS)}")
+    records = csv_records(stream) if file_format == 'csv' else ndjson_records(stream)
+
+    report = {'rows': 0, 'imported': 0, 'rejected': 0, 'seconds': 0.0, 'rows_per_second': 0.0}
+    started = time.monotonic()
+    stop = threading.Event()
+    parse = _Stage('parse', _chunks(records, chunk_size), _validate_chunk, stop)
+    match = _Stage('match', parse, _match_chunk, stop)
+    parse.start()
+    match.start()
+    try:
+        for chunk in match:
+            registrations = [registration for _, registration in chunk]
+            save_registrations(registrations, eager=True)
+
+            for (line_num, data), registration in chunk:
+                if registration.is_valid:
+                    report['imported'] += 1
+                    continue
+                report['rejected'] += 1
+                if rejects is not None:
+                    rejects.write(json.dumps({'line': line_num, 'row': data, 'errors': registration.errors}) + '\n')
+            report['rows'] += len(chunk)
+            report['seconds'] = time.monotonic() - started
+            report['rows_per_second'] = report['rows'] / report['seconds'] if report['seconds'] else 0.0
+            if progress is not None:
+                progress(report)
+    finally:
+        stop.set()
+        parse.join()
+        match.join()
+
+    logger.info(
+        f"Imported {report['imported']} of {report['rows']} merchant row(s), {report['rejected']} rejected, "
+        f"at {report['rows_per_second']:.0f} rows/s"
+    )
+    return report
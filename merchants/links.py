@@ -0,0 +1,362 @@
+"""
+Link analysis across merchants that share owners or contact details.
+
+Every merchant's owner and contact identifiers are normalized and indexed
+in MerchantIdentifier. Linking a merchant looks its identifiers up in the
+index and merges the clusters of every merchant found, relabelling the
+smaller clusters into the largest, so each registration costs a few
+indexed queries regardless of portfolio size.
+"""
+import logging
+import re
+
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, OuterRef, Q, Subquery, Value, When
+
+from .models import LinkCluster, Merchant, MerchantIdentifier
+
+logger = logging.getLogger(__name__)
+
+# Linked merchants that count against the merchants they are linked to: rejected, or
+# matched on sanctions by their current screening run. Unlike screening_status, a run's
+# overall status is only MATCH for a sanctions match, not for a PEP owner.
+ADVERSE = Q(status='REJECTED') | Q(current_screening_run__overall_status='MATCH')
+ADVERSE_FLAG = Case(When(ADVERSE, then=Value(1)), default=Value(0), output_field=IntegerField())
+
+# Addresses with fewer words (e.g. just a city) are too generic to link on
+MIN_ADDRESS_WORDS = 3
+MIN_PHONE_DIGITS = 7
+
+
+def _normalize_text(value):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', value.lower()).split())
+
+
+def merchant_identifiers(merchant, owners=None):
+    """
+    Normalized identifiers a merchant can be linked on.
+
+    Owners are linked on their ID document. An owner without a document
+    number is linked on name and nationality together, since a name alone
+    is shared by unrelated people.
+
+    Returns:
+        set: (kind, value) pairs
+    """
+    if owners is None:
+        owners = merchant.owners.all()
+
+    identifiers = set()
+    email = (merchant.email or '').strip().lower()
+    if email:
+        identifiers.add(('EMAIL', email))
+    phone = re.sub(r'\D', '', merchant.phone or '')
+    if len(phone) >= MIN_PHONE_DIGITS:
+        identifiers.add(('PHONE', phone))
+    address = _normalize_text(merchant.address or '')
+    if len(address.split()) >= MIN_ADDRESS_WORDS:
+        identifiers.add(('ADDRESS', address[:255]))
+
+    for owner in owners:
+        if owner.corporate_entity_id is not None:
+            identifiers.add(('CORPORATE_OWNER', str(owner.corporate_entity_id)))
+            continue
+        number = re.sub(r'\s', '', owner.id_document_number or '').upper()
+        if number:
+            identifiers.add(('OWNER_DOCUMENT', f"{owner.id_document_type}:{number}"[:255]))
+            continue
+        name = _normalize_text(owner.full_name or '')
+        nationality = (owner.nationality or '').upper()
+        if name and nationality:
+            identifiers.add(('OWNER_NAME', f"{nationality}:{name}"[:255]))
+    return identifiers
+
+
+def link_merchant(merchant, owners=None):
+    """
+    Index a merchant's identifiers and merge it into the clusters it links to.
+
+    Identifiers are only ever added, so clusters only grow; rebuild_clusters
+    splits clusters whose links have since been removed.
+
+    Returns:
+        LinkCluster: The merchant's cluster, or None if it links to nobody
+    """
+    identifiers = merchant_identifiers(merchant, owners)
+    if not identifiers:
+        return merchant.link_cluster
+
+    match = Q()
+    for kind, value in identifiers:
+        match |= Q(kind=kind, value=value)
+
+    with transaction.atomic(savepoint=False):
+        MerchantIdentifier.objects.bulk_create(
+            [MerchantIdentifier(merchant=merchant, kind=kind, value=value) for kind, value in identifiers],
+            ignore_conflicts=True,
+        )
+        linked = set(
+            MerchantIdentifier.objects.filter(match).exclude(merchant_id=merchant.pk)
+            .values_list('merchant_id', 'merchant__link_cluster_id')
+        )
+        if not linked:
+            return merchant.link_cluster
+
+        cluster_ids = {cluster_id for _, cluster_id in linked if cluster_id is not None}
+        if merchant.link_cluster_id is not None:
+            cluster_ids.add(merchant.link_cluster_id)
+        unclustered = {merchant_id for merchant_id, cluster_id in linked if cluster_id is None}
+        if merchant.link_cluster_id is None:
+            unclustered.add(merchant.pk)
+        target, clusters = _merge_clusters(cluster_ids, unclustered)
+
+    if len(clusters) > 1 or unclustered - {merchant.pk}:
+        logger.info(f"Merchant {merchant.business_name} linked into cluster {target.pk} ({target.size} merchants)")
+    merchant.link_cluster = target
+    return target
+
+
+def _merge_clusters(cluster_ids, unclustered):
+    """
+    Merge clusters and unclustered merchants into one cluster.
+
+    Union by size: every smaller cluster is relabelled into the largest.
+
+    Returns:
+        tuple: (target LinkCluster, the existing clusters that were locked)
+    """
+    clusters = list(LinkCluster.objects.select_for_update().filter(pk__in=cluster_ids).order_by('pk'))
+    if clusters:
+        target = max(clusters, key=lambda cluster: cluster.size)
+    else:
+        target = LinkCluster.objects.create(size=0)
+
+    for cluster in clusters:
+        if cluster.pk != target.pk:
+            Merchant.objects.filter(link_cluster=cluster).update(link_cluster=target)
+            target.size += cluster.size
+            cluster.delete()
+    if unclustered:
+        Merchant.objects.filter(pk__in=unclustered).update(link_cluster=target)
+        target.size += len(unclustered)
+    target.save(update_fields=['size'])
+    return target, clusters
+
+
+def link_merchants(merchants, owners_by_merchant, chunk_size=500):
+    """
+    Link a batch of new, unclustered merchants in one pass.
+
+    All identifiers are inserted at once and looked up in chunks. Batch
+    members are joined with each other and with the merchants they link to
+    in memory, so only merged clusters cost further queries.
+
+    Args:
+        merchants: Saved merchants to link
+        owners_by_merchant: merchant pk -> list of its beneficial owners
+        chunk_size: Identifier values per lookup query
+    """
+    identifiers = {
+        merchant.pk: merchant_identifiers(merchant, owners_by_merchant.get(merchant.pk, []))
+        for merchant in merchants
+    }
+    wanted = sorted(set().union(*identifiers.values()))
+    if not wanted:
+        return
+
+    with transaction.atomic(savepoint=False):
+        MerchantIdentifier.objects.bulk_create(
+            [
+                MerchantIdentifier(merchant_id=merchant_id, kind=kind, value=value)
+                for merchant_id, pairs in identifiers.items() for kind, value in pairs
+            ],
+            ignore_conflicts=True,
+        )
+        values_by_kind = {}
+        for kind, value in wanted:
+            values_by_kind.setdefault(kind, []).append(value)
+        existing = {}
+        for kind, values in values_by_kind.items():
+            # One (kind, value IN ...) lookup per chunk keeps to the (kind, value) index
+            for start in range(0, len(values), chunk_size):
+                rows = MerchantIdentifier.objects.filter(
+                    kind=kind, value__in=values[start:start + chunk_size],
+                ).values_list('value', 'merchant_id', 'merchant__link_cluster_id')
+                for value, merchant_id, cluster_id in rows:
+                    if merchant_id in identifiers:
+                        continue
+                    # A clustered merchant stands for its whole cluster
+                    node = ('cluster', cluster_id) if cluster_id is not None else ('merchant', merchant_id)
+                    existing.setdefault((kind, value), set()).add(node)
+
+        components = _DisjointSet()
+        first_holder = {}
+        for merchant_id, pairs in identifiers.items():
+            node = ('merchant', merchant_id)
+            components.find(node)
+            for identifier in pairs:
+                for other in existing.get(identifier, ()):
+                    components.union(node, other)
+                components.union(node, ('merchant', first_holder.setdefault(identifier, merchant_id)))
+
+        groups = {}
+        for node in list(components.parent):
+            groups.setdefault(components.find(node), []).append(node)
+
+        by_pk = {merchant.pk: merchant for merchant in merchants}
+        merged = 0
+        for nodes in groups.values():
+            if len(nodes) < 2:
+                continue
+            target, _ = _merge_clusters(
+                {key for kind, key in nodes if kind == 'cluster'},
+                {key for kind, key in nodes if kind == 'merchant'},
+            )
+            for kind, key in nodes:
+                if kind == 'merchant' and key in by_pk:
+                    by_pk[key].link_cluster = target
+            merged += 1
+
+    logger.info(f"Linked {len(merchants)} merchant(s) into {merged} cluster(s)")
+
+
+def cluster_stats(cluster_ids=None):
+    """
+    Member and adverse member counts per cluster, in one query.
+
+    Args:
+        cluster_ids: Clusters to count, or None for every cluster
+
+    Returns:
+        dict: cluster pk -> (members, adverse members)
+    """
+    if cluster_ids is not None and not cluster_ids:
+        return {}
+    merchants = Merchant.objects.filter(link_cluster__isnull=False)
+    if cluster_ids is not None:
+        merchants = merchants.filter(link_cluster_id__in=cluster_ids)
+    rows = (
+        merchants.order_by().values('link_cluster_id')
+        .annotate(members=Count('pk'), adverse=Count('pk', filter=ADVERSE))
+    )
+    return {row['link_cluster_id']: (row['members'], row['adverse']) for row in rows}
+
+
+def with_link_features(queryset):
+    """
+    Annotate merchants with everything link_features reads, so no further queries are needed.
+
+    Adds is_adverse, and the cluster's member and adverse member counts as
+    cluster_members and cluster_adverse through correlated subqueries.
+    """
+    cluster = Merchant.objects.filter(link_cluster_id=OuterRef('link_cluster_id')).order_by().values('link_cluster_id')
+    return queryset.annotate(
+        is_adverse=ADVERSE_FLAG,
+        cluster_members=Subquery(cluster.annotate(count=Count('pk')).values('count')),
+        cluster_adverse=Subquery(cluster.annotate(count=Count('pk', filter=ADVERSE)).values('count')),
+    )
+
+
+def is_adverse(merchant):
+    flag = getattr(merchant, 'is_adverse', None)
+    if flag is not None:
+        return bool(flag)
+    if merchant.status == 'REJECTED':
+        return True
+    return merchant.current_screening_run_id is not None and merchant.current_screening_run.overall_status == 'MATCH'
+
+
+def link_features(merchant, stats=None):
+    """
+    A merchant's linked-merchant risk features.
+
+    Args:
+        merchant: Merchant to describe
+        stats: Preloaded cluster_stats covering its cluster
+
+    Returns:
+        tuple: (cluster size including the merchant, adverse other members)
+    """
+    if merchant.link_cluster_id is None:
+        return 1, 0
+    if stats is None:
+        stats = cluster_stats([merchant.link_cluster_id])
+    members, adverse = stats.get(merchant.link_cluster_id, (1, 0))
+    return members, adverse - int(is_adverse(merchant))
+
+
+class _DisjointSet:
+    """Union-find over merchant pks with path halving and union by size."""
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, item):
+        if item not in self.parent:
+            self.parent[item] = item
+            self.size[item] = 1
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+
+def rebuild_clusters(batch_size=1000):
+    """
+    Re-index every merchant's identifiers and recompute all clusters.
+
+    Returns:
+        dict: 'merchants', 'clusters' and 'largest' cluster size
+    """
+    components = _DisjointSet()
+    by_identifier = {}
+
+    with transaction.atomic():
+        MerchantIdentifier.objects.all().delete()
+        merchants = Merchant.objects.order_by('pk').prefetch_related('owners')
+        identifiers = []
+        merchant_count = 0
+        for merchant in merchants.iterator(chunk_size=batch_size):
+            merchant_count += 1
+            components.find(merchant.pk)
+            for kind, value in merchant_identifiers(merchant, merchant.owners.all()):
+                identifiers.append(MerchantIdentifier(merchant_id=merchant.pk, kind=kind, value=value))
+                first = by_identifier.setdefault((kind, value), merchant.pk)
+                components.union(first, merchant.pk)
+            if len(identifiers) >= batch_size:
+                MerchantIdentifier.objects.bulk_create(identifiers)
+                identifiers = []
+        MerchantIdentifier.objects.bulk_create(identifiers)
+
+        members = {}
+        for merchant_id in list(components.parent):
+            members.setdefault(components.find(merchant_id), []).append(merchant_id)
+        groups = [group for group in members.values() if len(group) > 1]
+
+        Merchant.objects.filter(link_cluster__isnull=False).update(link_cluster=None)
+        LinkCluster.objects.all().delete()
+        for group in groups:
+            cluster = LinkCluster.objects.create(size=len(group))
+            for start in range(0, len(group), batch_size):
+                Merchant.objects.filter(pk__in=group[start:start + batch_size]).update(link_cluster=cluster)
+
+    report = {
+        'merchants': merchant_count,
+        'clusters': len(groups),
+        'largest': max((len(group) for group in groups), default=0),
+    }
+    logger.info(
+        f"Link clusters rebuilt: {report['clusters']} cluster(s) over {report['merchants']} merchant(s), "
+        f"largest {report['largest']}"
+    )
+    return report
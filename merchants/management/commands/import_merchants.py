@@ -0,0 +1,52 @@
+"""
+Import merchants from a CSV or NDJSON file.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from merchants.importer import FORMATS, import_merchants
+
+
+class Command(BaseCommand):
+    help = (
+        'Register merchants from a CSV or NDJSON file in chunks, validating, scoring, screening and deciding '
+        'each like a registration; rejected rows can be written to a reject file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--format', choices=FORMATS, help='File format, by default taken from the extension')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows inserted and decided per transaction')
+        parser.add_argument('--rejects', help='Write rejected rows and their errors here, as NDJSON')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        def progress(report):
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f"  {report['rows']} row(s), {report['imported']} imported, {report['rejected']} rejected "
+                    f"({report['rows_per_second']:.0f} rows/s)"
+                )
+
+        rejects = open(options['rejects'], 'w', encoding='utf-8') if options['rejects'] else None
+        try:
+            with open(path, newline='', encoding='utf-8') as stream:
+                report = import_merchants(
+                    stream, file_format, chunk_size=options['chunk_size'], rejects=rejects, progress=progress,
+                )
+        except OSError as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+        finally:
+            if rejects is not None:
+                rejects.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['imported']} of {report['rows']} row(s) in {report['seconds']:.1f}s "
+            f"({report['rows_per_second']:.0f} rows/s)."
+        ))
+        if report['rejected']:
+            where = f"; see {options['rejects']}" if options['rejects'] else ''
+            self.stdout.write(self.style.WARNING(f"{report['rejected']} row(s) rejected{where}."))
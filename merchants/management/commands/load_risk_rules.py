@@ -0,0 +1,42 @@
+"""
+Publish a new risk rule set version from a JSON file.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from django.db.models import Max
+
+from merchants.models import RiskRuleSet
+from merchants.risk_engine import validate_rules
+
+
+class Command(BaseCommand):
+    help = 'Validate a JSON rule file and publish it as the next active risk rule set version.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON file with the rule keys to override')
+        parser.add_argument('--notes', default='', help='Change notes stored with the version')
+        parser.add_argument('--inactive', action='store_true', help='Store the version without activating it')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path']) as fh:
+                rules = json.load(fh)
+            validate_rules(rules)
+        except (OSError, json.JSONDecodeError, ValueError) as exc:
+            raise CommandError(f"Invalid rule file: {exc}")
+
+        latest = RiskRuleSet.objects.aggregate(latest=Max('version'))['latest'] or 0
+        try:
+            ruleset = RiskRuleSet.objects.create(
+                version=latest + 1,
+                rules=rules,
+                is_active=not options['inactive'],
+                notes=options['notes'],
+            )
+        except IntegrityError:
+            raise CommandError(f"Version {latest + 1} was published concurrently; run the command again.")
+
+        state = 'inactive' if options['inactive'] else 'active'
+        self.stdout.write(self.style.SUCCESS(f'Published risk rules v{ruleset.version} ({state}).'))
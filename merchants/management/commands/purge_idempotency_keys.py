@@ -0,0 +1,14 @@
+"""
+Delete expired registration idempotency keys.
+"""
+from django.core.management.base import BaseCommand
+
+from merchants.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys and stored responses older than IDEMPOTENCY_KEY_TTL; run periodically, e.g. from cron.'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency key(s)."))
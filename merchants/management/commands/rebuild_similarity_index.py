@@ -0,0 +1,17 @@
+"""
+Recompute the MinHash similarity index for every merchant.
+"""
+from django.core.management.base import BaseCommand
+
+from merchants.similarity import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Recompute MinHash signatures and LSH buckets for every merchant, e.g. after deploying or changing shingling.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Merchants written per batch')
+
+    def handle(self, *args, **options):
+        indexed = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} merchant(s) for similarity lookup."))
@@ -0,0 +1,25 @@
+"""
+Recompute every merchant's risk score and level with the active rules.
+"""
+from django.core.management.base import BaseCommand
+
+from merchants.portfolio import recompute_portfolio_risk
+
+
+class Command(BaseCommand):
+    help = 'Recompute risk levels for the whole portfolio and write back only the merchants whose score or level changed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Merchants updated per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Report changes without writing them')
+
+    def handle(self, *args, **options):
+        report = recompute_portfolio_risk(chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+
+        self.stdout.write(f"Scored {report['scored']} merchant(s).")
+        for (old, new), count in sorted(report['transitions'].items(), key=lambda item: str(item[0])):
+            self.stdout.write(f"  {old or 'UNSET'} -> {new}: {count}")
+        verb = 'would change' if options['dry_run'] else 'changed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['changed']} risk level(s) {verb}: {report['raised']} raised, {report['lowered']} lowered."
+        ))
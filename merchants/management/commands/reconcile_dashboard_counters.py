@@ -0,0 +1,31 @@
+"""
+Recount merchants and correct the materialized dashboard counters.
+"""
+from django.core.management.base import BaseCommand
+
+from merchants.dashboard import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Recount merchants by status and risk level and correct the dashboard counters, creating them if '
+        'missing. Run once after enabling DASHBOARD_COUNTERS, then periodically to fix drift.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without correcting it')
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(dry_run=options['dry_run'])
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('All dashboard counters match.'))
+            return
+
+        for name, (stored, actual) in drift.items():
+            self.stdout.write(f"  {name}: {'missing' if stored is None else stored} (actual {actual})")
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(drift)} dashboard counter(s) drifted; run without --dry-run to correct them."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Corrected {len(drift)} dashboard counter(s)."))
@@ -0,0 +1,48 @@
+"""
+Simulate the impact of a candidate risk rule set without writing anything.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from merchants.models import RiskRuleSet
+from merchants.risk_engine import CompiledRules
+from merchants.simulation import simulate_rules
+
+
+class Command(BaseCommand):
+    help = 'Compare a candidate risk rule set against the active rules over every merchant.'
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--file', help='JSON file with the rule keys to override')
+        source.add_argument('--rule-version', type=int, help='Stored RiskRuleSet version to evaluate')
+        parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            if options['file']:
+                with open(options['file']) as fh:
+                    candidate = CompiledRules(json.load(fh), version=None)
+            else:
+                ruleset = RiskRuleSet.objects.get(version=options['rule_version'])
+                candidate = CompiledRules(ruleset.rules, version=ruleset.version)
+        except RiskRuleSet.DoesNotExist:
+            raise CommandError(f"No risk rule set version {options['rule_version']}.")
+        except (OSError, json.JSONDecodeError, ValueError) as exc:
+            raise CommandError(f"Invalid rules: {exc}")
+
+        report = simulate_rules(candidate)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"Merchants evaluated: {report['merchants']}")
+        self.stdout.write('Transitions (rows: current rules, columns: candidate):')
+        self.stdout.write(f"{'':>8}" + ''.join(f'{level:>8}' for level in report['transition_matrix']))
+        for old, row in report['transition_matrix'].items():
+            self.stdout.write(f'{old:>8}' + ''.join(f'{count:>8}' for count in row.values()))
+        self.stdout.write(f"Auto-approvals that would be blocked: {report['auto_approvals_blocked']}")
+        self.stdout.write(f"Pending merchants that would become auto-approvable: {report['newly_auto_approvable']}")
+        self.stdout.write(self.style.SUCCESS(f"{report['changed']} merchant(s) would change risk level."))
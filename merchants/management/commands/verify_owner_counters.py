@@ -0,0 +1,39 @@
+"""
+Check the denormalized owner counters on every merchant against its owners.
+"""
+from django.core.management.base import BaseCommand
+
+from merchants.models import OWNER_COUNTER_FIELDS, Merchant
+
+
+class Command(BaseCommand):
+    help = 'Compare stored merchant owner counters with a recount of their beneficial owners, optionally repairing drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help='Recount and store the counters of drifted merchants')
+
+    def handle(self, *args, **options):
+        drifted = list(
+            Merchant.objects.with_owner_counter_drift().order_by('pk').values(
+                'pk', *OWNER_COUNTER_FIELDS, *(f"actual_{field}" for field in OWNER_COUNTER_FIELDS),
+            )
+        )
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All owner counters match.'))
+            return
+
+        for row in drifted:
+            differences = ', '.join(
+                f"{field} {row[field]} (actual {row[f'actual_{field}']})"
+                for field in OWNER_COUNTER_FIELDS
+                if row[field] != row[f"actual_{field}"]
+            )
+            self.stdout.write(f"  Merchant {row['pk']}: {differences}")
+
+        if options['repair']:
+            Merchant.objects.filter(pk__in=[row['pk'] for row in drifted]).refresh_owner_counters()
+            self.stdout.write(self.style.SUCCESS(f"Repaired owner counters on {len(drifted)} merchant(s)."))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"{len(drifted)} merchant(s) have drifted owner counters; run with --repair to fix."
+            ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='merchant',
+            name='screening_fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchants', '0002_merchant_screening_fingerprint'),
+        ('screening', '0002_screening_run'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='merchant',
+            name='current_screening_run',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='screening.screeningrun'),
+        ),
+    ]
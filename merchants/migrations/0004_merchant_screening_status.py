@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:31
+
+from django.db import migrations, models
+
+
+def backfill_screening_status(apps, schema_editor):
+    """Derive the stored status from each merchant's current screening run."""
+    Merchant = apps.get_model('merchants', 'Merchant')
+    ScreeningResult = apps.get_model('screening', 'ScreeningResult')
+
+    screened = Merchant.objects.filter(current_screening_run__isnull=False)
+    for merchant_id, run_id in screened.values_list('pk', 'current_screening_run_id').iterator():
+        statuses = set(ScreeningResult.objects.filter(run_id=run_id).values_list('status', flat=True))
+        if 'MATCH' in statuses:
+            status = 'MATCH'
+        elif 'POTENTIAL_MATCH' in statuses:
+            status = 'POTENTIAL_MATCH'
+        elif statuses:
+            status = 'CLEAR'
+        else:
+            status = 'NOT_SCREENED'
+        Merchant.objects.filter(pk=merchant_id).update(screening_status=status)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchants', '0003_merchant_current_screening_run'),
+        ('screening', '0003_backfill_screening_runs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='merchant',
+            name='screening_status',
+            field=models.CharField(choices=[('NOT_SCREENED', 'Not Screened'), ('CLEAR', 'Clear'), ('POTENTIAL_MATCH', 'Potential Match'), ('MATCH', 'Match Found')], db_index=True, default='NOT_SCREENED', editable=False, max_length=20),
+        ),
+        migrations.RunPython(backfill_screening_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchants', '0004_merchant_screening_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='riskassessment',
+            name='rule_version',
+            field=models.PositiveIntegerField(default=0, help_text='Risk rule set version used (0 = built-in rules)'),
+        ),
+        migrations.CreateModel(
+            name='RiskRuleSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(unique=True)),
+                ('rules', models.JSONField(help_text='Rule keys to override on top of the built-in rules')),
+                ('is_active', models.BooleanField(default=True)),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Risk Rule Set',
+                'verbose_name_plural': 'Risk Rule Sets',
+                'ordering': ['-version'],
+            },
+        ),
+    ]
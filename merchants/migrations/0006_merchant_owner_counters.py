@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:41
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_owner_counters(apps, schema_editor):
+    """Count each merchant's existing owners into the new columns."""
+    Merchant = apps.get_model('merchants', 'Merchant')
+    BeneficialOwner = apps.get_model('merchants', 'BeneficialOwner')
+
+    def owner_count(**filters):
+        counts = (
+            BeneficialOwner.objects.filter(merchant=OuterRef('pk'), **filters)
+            .order_by().values('merchant').annotate(n=Count('pk')).values('n')
+        )
+        return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+    Merchant.objects.update(
+        owner_count=owner_count(),
+        minority_owner_count=owner_count(ownership_percentage__lt=25),
+        pep_owner_count=owner_count(is_pep=True),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchants', '0005_risk_rule_sets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='merchant',
+            name='minority_owner_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='merchant',
+            name='owner_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='merchant',
+            name='pep_owner_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_owner_counters, migrations.RunPython.noop),
+    ]
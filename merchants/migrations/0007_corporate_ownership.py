@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchants', '0006_merchant_owner_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorporateEntity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('registration_number', models.CharField(blank=True, max_length=100)),
+                ('country', models.CharField(max_length=2)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Corporate Entity',
+                'verbose_name_plural': 'Corporate Entities',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='merchant',
+            name='corporate_owner_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='beneficialowner',
+            name='corporate_entity',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='merchant_holdings', to='merchants.corporateentity'),
+        ),
+        migrations.CreateModel(
+            name='EntityOwnership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('full_name', models.CharField(blank=True, max_length=255)),
+                ('nationality', models.CharField(blank=True, max_length=2)),
+                ('id_document_type', models.CharField(blank=True, choices=[('PASSPORT', 'Passport'), ('NATIONAL_ID', 'National ID')], max_length=20)),
+                ('id_document_number', models.CharField(blank=True, max_length=100)),
+                ('is_pep', models.BooleanField(default=False, verbose_name='Politically Exposed Person')),
+                ('ownership_percentage', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shareholders', to='merchants.corporateentity')),
+                ('owner_entity', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='holdings', to='merchants.corporateentity')),
+            ],
+            options={
+                'verbose_name': 'Entity Ownership',
+                'verbose_name_plural': 'Entity Ownerships',
+                'ordering': ['-ownership_percentage'],
+            },
+        ),
+    ]
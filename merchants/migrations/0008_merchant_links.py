@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchants', '0007_corporate_ownership'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LinkCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Link Cluster',
+                'verbose_name_plural': 'Link Clusters',
+            },
+        ),
+        migrations.AddField(
+            model_name='merchant',
+            name='link_cluster',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='members', to='merchants.linkcluster'),
+        ),
+        migrations.CreateModel(
+            name='MerchantIdentifier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('OWNER_DOCUMENT', 'Owner ID Document'), ('OWNER_NAME', 'Owner Name'), ('CORPORATE_OWNER', 'Corporate Owner'), ('EMAIL', 'Email'), ('PHONE', 'Phone'), ('ADDRESS', 'Address')], max_length=20)),
+                ('value', models.CharField(max_length=255)),
+                ('merchant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='identifiers', to='merchants.merchant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'value'], name='merchants_m_kind_bc57b1_idx')],
+                'constraints': [models.UniqueConstraint(fields=('merchant', 'kind', 'value'), name='unique_merchant_identifier')],
+            },
+        ),
+    ]
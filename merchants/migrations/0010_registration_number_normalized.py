@@ -0,0 +1,57 @@
+import logging
+import re
+
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(value, country):
+    canonical = re.sub(r'[^0-9A-Z]', '', (value or '').upper())
+    prefix = (country or '').upper()
+    if prefix and canonical.startswith(prefix) and canonical[len(prefix):len(prefix) + 1].isdigit():
+        canonical = canonical[len(prefix):]
+    return canonical
+
+
+def backfill_normalized(apps, schema_editor):
+    """Fill the canonical number; later variants of an existing number keep a pk suffix."""
+    Merchant = apps.get_model('merchants', 'Merchant')
+    seen = set()
+    for merchant in Merchant.objects.order_by('pk').only('pk', 'registration_number', 'country').iterator():
+        normalized = normalize(merchant.registration_number, merchant.country)
+        if normalized in seen:
+            logger.warning(
+                f"Merchant {merchant.pk} registration number {merchant.registration_number!r} "
+                f"duplicates an earlier merchant once normalized"
+            )
+            normalized = f"{normalized}~{merchant.pk}"
+        seen.add(normalized)
+        Merchant.objects.filter(pk=merchant.pk).update(registration_number_normalized=normalized)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchants', '0009_similarity_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='merchant',
+            name='registration_number_normalized',
+            field=models.CharField(default='', editable=False, max_length=100),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_normalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='merchant',
+            name='registration_number_normalized',
+            field=models.CharField(editable=False, max_length=100, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='merchant',
+            name='registration_number',
+            field=models.CharField(max_length=100),
+        ),
+    ]
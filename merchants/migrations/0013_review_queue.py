@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:39
+
+import django.db.models.deletion
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_risk_scores(apps, schema_editor):
+    """Copy each merchant's latest risk assessment score onto it."""
+    Merchant = apps.get_model('merchants', 'Merchant')
+    RiskAssessment = apps.get_model('merchants', 'RiskAssessment')
+    latest = RiskAssessment.objects.filter(merchant=OuterRef('pk')).order_by('-assessment_date', '-pk')
+    Merchant.objects.update(risk_score=Subquery(latest.values('risk_score')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchants', '0012_dashboard_counters'),
+        ('screening', '0003_backfill_screening_runs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='merchant',
+            name='claimed_by',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claimed_merchants', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='merchant',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='merchant',
+            name='risk_score',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='merchant',
+            name='review_priority',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(status__in=('PENDING', 'UNDER_REVIEW'), then=django.db.models.expressions.CombinedExpression(models.Case(models.When(screening_status='MATCH', then=models.Value(2000)), models.When(screening_status='POTENTIAL_MATCH', then=models.Value(2000)), models.When(screening_status='CLEAR', then=models.Value(1000)), models.When(screening_status='NOT_SCREENED', then=models.Value(0)), default=models.Value(0)), '+', django.db.models.functions.comparison.Coalesce(models.F('risk_score'), models.Value(0)))), default=None), output_field=models.IntegerField(null=True)),
+        ),
+        migrations.RunPython(backfill_risk_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='merchant',
+            index=models.Index(condition=models.Q(('review_priority__isnull', False)), fields=['-review_priority', 'created_at', 'id'], name='merchant_review_queue'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchants', '0013_review_queue'),
+        ('screening', '0003_backfill_screening_runs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='merchant',
+            index=models.Index(fields=['-created_at', '-id'], name='merchant_created_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='merchant',
+            index=models.Index(fields=['-updated_at', '-id'], name='merchant_updated_keyset'),
+        ),
+    ]
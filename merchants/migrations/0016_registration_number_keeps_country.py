@@ -0,0 +1,45 @@
+import logging
+import re
+
+from django.db import migrations
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(value):
+    return re.sub(r'[^0-9A-Z]', '', (value or '').upper())
+
+
+def renormalize(apps, schema_editor):
+    """Put back leading country codes; later variants of an existing number keep a pk suffix."""
+    Merchant = apps.get_model('merchants', 'Merchant')
+    seen = set()
+    changed = {}
+    rows = Merchant.objects.order_by('pk').values_list('pk', 'registration_number', 'registration_number_normalized')
+    for pk, registration_number, current in rows.iterator():
+        normalized = normalize(registration_number)
+        if normalized in seen:
+            logger.warning(
+                f"Merchant {pk} registration number {registration_number!r} "
+                f"duplicates an earlier merchant once normalized"
+            )
+            normalized = f"{normalized}~{pk}"
+        seen.add(normalized)
+        if normalized != current:
+            changed[pk] = normalized
+    # Move changed rows out of the way first, so no update collides with a value about to change
+    for pk in changed:
+        Merchant.objects.filter(pk=pk).update(registration_number_normalized=f"~{pk}")
+    for pk, normalized in changed.items():
+        Merchant.objects.filter(pk=pk).update(registration_number_normalized=normalized)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchants', '0015_review_decisions'),
+    ]
+
+    operations = [
+        migrations.RunPython(renormalize, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,260 @@
 """
 Merchant models for KYB onboarding.
 """
-from django.db import models
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import BigIntegerField, Case, Count, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 
+from . import events
+
+# Ownership below this percentage counts towards Merchant.minority_owner_count
+MINORITY_THRESHOLD = 25
+
+OWNER_COUNTER_FIELDS = ('owner_count', 'minority_owner_count', 'pep_owner_count', 'corporate_owner_count')
+
+# Merchant columns maintained by set-based updates rather than instance saves
+MAINTAINED_FIELDS = OWNER_COUNTER_FIELDS + ('link_cluster',)
+
+# Compliance dashboard statistics besides the total: name -> (field, value) counted
+DASHBOARD_STATS = {
+    'pending': ('status', 'PENDING'),
+    'under_review': ('status', 'UNDER_REVIEW'),
+    'approved': ('status', 'APPROVED'),
+    'rejected': ('status', 'REJECTED'),
+    'high_risk': ('risk_level', 'HIGH'),
+    'medium_risk': ('risk_level', 'MEDIUM'),
+    'low_risk': ('risk_level', 'LOW'),
+}
+DASHBOARD_FIELDS = frozenset(field for field, _ in DASHBOARD_STATS.values())
+
+
+def dashboard_counters_enabled():
+    # Read per call so override_settings applies
+    return getattr(settings, 'DASHBOARD_COUNTERS', False)
+
+
+def dashboard_contribution(status, risk_level):
+    """The dashboard counters a merchant with this status and risk level adds to."""
+    values = {'status': status, 'risk_level': risk_level}
+    contribution = Counter(total=1)
+    contribution.update(name for name, (field, value) in DASHBOARD_STATS.items() if values[field] == value)
+    return contribution
+
+
+def dashboard_delta(before, after):
+    """Counter changes for a merchant going from one (status, risk_level) to another; None for absent."""
+    delta = Counter()
+    if after is not None:
+        delta.update(dashboard_contribution(*after))
+    if before is not None:
+        delta.subtract(dashboard_contribution(*before))
+    return delta
+
+
+# Statuses of merchants awaiting a compliance decision
+REVIEW_STATUSES = ('PENDING', 'UNDER_REVIEW')
+
+# Review queue priority added per screening status; risk scores (0-100) order merchants within each
+SCREENING_REVIEW_PRIORITY = {'MATCH': 2000, 'POTENTIAL_MATCH': 2000, 'CLEAR': 1000, 'NOT_SCREENED': 0}
+
+# Review queue order, matching the merchant_review_queue index
+REVIEW_QUEUE_ORDER = ('-review_priority', 'created_at', 'id')
+
+# Merchant fields summarized in live updates when a merchant enters review
+REVIEW_EVENT_FIELDS = (
+    'pk', 'business_name', 'registration_number', 'business_category', 'country', 'status', 'risk_level',
+    'screening_status', 'created_at',
+)
+
+
+def dashboard_tracking_enabled():
+    """Whether status and risk level changes need recording, for counters or live subscribers."""
+    return dashboard_counters_enabled() or events.has_subscribers()
+
+
+def review_summary(values):
+    """JSON-serializable summary of a merchant, given its REVIEW_EVENT_FIELDS values."""
+    summary = {field: values[field] for field in REVIEW_EVENT_FIELDS if field not in ('pk', 'created_at')}
+    summary['id'] = values['pk']
+    summary['business_category_display'] = dict(Merchant.CATEGORY_CHOICES).get(values['business_category'], '')
+    summary['country_display'] = dict(Merchant.COUNTRY_CHOICES).get(values['country'], '')
+    summary['created_at'] = values['created_at'].isoformat() if values['created_at'] else None
+    return summary
+
+
+def record_dashboard_changes(changes, using='default'):
+    """
+    Apply merchants' status and risk level changes to the dashboard counters and live feed.
+
+    Args:
+        changes: (before, after, values) per merchant, where before and after
+            are (status, risk_level) or None when the merchant didn't or no
+            longer exists, and values maps REVIEW_EVENT_FIELDS to the
+            merchant's current values
+        using: Database alias of the writing transaction
+    """
+    delta = Counter()
+    entered = []
+    for before, after, values in changes:
+        if before == after:
+            continue
+        delta.update(dashboard_delta(before, after))
+        if after is not None and after[0] in REVIEW_STATUSES and (before is None or before[0] not in REVIEW_STATUSES):
+            entered.append(values)
+    delta = {name: change for name, change in delta.items() if change}
+    if not delta:
+        return
+    if dashboard_counters_enabled():
+        DashboardCounter.objects.using(using).apply(delta)
+    if events.has_subscribers():
+        events.publish_on_commit('counters', delta, using=using)
+        for values in entered:
+            events.publish_on_commit('review', review_summary(values), using=using)
+
+
+def normalize_registration_number(value, country=None):
+    """
+    Canonical form of a registration number, used for uniqueness and lookups.
+
+    Case-folded with separators removed, so "sg-123 456" and "SG123456" are
+    the same number. A number starting with a digit takes the merchant's
+    country code, so an SG merchant's "123456" and "SG-123456" are the same
+    number while "PH-123456" stays a different one.
+    """
+    canonical = re.sub(r'[^0-9A-Z]', '', (value or '').upper())
+    if country and canonical[:1].isdigit():
+        return f"{country}{canonical}"
+    return canonical
+
+
+def registration_number_keys(value):
+    """
+    Stored forms a registration number as a user typed it may match.
+
+    Returns:
+        list: (canonical number, country or None) pairs, best match first.
+            A pair with a country only matches merchants of that country:
+            a number typed without a country code matches any merchant
+            that stores it under its own country's code.
+    """
+    canonical = normalize_registration_number(value)
+    if canonical[:1].isdigit():
+        return [(f"{code}{canonical}", code) for code, _ in Merchant.COUNTRY_CHOICES]
+    return [(canonical, None)]
+
+
+class MerchantQuerySet(models.QuerySet):
+    """QuerySet for merchants."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        for obj in objs:
+            obj.registration_number_normalized = normalize_registration_number(obj.registration_number, obj.country)
+        created = super().bulk_create(objs, *args, **kwargs)
+        if dashboard_tracking_enabled():
+            record_dashboard_changes(
+                [
+                    (None, (obj.status, obj.risk_level), {field: getattr(obj, field) for field in REVIEW_EVENT_FIELDS})
+                    for obj in created
+                ],
+                using=self.db,
+            )
+        return created
+
+    def update(self, **kwargs):
+        """
+        Update rows, recording status and risk level changes for the dashboard.
+
+        Also covers bulk_update, which updates through this method. Changed
+        rows are found by reading the two fields before and after the update.
+        """
+        if not DASHBOARD_FIELDS & kwargs.keys() or not dashboard_tracking_enabled():
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            before = {
+                pk: (status, risk_level) for pk, status, risk_level in self.values_list('pk', 'status', 'risk_level')
+            }
+            updated = super().update(**kwargs)
+            pks = list(before)
+            changes = []
+            for start in range(0, len(pks), 500):
+                rows = Merchant.objects.using(self.db).filter(pk__in=pks[start:start + 500]).values(
+                    *REVIEW_EVENT_FIELDS,
+                )
+                changes.extend((before[row['pk']], (row['status'], row['risk_level']), row) for row in rows)
+            record_dashboard_changes(changes, using=self.db)
+        return updated
+
+    def dashboard_stats(self):
+        """Merchant total and counts per status and risk level, in one aggregate query."""
+        return self.aggregate(
+            total=Count('pk'),
+            **{name: Count('pk', filter=Q(**{field: value})) for name, (field, value) in DASHBOARD_STATS.items()},
+        )
+
+    def get_by_registration_number(self, value):
+        """
+        Find a merchant by registration number as a user typed it, in one indexed probe.
+
+        A number typed without a country code matches a merchant that
+        stores it under its own country's code, trying countries in the
+        order of COUNTRY_CHOICES.
+
+        Returns:
+            Merchant or None
+        """
+        keys = registration_number_keys(value)
+        if not keys[0][0]:
+            return None
+        matches = {
+            (merchant.registration_number_normalized, merchant.country): merchant
+            for merchant in self.filter(registration_number_normalized__in=[number for number, _ in keys])
+        }
+        for number, country in keys:
+            for (matched_number, matched_country), merchant in matches.items():
+                if matched_number == number and country in (None, matched_country):
+                    return merchant
+        return None
+
+    def with_actual_owner_counts(self):
+        """Annotate owner counts computed from BeneficialOwner rows."""
+        return self.annotate(
+            actual_owner_count=Count('owners'),
+            actual_minority_owner_count=Count('owners', filter=Q(owners__ownership_percentage__lt=MINORITY_THRESHOLD)),
+            actual_pep_owner_count=Count('owners', filter=Q(owners__is_pep=True)),
+            actual_corporate_owner_count=Count('owners', filter=Q(owners__corporate_entity__isnull=False)),
+        )
+
+    def with_owner_counter_drift(self):
+        """Merchants whose stored owner counters disagree with their owners."""
+        return self.with_actual_owner_counts().exclude(
+            owner_count=models.F('actual_owner_count'),
+            minority_owner_count=models.F('actual_minority_owner_count'),
+            pep_owner_count=models.F('actual_pep_owner_count'),
+            corporate_owner_count=models.F('actual_corporate_owner_count'),
+        )
+
+    def refresh_owner_counters(self):
+        """Recompute the owner counters from BeneficialOwner rows in one UPDATE."""
+        def owner_count(**filters):
+            counts = (
+                BeneficialOwner.objects.filter(merchant=OuterRef('pk'), **filters)
+                .order_by().values('merchant').annotate(n=Count('pk')).values('n')
+            )
+            return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+        return self.update(
+            owner_count=owner_count(),
+            minority_owner_count=owner_count(ownership_percentage__lt=MINORITY_THRESHOLD),
+            pep_owner_count=owner_count(is_pep=True),
+            corporate_owner_count=owner_count(corporate_entity__isnull=False),
+        )
+
 
 class Merchant(models.Model):
     """Main merchant entity for KYB onboarding."""
@@ -30,6 +281,16 @@ class Merchant(models.Model):
         ('UNDER_REVIEW', 'Under Review'),
     ]
 
+    SCREENING_STATUS_CHOICES = [
+        ('NOT_SCREENED', 'Not Screened'),
+        ('CLEAR', 'Clear'),
+        ('POTENTIAL_MATCH', 'Potential Match'),
+        ('MATCH', 'Match Found'),
+    ]
+
+    # Review flag of a merchant whose registration screening is finishing in the background
+    SCREENING_IN_PROGRESS = 'SCREENING_IN_PROGRESS'
+
     COUNTRY_CHOICES = [
         ('SG', 'Singapore'),
         ('PH', 'Philippines'),
@@ -41,7 +302,8 @@ class Merchant(models.Model):
 
     # Basic Info
     business_name = models.CharField(max_length=255)
-    registration_number = models.CharField(max_length=100, unique=True)
+    registration_number = models.CharField(max_length=100)
+    registration_number_normalized = models.CharField(max_length=100, unique=True, editable=False)
     country = models.CharField(max_length=2, choices=COUNTRY_CHOICES)
     business_category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
 
@@ -52,8 +314,58 @@ class Merchant(models.Model):
 
     # Risk & Status
     risk_level = models.CharField(max_length=10, choices=RISK_LEVEL_CHOICES, default='MEDIUM')
+    # Score of the latest risk assessment, written with risk_level
+    risk_score = models.IntegerField(null=True, blank=True, editable=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
 
+    # Risk features, maintained from BeneficialOwner changes
+    owner_count = models.PositiveIntegerField(default=0, editable=False)
+    minority_owner_count = models.PositiveIntegerField(default=0, editable=False)
+    pep_owner_count = models.PositiveIntegerField(default=0, editable=False)
+    corporate_owner_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Merchants sharing owners or contact details, maintained by merchants.links
+    link_cluster = models.ForeignKey(
+        'LinkCluster', on_delete=models.SET_NULL, null=True, blank=True,
+        editable=False, related_name='members',
+    )
+
+    # Findings for reviewers, e.g. similar earlier applications
+    review_flags = models.JSONField(default=list, blank=True, editable=False)
+
+    # Screening
+    screening_status = models.CharField(
+        max_length=20, choices=SCREENING_STATUS_CHOICES, default='NOT_SCREENED', db_index=True, editable=False,
+    )
+    screening_fingerprint = models.CharField(max_length=64, blank=True, editable=False)
+    current_screening_run = models.ForeignKey(
+        'screening.ScreeningRun', on_delete=models.SET_NULL, null=True, blank=True,
+        editable=False, related_name='+',
+    )
+
+    # Review queue, see merchants.review_queue; priority is null unless awaiting review
+    review_priority = models.GeneratedField(
+        expression=Case(
+            When(
+                status__in=REVIEW_STATUSES,
+                then=Case(
+                    *[
+                        When(screening_status=status, then=Value(weight))
+                        for status, weight in SCREENING_REVIEW_PRIORITY.items()
+                    ],
+                    default=Value(0),
+                ) + Coalesce(F('risk_score'), Value(0)),
+            ),
+            default=None,
+        ),
+        output_field=IntegerField(null=True),
+        db_persist=True,
+    )
+    claimed_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='claimed_merchants',
+    )
+    claimed_until = models.DateTimeField(null=True, blank=True, editable=False)
+
     # Audit
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -61,28 +373,91 @@ class Merchant(models.Model):
     review_notes = models.TextField(blank=True)
     review_date = models.DateTimeField(null=True, blank=True)
 
+    objects = MerchantQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Merchant'
         verbose_name_plural = 'Merchants'
+        indexes = [
+            models.Index(
+                fields=list(REVIEW_QUEUE_ORDER), condition=Q(review_priority__isnull=False),
+                name='merchant_review_queue',
+            ),
+            # Keyset pagination, see merchants.pagination
+            models.Index(fields=['-created_at', '-id'], name='merchant_created_keyset'),
+            models.Index(fields=['-updated_at', '-id'], name='merchant_updated_keyset'),
+        ]
 
     def __str__(self):
         return f"{self.business_name} ({self.registration_number})"
 
+    def save(self, *args, **kwargs):
+        """Keep the canonical registration number current, and never write
+        maintained columns from a possibly stale instance on update."""
+        self.registration_number_normalized = normalize_registration_number(self.registration_number, self.country)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'registration_number', 'country'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'registration_number_normalized'}
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and not field.generated and field.name not in MAINTAINED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    def refresh_from_db(self, *args, **kwargs):
+        """Reload, taking the reloaded status and risk level as the dashboard's last known state."""
+        super().refresh_from_db(*args, **kwargs)
+        if 'status' in self.__dict__ and 'risk_level' in self.__dict__:
+            self._dashboard_state = (self.status, self.risk_level)
+
     def get_latest_risk_assessment(self):
         """Get the most recent risk assessment."""
         return self.risk_assessments.order_by('-assessment_date').first()
 
+    def get_current_screening_results(self):
+        """Get the results of the current screening run."""
+        return self.screening_results.filter(run_id=self.current_screening_run_id)
+
     def get_screening_status(self):
-        """Get overall screening status."""
-        results = self.screening_results.all()
-        if results.filter(status='MATCH').exists():
-            return 'MATCH'
-        if results.filter(status='POTENTIAL_MATCH').exists():
-            return 'POTENTIAL_MATCH'
-        if results.exists():
-            return 'CLEAR'
-        return 'NOT_SCREENED'
+        """
+        Get overall screening status of the current screening run.
+
+        Kept on the merchant by screening so listings can filter and sort on
+        it without touching ScreeningResult.
+        """
+        return self.screening_status
+
+    @property
+    def screening_in_progress(self):
+        return any(flag.get('type') == self.SCREENING_IN_PROGRESS for flag in self.review_flags)
+
+
+class BeneficialOwnerQuerySet(models.QuerySet):
+    """Keeps merchant owner counters correct on bulk writes, which send no signals."""
+
+    def bulk_create(self, objs, *args, refresh_counters=True, **kwargs):
+        # refresh_counters=False when the merchants were saved with counters that already include these owners
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if refresh_counters:
+            Merchant.objects.filter(pk__in={obj.merchant_id for obj in objs}).refresh_owner_counters()
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        merchant_ids = set(self.filter(pk__in=[obj.pk for obj in objs]).values_list('merchant_id', flat=True))
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        merchant_ids.update(obj.merchant_id for obj in objs)
+        Merchant.objects.filter(pk__in=merchant_ids).refresh_owner_counters()
+        return rows
+
+    def update(self, **kwargs):
+        merchant_ids = set(self.values_list('merchant_id', flat=True))
+        rows = super().update(**kwargs)
+        if 'merchant' in kwargs or 'merchant_id' in kwargs:
+            merchant_ids.add(getattr(kwargs.get('merchant'), 'pk', kwargs.get('merchant_id')))
+        Merchant.objects.filter(pk__in=merchant_ids).refresh_owner_counters()
+        return rows
 
 
 class BeneficialOwner(models.Model):
@@ -94,6 +469,14 @@ class BeneficialOwner(models.Model):
     ]
 
     merchant = models.ForeignKey(Merchant, on_delete=models.CASCADE, related_name='owners')
+    # Set when the shareholder is a company; its own owners are resolved through the chain
+    corporate_entity = models.ForeignKey(
+        'CorporateEntity',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='merchant_holdings',
+    )
     full_name = models.CharField(max_length=255)
     nationality = models.CharField(max_length=2)
     ownership_percentage = models.DecimalField(max_digits=5, decimal_places=2)
@@ -103,6 +486,8 @@ class BeneficialOwner(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = BeneficialOwnerQuerySet.as_manager()
+
     class Meta:
         ordering = ['-ownership_percentage']
         verbose_name = 'Beneficial Owner'
@@ -111,6 +496,144 @@ class BeneficialOwner(models.Model):
     def __str__(self):
         return f"{self.full_name} ({self.ownership_percentage}%)"
 
+    def counter_contribution(self):
+        """This owner's contribution to its merchant's owner counters."""
+        return {
+            'owner_count': 1,
+            'minority_owner_count': int(self.ownership_percentage is not None and self.ownership_percentage < MINORITY_THRESHOLD),
+            'pep_owner_count': int(bool(self.is_pep)),
+            'corporate_owner_count': int(self.corporate_entity_id is not None),
+        }
+
+
+class CorporateEntity(models.Model):
+    """A company that holds shares in a merchant or in another company."""
+
+    name = models.CharField(max_length=255)
+    registration_number = models.CharField(max_length=100, blank=True)
+    country = models.CharField(max_length=2)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Corporate Entity'
+        verbose_name_plural = 'Corporate Entities'
+
+    def __str__(self):
+        return self.name
+
+
+class EntityOwnership(models.Model):
+    """
+    A shareholding in a corporate entity.
+
+    The shareholder is either another corporate entity (owner_entity) or a
+    natural person described by the identity fields.
+    """
+
+    entity = models.ForeignKey(CorporateEntity, on_delete=models.CASCADE, related_name='shareholders')
+    owner_entity = models.ForeignKey(
+        CorporateEntity,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='holdings',
+    )
+    full_name = models.CharField(max_length=255, blank=True)
+    nationality = models.CharField(max_length=2, blank=True)
+    id_document_type = models.CharField(max_length=20, choices=BeneficialOwner.ID_DOCUMENT_CHOICES, blank=True)
+    id_document_number = models.CharField(max_length=100, blank=True)
+    is_pep = models.BooleanField(default=False, verbose_name='Politically Exposed Person')
+    ownership_percentage = models.DecimalField(max_digits=5, decimal_places=2)
+
+    class Meta:
+        ordering = ['-ownership_percentage']
+        verbose_name = 'Entity Ownership'
+        verbose_name_plural = 'Entity Ownerships'
+
+    def __str__(self):
+        holder = self.owner_entity.name if self.owner_entity_id else self.full_name
+        return f"{holder} owns {self.ownership_percentage}% of {self.entity.name}"
+
+    def clean(self):
+        if self.owner_entity_id is None and not self.full_name:
+            raise ValidationError('A shareholding needs either an owning entity or a person.')
+        if self.owner_entity_id is not None and self.full_name:
+            raise ValidationError('A shareholding cannot have both an owning entity and a person.')
+        if self.owner_entity_id is not None and self.owner_entity_id == self.entity_id:
+            raise ValidationError('An entity cannot own itself.')
+
+
+class LinkCluster(models.Model):
+    """A group of merchants connected by shared owners or contact details."""
+
+    size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Link Cluster'
+        verbose_name_plural = 'Link Clusters'
+
+    def __str__(self):
+        return f"Cluster {self.pk} ({self.size} merchants)"
+
+
+class MerchantIdentifier(models.Model):
+    """A normalized owner or contact identifier, indexed to find linked merchants."""
+
+    KIND_CHOICES = [
+        ('OWNER_DOCUMENT', 'Owner ID Document'),
+        ('OWNER_NAME', 'Owner Name'),
+        ('CORPORATE_OWNER', 'Corporate Owner'),
+        ('EMAIL', 'Email'),
+        ('PHONE', 'Phone'),
+        ('ADDRESS', 'Address'),
+    ]
+
+    merchant = models.ForeignKey(Merchant, on_delete=models.CASCADE, related_name='identifiers')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    value = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['merchant', 'kind', 'value'], name='unique_merchant_identifier'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'value']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.value}"
+
+
+class MerchantSignature(models.Model):
+    """MinHash signature of a merchant's name and contact details."""
+
+    merchant = models.OneToOneField(
+        Merchant, on_delete=models.CASCADE, primary_key=True, related_name='similarity_signature',
+    )
+    signature = models.BinaryField()
+
+    def __str__(self):
+        return f"Signature for {self.merchant_id}"
+
+
+class SimilarityBucket(models.Model):
+    """One LSH band of a merchant's signature, indexed for candidate lookup."""
+
+    merchant = models.ForeignKey(Merchant, on_delete=models.CASCADE, related_name='similarity_buckets')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['band', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"Band {self.band} bucket {self.bucket}"
+
 
 class Document(models.Model):
     """Documents uploaded by merchants."""
@@ -156,6 +679,7 @@ class RiskAssessment(models.Model):
     assessed_by = models.CharField(max_length=50, choices=ASSESSOR_CHOICES, default='SYSTEM')
     assessor_user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     notes = models.TextField(blank=True)
+    rule_version = models.PositiveIntegerField(default=0, help_text='Risk rule set version used (0 = built-in rules)')
 
     class Meta:
         ordering = ['-assessment_date']
@@ -166,9 +690,117 @@ class RiskAssessment(models.Model):
         return f"Risk Assessment for {self.merchant.business_name}: {self.risk_score}"
 
     def get_risk_level(self):
-        """Convert score to risk level."""
-        if self.risk_score <= 30:
-            return 'LOW'
-        elif self.risk_score <= 60:
-            return 'MEDIUM'
-        return 'HIGH'
+        """Convert score to risk level with the thresholds of the rule version that scored it."""
+        from .risk_engine import rules_for_version
+        return rules_for_version(self.rule_version).risk_level(self.risk_score)
+
+
+class RiskRuleSet(models.Model):
+    """Versioned risk scoring rules. The newest active version is applied."""
+
+    version = models.PositiveIntegerField(unique=True)
+    rules = models.JSONField(help_text='Rule keys to override on top of the built-in rules')
+    is_active = models.BooleanField(default=True)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        ordering = ['-version']
+        verbose_name = 'Risk Rule Set'
+        verbose_name_plural = 'Risk Rule Sets'
+
+    def __str__(self):
+        return f"Risk rules v{self.version}"
+
+
+class ReviewDecision(models.Model):
+    """A status change made by a compliance officer, for the audit trail."""
+
+    merchant = models.ForeignKey(Merchant, on_delete=models.CASCADE, related_name='review_decisions')
+    previous_status = models.CharField(max_length=20, choices=Merchant.STATUS_CHOICES)
+    status = models.CharField(max_length=20, choices=Merchant.STATUS_CHOICES)
+    decided_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    decided_at = models.DateTimeField()
+    notes = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-decided_at']
+        verbose_name = 'Review Decision'
+        verbose_name_plural = 'Review Decisions'
+
+    def __str__(self):
+        return f"{self.merchant_id}: {self.previous_status} -> {self.status} by {self.decided_by}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client-supplied key for a registration submission and its first response.
+
+    Retries with the same key replay the stored response instead of
+    registering again. Keys expire after IDEMPOTENCY_KEY_TTL seconds.
+    """
+
+    STATUS_CHOICES = [
+        ('IN_PROGRESS', 'In Progress'),
+        ('COMPLETE', 'Complete'),
+    ]
+
+    scope = models.CharField(max_length=50)
+    # Who sent the key, so different clients' keys never collide
+    client = models.CharField(max_length=100, blank=True)
+    key = models.CharField(max_length=255)
+    request_fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='IN_PROGRESS')
+    # Lease of the request processing this key; another may take over once it passes
+    locked_until = models.DateTimeField(null=True, blank=True)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_headers = models.JSONField(default=dict, blank=True)
+    response_body = models.BinaryField(default=b'')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'client', 'key'], name='unique_idempotency_key'),
+        ]
+        verbose_name = 'Idempotency Key'
+        verbose_name_plural = 'Idempotency Keys'
+
+    def __str__(self):
+        return f"{self.scope}: {self.key}"
+
+
+class DashboardCounterQuerySet(models.QuerySet):
+    """QuerySet for dashboard counters."""
+
+    def apply(self, delta):
+        """Add a Counter of changes to the stored counts in one UPDATE."""
+        delta = {name: change for name, change in delta.items() if change}
+        if not delta:
+            return
+        self.filter(name__in=delta).update(count=F('count') + Case(
+            *(When(name=name, then=Value(change)) for name, change in delta.items()),
+            output_field=BigIntegerField(),
+        ))
+
+
+class DashboardCounter(models.Model):
+    """
+    Materialized compliance dashboard count, kept up to date as merchants change.
+
+    Only maintained with the DASHBOARD_COUNTERS setting on; rows are created
+    by manage.py reconcile_dashboard_counters, which also corrects drift.
+    """
+
+    name = models.CharField(max_length=30, unique=True)
+    count = models.BigIntegerField(default=0)
+
+    objects = DashboardCounterQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Dashboard Counter'
+        verbose_name_plural = 'Dashboard Counters'
+
+    def __str__(self):
+        return f"{self.name}: {self.count}"
@@ -0,0 +1,105 @@
+"""
+Keyset (cursor) pagination for merchant listings.
+
+Each page is the rows that follow the previous page's last row in the
+listing's order, e.g. WHERE (created_at, id) < (its created_at, its id),
+rather than the rows after an OFFSET. With an index in the same order a
+page deep in the listing reads as few rows as the first, and rows inserted
+meanwhile don't shift later pages.
+
+Cursors are opaque URL-safe strings holding the last row's ordering values.
+Orderings must end with a unique field and have no nullable fields.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# Orderings served by the merchant_created_keyset and merchant_updated_keyset indexes
+CREATED_ORDER = ('-created_at', '-id')
+UPDATED_ORDER = ('-updated_at', '-id')
+
+
+class InvalidCursor(ValueError):
+    """A cursor that wasn't issued for this listing's ordering."""
+
+
+class KeysetPage:
+    """One page of a listing, with the cursor of the next page or None on the last."""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def _fields(ordering):
+    return [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+
+def encode_cursor(obj, ordering):
+    """Cursor for the rows after obj in this ordering."""
+    values = [getattr(obj, name) for name, _ in _fields(ordering)]
+    payload = json.dumps({'o': list(ordering), 'v': values}, default=lambda value: value.isoformat())
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(model, ordering, cursor):
+    """
+    Ordering values held in a cursor, converted to the fields' types.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed or for another ordering
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        cursor_ordering, values = payload['o'], payload['v']
+    except (binascii.Error, ValueError, TypeError, KeyError) as exc:
+        raise InvalidCursor('Malformed cursor.') from exc
+    if cursor_ordering != list(ordering) or not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor('Cursor is for a different ordering.')
+    try:
+        return [model._meta.get_field(name).to_python(value) for (name, _), value in zip(_fields(ordering), values)]
+    except ValidationError as exc:
+        raise InvalidCursor('Malformed cursor.') from exc
+
+
+def _after(ordering, values):
+    """Filter for the rows after the given ordering values."""
+    fields = _fields(ordering)
+    after = Q()
+    for i, (name, descending) in enumerate(fields):
+        equal = {prefix: value for (prefix, _), value in zip(fields[:i], values[:i])}
+        after |= Q(**equal, **{f"{name}__{'lt' if descending else 'gt'}": values[i]})
+    # Bound the leading column as well, so the database can range-scan the index
+    name, descending = fields[0]
+    return Q(**{f"{name}__{'lte' if descending else 'gte'}": values[0]}) & after
+
+
+def keyset_page(queryset, ordering, cursor=None, size=20):
+    """
+    One page of a queryset in the given order.
+
+    Args:
+        queryset: Rows to list
+        ordering: Field names as for order_by, ending with a unique field
+        cursor: next_cursor of the previous page, or None for the first page
+        size: Rows per page
+
+    Returns:
+        KeysetPage
+
+    Raises:
+        InvalidCursor: If the cursor wasn't issued for this ordering
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(_after(ordering, decode_cursor(queryset.model, ordering, cursor)))
+    items = list(queryset[:size + 1])
+    next_cursor = encode_cursor(items[size - 1], ordering) if len(items) > size else None
+    return KeysetPage(items[:size], next_cursor)
@@ -0,0 +1,235 @@
+"""
+Vectorized risk scoring across the whole merchant portfolio.
+
+Loads compact feature columns into NumPy arrays and scores every merchant
+at once with the same rules as calculate_risk_score.
+"""
+import logging
+from collections import Counter
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+
+from .models import MINORITY_THRESHOLD, Merchant
+from .links import ADVERSE, cluster_stats
+from .risk_engine import get_active_rules
+from .ubo import resolve_owner_features
+
+logger = logging.getLogger(__name__)
+
+RISK_LEVELS = ['LOW', 'MEDIUM', 'HIGH']
+LEVEL_CODES = {level: code for code, level in enumerate(RISK_LEVELS)}
+
+
+class PortfolioFeatures:
+    """Column arrays of the inputs risk scoring depends on."""
+
+    def __init__(self, ids, categories, countries, small_shareholders, pep_counts, risk_levels, extra=None,
+                 link_sizes=None, linked_adverse=None):
+        self.ids = ids
+        self.categories = categories
+        self.countries = countries
+        self.small_shareholders = small_shareholders
+        self.pep_counts = pep_counts
+        self.risk_levels = risk_levels
+        self.extra = extra or {}
+        self.link_sizes = link_sizes if link_sizes is not None else np.ones(len(ids), dtype=np.int64)
+        self.linked_adverse = linked_adverse if linked_adverse is not None else np.zeros(len(ids), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def load_features(queryset=None, minority_threshold=None, extra_fields=(), chunk_size=5000):
+    """
+    Load risk features for a merchant queryset into NumPy arrays.
+
+    Category and country codes are kept as small object arrays and encoded
+    against a rule set at scoring time, so one load serves any rule set with
+    the same minority threshold. At the stored counter threshold the owner
+    features are read straight from the merchant row; other thresholds count
+    owners in the query. Merchants with corporate shareholders have their
+    ultimate owners resolved instead. Link cluster features come from one
+    grouped query over the clustered merchants. Any extra_fields are loaded alongside into
+    features.extra.
+
+    Returns:
+        PortfolioFeatures
+    """
+    if queryset is None:
+        queryset = Merchant.objects.all()
+    if minority_threshold is None:
+        minority_threshold = get_active_rules().minority_threshold
+
+    queryset = queryset.order_by('pk').annotate(
+        is_adverse=Case(When(ADVERSE, then=Value(1)), default=Value(0), output_field=IntegerField()),
+    )
+    if minority_threshold == MINORITY_THRESHOLD:
+        owner_features = ('minority_owner_count', 'pep_owner_count')
+    else:
+        queryset = queryset.annotate(
+            small_shareholders=Count('owners', filter=Q(owners__ownership_percentage__lt=minority_threshold)),
+            pep_count=Count('owners', filter=Q(owners__is_pep=True)),
+        )
+        owner_features = ('small_shareholders', 'pep_count')
+    rows = (
+        queryset
+        .values_list(
+            'pk', 'business_category', 'country', *owner_features, 'risk_level', 'corporate_owner_count',
+            'link_cluster_id', 'is_adverse', *extra_fields,
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    ids, categories, countries, small, pep, levels = [], [], [], [], [], []
+    corporate = {}
+    clusters, adverse_flags = [], []
+    extra = {field: [] for field in extra_fields}
+    for row in rows:
+        pk, category, country, small_shareholders, pep_count, risk_level, corporate_owners = row[:7]
+        if corporate_owners:
+            corporate[pk] = len(ids)
+        clusters.append(row[7])
+        adverse_flags.append(row[8])
+        ids.append(pk)
+        categories.append(category)
+        countries.append(country)
+        small.append(small_shareholders)
+        pep.append(pep_count)
+        levels.append(LEVEL_CODES.get(risk_level, -1))
+        for field, value in zip(extra_fields, row[9:]):
+            extra[field].append(value)
+
+    for pk, (small_shareholders, pep_count) in resolve_owner_features(list(corporate), minority_threshold).items():
+        small[corporate[pk]] = small_shareholders
+        pep[corporate[pk]] = pep_count
+
+    stats = cluster_stats() if any(cluster is not None for cluster in clusters) else {}
+    link_sizes = [stats.get(cluster, (1, 0))[0] for cluster in clusters]
+    linked_adverse = [
+        stats.get(cluster, (1, 0))[1] - flag if cluster is not None else 0
+        for cluster, flag in zip(clusters, adverse_flags)
+    ]
+
+    return PortfolioFeatures(
+        ids=np.array(ids, dtype=np.int64),
+        categories=np.array(categories, dtype=object),
+        countries=np.array(countries, dtype=object),
+        small_shareholders=np.array(small, dtype=np.int64),
+        pep_counts=np.array(pep, dtype=np.int64),
+        risk_levels=np.array(levels, dtype=np.int8),
+        extra={field: np.array(values, dtype=object) for field, values in extra.items()},
+        link_sizes=np.array(link_sizes, dtype=np.int64),
+        linked_adverse=np.array(linked_adverse, dtype=np.int64),
+    )
+
+
+def _contributions(codes, table, default):
+    """Map each code to its precomputed score contribution."""
+    unique_codes, inverse = np.unique(codes, return_inverse=True)
+    lookup = np.array([table.get(code, default)[1] for code in unique_codes], dtype=np.float64)
+    return lookup[inverse]
+
+
+def score_features(features, rules=None):
+    """
+    Score every merchant in a feature set.
+
+    Additions happen in the same order as CompiledRules.score, so scores
+    match calculate_risk_score exactly.
+
+    Returns:
+        tuple: (scores: int array, level codes: int8 array indexing RISK_LEVELS)
+    """
+    if rules is None:
+        rules = get_active_rules()
+
+    score = _contributions(features.categories, rules.category_table, rules.default_category)
+    score = score + _contributions(features.countries, rules.country_table, rules.default_country)
+
+    small = features.small_shareholders
+    score = score + np.where(
+        small >= rules.complex_min,
+        rules.complex_points,
+        np.where(small >= rules.multiple_min, rules.multiple_points, 0),
+    )
+    score = score + np.where(features.pep_counts > 0, rules.pep_points, 0)
+    score = score + np.where(features.link_sizes >= rules.linked_min_size, rules.linked_points, 0)
+    score = score + np.where(features.linked_adverse > 0, rules.linked_adverse_points, 0)
+
+    scores = np.minimum(np.floor(score).astype(np.int64), 100)
+    levels = np.where(
+        scores <= rules.low_threshold, 0, np.where(scores <= rules.medium_threshold, 1, 2)
+    ).astype(np.int8)
+    return scores, levels
+
+
+def transition_counts(old_levels, new_levels):
+    """
+    Count merchants per (old level, new level) pair where the level changed.
+
+    Returns:
+        dict: (old, new) -> count
+    """
+    changed = old_levels != new_levels
+    pairs = Counter(zip(old_levels[changed].tolist(), new_levels[changed].tolist()))
+    return {
+        (RISK_LEVELS[old] if old >= 0 else None, RISK_LEVELS[new]): count
+        for (old, new), count in pairs.items()
+    }
+
+
+def recompute_portfolio_risk(queryset=None, rules=None, chunk_size=1000, dry_run=False):
+    """
+    Recompute risk scores and levels for a portfolio and write back only the changes.
+
+    A merchant is written when its score or its level changed; 'changed',
+    'raised', 'lowered' and 'transitions' count level changes only.
+
+    Args:
+        queryset: Merchants to recompute, defaulting to all
+        rules: CompiledRules to apply, defaulting to the active rules
+        chunk_size: Rows per bulk_update
+        dry_run: Report transitions without writing
+
+    Returns:
+        dict: 'scored', 'rescored', 'changed', 'raised', 'lowered' counts and
+            'transitions'
+    """
+    if rules is None:
+        rules = get_active_rules()
+
+    features = load_features(queryset, rules.minority_threshold, extra_fields=('risk_score',))
+    scores, levels = score_features(features, rules)
+
+    level_changed = features.risk_levels != levels
+    # Stored scores are None until first scored, which never equals a score
+    rescored = np.flatnonzero(level_changed | (features.extra['risk_score'] != scores))
+    changed = np.flatnonzero(level_changed)
+    raised = int(np.count_nonzero(levels[changed] > features.risk_levels[changed]))
+
+    if not dry_run:
+        for start in range(0, len(rescored), chunk_size):
+            chunk = rescored[start:start + chunk_size]
+            with transaction.atomic():
+                Merchant.objects.bulk_update(
+                    [
+                        Merchant(pk=int(pk), risk_score=int(score), risk_level=RISK_LEVELS[level])
+                        for pk, score, level in zip(features.ids[chunk], scores[chunk], levels[chunk])
+                    ],
+                    ['risk_score', 'risk_level'],
+                )
+
+    report = {
+        'scored': len(features),
+        'rescored': len(rescored),
+        'changed': len(changed),
+        'raised': raised,
+        'lowered': len(changed) - raised,
+        'transitions': transition_counts(features.risk_levels, levels),
+    }
+    logger.info(
+        f"Portfolio risk recompute (rules v{rules.version}{', dry run' if dry_run else ''}): "
+        f"{report['scored']} scored, {report['raised']} raised, {report['lowered']} lowered"
+    )
+    return report
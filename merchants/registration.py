@@ -0,0 +1,201 @@
+"""
+Batch merchant registration.
+
+Validates registrations with the same form and owner formset rules as the
+registration page, inserts every valid merchant and its owners with two bulk
+inserts, and decides them with decide_merchants in one set-based pass, or
+queues them for a worker when tasks are not run eagerly.
+"""
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from taskqueue.queue import enqueue, is_eager
+
+from .forms import BeneficialOwnerFormSet, MerchantRegistrationForm
+from .models import BeneficialOwner, Merchant, normalize_registration_number
+from .rerisk import suppress_rerisk
+from .tasks import DECIDE_REGISTRATIONS, decide_merchants
+
+logger = logging.getLogger(__name__)
+
+# Most merchants accepted in one batch registration call
+REGISTRATION_BATCH_LIMIT = getattr(settings, 'REGISTRATION_BATCH_LIMIT', 100)
+
+OWNER_FIELDS = ('full_name', 'nationality', 'ownership_percentage', 'id_document_type', 'id_document_number', 'is_pep')
+
+
+class Registration:
+    """One submitted registration: its validated instances, or its errors."""
+
+    def __init__(self, index, merchant=None, owners=(), errors=None):
+        self.index = index
+        self.merchant = merchant
+        self.owners = list(owners)
+        self.errors = errors or {}
+        # Sanctions matches from match_merchants, when matched ahead of the insert
+        self.match = None
+
+    @property
+    def is_valid(self):
+        return not self.errors
+
+    def result(self):
+        """JSON-serializable outcome for API responses."""
+        if self.errors:
+            return {'index': self.index, 'errors': self.errors}
+        merchant = self.merchant
+        return {
+            'index': self.index,
+            'id': merchant.pk,
+            'registration_number': merchant.registration_number,
+            'business_name': merchant.business_name,
+            'status': merchant.status,
+            'risk_level': merchant.risk_level,
+            'screening_status': merchant.screening_status,
+        }
+
+
+def owner_formset_data(owners):
+    """Formset POST data for a list of owner dicts."""
+    data = {
+        'owners-TOTAL_FORMS': str(len(owners)),
+        'owners-INITIAL_FORMS': '0',
+        'owners-MIN_NUM_FORMS': '0',
+        'owners-MAX_NUM_FORMS': '1000',
+    }
+    for i, owner in enumerate(owners):
+        for field in OWNER_FIELDS:
+            if field in owner:
+                data[f'owners-{i}-{field}'] = owner[field]
+    return data
+
+
+def validate_registration(index, data):
+    """
+    Validate one registration given as a dict with an optional 'owners' list.
+
+    Returns:
+        Registration: With an unsaved merchant and owners, or with errors
+            keyed by field, owner errors under 'owners'
+    """
+    if not isinstance(data, dict):
+        return Registration(index, errors={'__all__': ['Expected an object.']})
+    owners = data.get('owners') or []
+    if not isinstance(owners, list) or not all(isinstance(owner, dict) for owner in owners):
+        return Registration(index, errors={'owners': ['Expected a list of objects.']})
+
+    form = MerchantRegistrationForm(data)
+    owner_formset = BeneficialOwnerFormSet(owner_formset_data(owners), prefix='owners')
+    if not form.is_valid() or not owner_formset.is_valid():
+        errors = {field: list(messages) for field, messages in form.errors.items()}
+        owner_errors = [
+            {field: list(messages) for field, messages in form_errors.items()} for form_errors in owner_formset.errors
+        ]
+        if any(owner_errors) or owner_formset.non_form_errors():
+            errors['owners'] = owner_errors + list(owner_formset.non_form_errors())
+        return Registration(index, errors=errors)
+
+    merchant = form.save(commit=False)
+    merchant.status = 'PENDING'
+    owner_formset.instance = merchant
+    owners = owner_formset.save(commit=False)
+    for owner in owners:
+        for field, value in owner.counter_contribution().items():
+            setattr(merchant, field, getattr(merchant, field) + value)
+    return Registration(index, merchant, owners)
+
+
+def _reject_duplicates(registrations):
+    """Flag registrations whose canonical number exists already or earlier in the batch."""
+    valid = [registration for registration in registrations if registration.is_valid]
+    for registration in valid:
+        registration.merchant.registration_number_normalized = normalize_registration_number(
+            registration.merchant.registration_number, registration.merchant.country,
+        )
+    taken = set(
+        Merchant.objects.filter(
+            registration_number_normalized__in=[registration.merchant.registration_number_normalized for registration in valid],
+        ).values_list('registration_number_normalized', flat=True)
+    )
+    for registration in valid:
+        number = registration.merchant.registration_number_normalized
+        if number in taken:
+            registration.errors = {'registration_number': [MerchantRegistrationForm.DUPLICATE_REGISTRATION_NUMBER]}
+        taken.add(number)
+
+
+def _insert(registrations):
+    merchants = Merchant.objects.bulk_create([registration.merchant for registration in registrations])
+    owners = []
+    for registration, merchant in zip(registrations, merchants):
+        for owner in registration.owners:
+            owner.merchant = merchant
+            owners.append(owner)
+    BeneficialOwner.objects.bulk_create(owners, refresh_counters=False)
+    return merchants
+
+
+def save_registrations(registrations, eager=None):
+    """
+    Insert and decide validated registrations.
+
+    Registrations whose number is taken, in the database or earlier in the
+    list, get an error instead. The rest are saved in one transaction; if
+    another request takes one of their registration numbers meanwhile,
+    duplicates are re-checked and the insert retried once.
+
+    Args:
+        registrations: Registration objects from validate_registration
+        eager: Decide in this transaction rather than queueing a task,
+            defaulting to whether tasks run eagerly
+    """
+    if eager is None:
+        eager = is_eager()
+    for attempt in range(2):
+        _reject_duplicates(registrations)
+        valid = [registration for registration in registrations if registration.is_valid]
+        if not valid:
+            return
+        try:
+            with transaction.atomic(), suppress_rerisk():
+                merchants = _insert(valid)
+                if eager:
+                    matches = None
+                    if all(registration.match is not None for registration in valid):
+                        matches = [registration.match for registration in valid]
+                    decide_merchants(merchants, {
+                        registration.merchant.pk: registration.owners for registration in valid
+                    }, matches)
+                else:
+                    enqueue(DECIDE_REGISTRATIONS, merchant_ids=[merchant.pk for merchant in merchants])
+        except IntegrityError:
+            if attempt:
+                raise
+            for registration in valid:
+                registration.merchant.pk = None
+                registration.merchant._state.adding = True
+            continue
+        return
+
+
+def register_merchants(items):
+    """
+    Validate, insert and decide a batch of registrations.
+
+    Invalid and duplicate items are reported without affecting the rest.
+
+    Args:
+        items: Registration dicts, as accepted by validate_registration
+
+    Returns:
+        list: Registration per item, in order
+    """
+    registrations = [validate_registration(index, data) for index, data in enumerate(items)]
+    save_registrations(registrations)
+    logger.info(
+        f"Batch registration: {sum(registration.is_valid for registration in registrations)} of "
+        f"{len(registrations)} merchant(s) registered"
+    )
+    return registrations
@@ -0,0 +1,83 @@
+"""
+Incremental re-risking after ownership or business detail edits.
+
+Changes to a merchant's owners or risk-relevant fields queue a re-risk and
+rescreen for that merchant (merchants.tasks.schedule_rerisk), delayed by
+RERISK_DEBOUNCE_SECONDS and keyed by merchant. A schedule for a merchant
+whose re-risk is still waiting pushes that task back, so a burst of admin
+inline edits triggers one recompute, after the burst.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+
+from screening.services import rescreen_merchant
+
+from .links import link_merchant
+from .models import Merchant, RiskAssessment
+from .risk_engine import calculate_risk_score, get_active_rules
+from .similarity import flag_similar_merchants
+
+logger = logging.getLogger(__name__)
+
+RERISK_DEBOUNCE_SECONDS = getattr(settings, 'RERISK_DEBOUNCE_SECONDS', 5)
+
+# Merchant fields that feed risk scoring, screening, linking or similarity
+RERISK_FIELDS = ('business_name', 'country', 'business_category', 'email', 'phone', 'address')
+
+_local = threading.local()
+
+
+def rerisk_merchant(merchant_id):
+    """
+    Re-link, re-flag, re-score and rescreen one merchant from its current data.
+
+    Records a new RiskAssessment and updates risk_level when it changed;
+    rescreening is skipped when the screened identity is unchanged.
+
+    Returns:
+        tuple: (score: int, factors: list, risk_level: str), or None if the
+            merchant no longer exists
+    """
+    merchant = Merchant.objects.select_related('current_screening_run').filter(pk=merchant_id).first()
+    if merchant is None:
+        return None
+
+    link_merchant(merchant)
+    flag_similar_merchants(merchant)
+    Merchant.objects.filter(pk=merchant.pk).update(review_flags=merchant.review_flags)
+    rules = get_active_rules()
+    score, factors, risk_level = calculate_risk_score(merchant, rules=rules)
+    with transaction.atomic():
+        RiskAssessment.objects.create(
+            merchant=merchant,
+            risk_score=score,
+            risk_factors=factors,
+            assessed_by='SYSTEM',
+            rule_version=rules.version,
+            notes='Re-assessed after ownership or business details changed.',
+        )
+        if merchant.risk_level != risk_level:
+            logger.info(f"Risk level for {merchant.business_name} changed: {merchant.risk_level} -> {risk_level}")
+        if (merchant.risk_level, merchant.risk_score) != (risk_level, score):
+            merchant.risk_level, merchant.risk_score = risk_level, score
+            Merchant.objects.filter(pk=merchant.pk).update(risk_level=risk_level, risk_score=score)
+    rescreen_merchant(merchant)
+    return score, factors, risk_level
+
+
+def rerisk_suppressed():
+    return bool(getattr(_local, 'suppressed', 0))
+
+
+@contextmanager
+def suppress_rerisk():
+    """Skip re-risk scheduling for writes that score the merchant themselves."""
+    _local.suppressed = getattr(_local, 'suppressed', 0) + 1
+    try:
+        yield
+    finally:
+        _local.suppressed -= 1
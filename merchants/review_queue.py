@@ -0,0 +1,168 @@
+"""
+Review queue for compliance officers.
+
+Merchants awaiting a decision are worked highest review_priority first (a
+possible sanctions match, then clear screening, then screening still
+running, each ordered by risk score), oldest first within a priority. The
+priority is a generated column, null for merchants not awaiting review, and
+this is the order of the merchant_review_queue index over the non-null
+ones, so taking the next case reads a few index entries however many
+merchants there are.
+
+An officer claims the next case under a lease, so concurrent officers never
+get the same case. Claims use SELECT ... FOR UPDATE SKIP LOCKED where the
+database supports it, so officers claiming at once each take a different
+row without waiting, and a compare-and-swap on the lease expiry otherwise
+(SQLite). A case whose lease runs out returns to the queue.
+
+Selections of cases are approved or rejected as a set by decide_cases, a
+chunk at a time, each chunk with one UPDATE and one insert of its
+ReviewDecision audit rows.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import REVIEW_QUEUE_ORDER, REVIEW_STATUSES, Merchant, ReviewDecision
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed case stays with its officer
+REVIEW_LEASE_SECONDS = getattr(settings, 'REVIEW_LEASE_SECONDS', 15 * 60)
+# Unclaimed cases tried per round of compare-and-swap claiming
+CLAIM_CANDIDATES = 10
+# Cases decided per transaction by decide_cases
+DECISION_CHUNK_SIZE = 500
+
+
+def review_queue():
+    """Merchants awaiting review, highest priority first."""
+    # Filtering on the priority rather than the statuses lets the partial index serve the query
+    return Merchant.objects.filter(review_priority__isnull=False).order_by(*REVIEW_QUEUE_ORDER)
+
+
+def _claimable(now):
+    return review_queue().filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now))
+
+
+def _lease(user, now):
+    return {'claimed_by': user, 'claimed_until': now + timedelta(seconds=REVIEW_LEASE_SECONDS)}
+
+
+def current_claim(user):
+    """The case an officer holds a live lease on, or None."""
+    return review_queue().filter(claimed_by=user, claimed_until__gte=timezone.now()).first()
+
+
+def claim_next(user):
+    """
+    Lease the next case to an officer.
+
+    An officer holding a live lease keeps that case, with the lease renewed,
+    until they decide or release it.
+
+    Args:
+        user: The officer claiming
+
+    Returns:
+        Merchant or None: The claimed case, or None if every case awaiting
+            review is claimed
+    """
+    now = timezone.now()
+    held = current_claim(user)
+    if held is not None:
+        lease = _lease(user, now)
+        if Merchant.objects.filter(pk=held.pk, claimed_by=user, claimed_until=held.claimed_until).update(**lease):
+            held.claimed_until = lease['claimed_until']
+            return held
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            pk = _claimable(now).select_for_update(skip_locked=True).values_list('pk', flat=True).first()
+            if pk is not None:
+                Merchant.objects.filter(pk=pk).update(**_lease(user, now))
+    else:
+        pk = None
+        while pk is None:
+            candidates = list(_claimable(now).values_list('pk', 'claimed_until')[:CLAIM_CANDIDATES])
+            if not candidates:
+                break
+            # Compare-and-swap: a case whose lease expiry changed was claimed by someone else
+            for candidate, claimed_until in candidates:
+                if _claimable(now).filter(pk=candidate, claimed_until=claimed_until).update(**_lease(user, now)):
+                    pk = candidate
+                    break
+
+    if pk is None:
+        return None
+    logger.info(f"Review case {pk} claimed by {user}")
+    return Merchant.objects.get(pk=pk)
+
+
+def release_claim(merchant, user):
+    """Return an officer's case to the queue. Returns whether they held it."""
+    return bool(
+        Merchant.objects.filter(pk=merchant.pk, claimed_by=user).update(claimed_by=None, claimed_until=None)
+    )
+
+
+def decide_cases(queryset, status, user, notes='', chunk_size=DECISION_CHUNK_SIZE):
+    """
+    Approve or reject every merchant in a queryset that awaits review.
+
+    Merchants are decided in pk order, chunk_size per transaction, so a large
+    selection never holds its row locks for long. Each chunk's rows are
+    locked and their statuses read in one query, then decided with one
+    UPDATE guarded on the review statuses and audited with one ReviewDecision
+    bulk insert. Merchants already decided are left as they are, and any
+    review queue claims on them are released with one more UPDATE. Dashboard counters and live updates
+    follow through MerchantQuerySet.update.
+
+    Args:
+        queryset: Merchants to decide
+        status: 'APPROVED' or 'REJECTED'
+        user: Officer recorded as the reviewer
+        notes: Recorded with each decision
+        chunk_size: Merchants decided per transaction
+
+    Returns:
+        list: pks of the merchants decided
+    """
+    if status in REVIEW_STATUSES:
+        raise ValueError(f"'{status}' is not a decision")
+    # Re-selected by pk so locking works whatever joins or DISTINCT the queryset has
+    awaiting = Merchant.objects.filter(pk__in=queryset.values('pk'), status__in=REVIEW_STATUSES).order_by('pk')
+    decided = []
+    while True:
+        chunk = awaiting.filter(pk__gt=decided[-1]) if decided else awaiting
+        now = timezone.now()
+        with transaction.atomic():
+            previous = dict(chunk.select_for_update().values_list('pk', 'status')[:chunk_size])
+            if not previous:
+                break
+            Merchant.objects.filter(pk__in=list(previous), status__in=REVIEW_STATUSES).update(
+                status=status, reviewed_by=user, review_date=now, updated_at=now, claimed_by=None, claimed_until=None,
+            )
+            ReviewDecision.objects.bulk_create([
+                ReviewDecision(
+                    merchant_id=pk, previous_status=previous_status, status=status, decided_by=user, decided_at=now,
+                    notes=notes,
+                )
+                for pk, previous_status in previous.items()
+            ])
+        decided.extend(previous)
+        if len(previous) < chunk_size:
+            break
+
+    # Cases decided elsewhere in the meantime can't be worked on, so nobody should hold them
+    Merchant.objects.filter(pk__in=queryset.values('pk'), claimed_by__isnull=False).exclude(
+        status__in=REVIEW_STATUSES,
+    ).update(claimed_by=None, claimed_until=None)
+
+    logger.info(f"{len(decided)} merchant(s) set to {status} by {user}")
+    return decided
+
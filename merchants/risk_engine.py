@@ -1,7 +1,28 @@
 """
 Risk scoring engine for merchant KYB.
+
+Scoring rules are data: the built-in defaults below, or the newest active
+RiskRuleSet version in the database. A rule set is validated and compiled
+once into lookup tables, and each worker swaps in a new compiled version
+when the active version changes.
 """
+import copy
+import hashlib
+import json
 import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import MINORITY_THRESHOLD, Merchant, RiskAssessment, RiskRuleSet
+from .links import link_features, with_link_features
+from .similarity import has_rejected_lookalike
+from .ubo import resolve_beneficial_owners, resolve_owner_features
 
 logger = logging.getLogger(__name__)
 
@@ -32,78 +53,446 @@ RISK_THRESHOLDS = {
     'HIGH': 100,
 }
 
+# Built-in rule set, used when no RiskRuleSet is active (version 0).
+# Stored rule sets only need the keys they change.
+DEFAULT_RULES = {
+    'category_weights': CATEGORY_WEIGHTS,
+    'default_category_weight': 50,
+    'category_share': 0.4,
+    'high_risk_category_weight': 80,
+    'medium_risk_category_weight': 40,
+    'country_weights': COUNTRY_WEIGHTS,
+    'default_country_weight': 30,
+    'country_share': 0.3,
+    'high_risk_country_weight': 40,
+    'minority_threshold': 25,
+    'complex_ownership_min_count': 4,
+    'complex_ownership_points': 15,
+    'multiple_minority_min_count': 2,
+    'multiple_minority_points': 8,
+    'pep_points': 15,
+    'linked_cluster_min_size': 3,
+    'linked_cluster_points': 5,
+    'linked_adverse_points': 20,
+    'beneficial_owner_required_weight': 40,
+    'thresholds': RISK_THRESHOLDS,
+}
+
+# Seconds a worker trusts its compiled rules before checking the active version
+RULES_REFRESH_SECONDS = getattr(settings, 'RISK_RULES_REFRESH_SECONDS', 30)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_rules(rules):
+    """
+    Validate a rule definition merged onto the defaults.
+
+    Returns:
+        dict: The complete rule set
+
+    Raises:
+        ValueError: Describing the first invalid or unknown key
+    """
+    if not isinstance(rules, dict):
+        raise ValueError('Rules must be a JSON object.')
+
+    unknown = set(rules) - set(DEFAULT_RULES)
+    if unknown:
+        raise ValueError(f"Unknown rule keys: {', '.join(sorted(unknown))}")
+
+    merged = copy.deepcopy(DEFAULT_RULES)
+    merged.update(copy.deepcopy(rules))
+
+    for key in ('category_weights', 'country_weights'):
+        weights = merged[key]
+        if not isinstance(weights, dict) or not all(
+            isinstance(code, str) and _is_number(weight) and 0 <= weight <= 100
+            for code, weight in weights.items()
+        ):
+            raise ValueError(f"'{key}' must map codes to weights between 0 and 100.")
+
+    for key in ('category_share', 'country_share'):
+        if not _is_number(merged[key]) or not 0 <= merged[key] <= 1:
+            raise ValueError(f"'{key}' must be a number between 0 and 1.")
+
+    for key in ('complex_ownership_min_count', 'multiple_minority_min_count', 'linked_cluster_min_size'):
+        if not isinstance(merged[key], int) or isinstance(merged[key], bool) or merged[key] < 1:
+            raise ValueError(f"'{key}' must be a positive integer.")
+    if merged['complex_ownership_min_count'] <= merged['multiple_minority_min_count']:
+        raise ValueError("'complex_ownership_min_count' must be above 'multiple_minority_min_count'.")
+
+    for key in (
+        'default_category_weight', 'high_risk_category_weight', 'medium_risk_category_weight',
+        'default_country_weight', 'high_risk_country_weight', 'minority_threshold',
+        'complex_ownership_points', 'multiple_minority_points', 'pep_points',
+        'linked_cluster_points', 'linked_adverse_points', 'beneficial_owner_required_weight',
+    ):
+        if not _is_number(merged[key]) or merged[key] < 0:
+            raise ValueError(f"'{key}' must be a non-negative number.")
+
+    thresholds = merged['thresholds']
+    if (
+        not isinstance(thresholds, dict)
+        or set(thresholds) != {'LOW', 'MEDIUM', 'HIGH'}
+        or not all(_is_number(value) for value in thresholds.values())
+        or not thresholds['LOW'] < thresholds['MEDIUM'] <= thresholds['HIGH']
+    ):
+        raise ValueError("'thresholds' must define increasing LOW, MEDIUM and HIGH scores.")
+
+    return merged
+
+
+def rules_digest(rules):
+    """Get a digest identifying a rule definition's content."""
+    return hashlib.sha256(json.dumps(rules, sort_keys=True).encode()).hexdigest()
+
+
+class CompiledRules:
+    """
+    A validated rule set compiled into lookup tables.
+
+    Each category and country maps straight to its score contribution and
+    factor label, so scoring is a handful of dict lookups with no parsing.
+    """
+
+    def __init__(self, rules, version=0):
+        self.digest = rules_digest(rules)
+        rules = validate_rules(rules)
+        self.version = version
+        self.rules = rules
+
+        self.category_table = {
+            code: self._weight_entry(weight, rules['category_share'], rules, 'category')
+            for code, weight in rules['category_weights'].items()
+        }
+        self.default_category = self._weight_entry(
+            rules['default_category_weight'], rules['category_share'], rules, 'category'
+        )
+        self.country_table = {
+            code: self._weight_entry(weight, rules['country_share'], rules, 'country')
+            for code, weight in rules['country_weights'].items()
+        }
+        self.default_country = self._weight_entry(
+            rules['default_country_weight'], rules['country_share'], rules, 'country'
+        )
+
+        self.minority_threshold = rules['minority_threshold']
+        self.complex_min = rules['complex_ownership_min_count']
+        self.complex_points = rules['complex_ownership_points']
+        self.multiple_min = rules['multiple_minority_min_count']
+        self.multiple_points = rules['multiple_minority_points']
+        self.pep_points = rules['pep_points']
+        self.linked_min_size = rules['linked_cluster_min_size']
+        self.linked_points = rules['linked_cluster_points']
+        self.linked_adverse_points = rules['linked_adverse_points']
+        self.low_threshold = rules['thresholds']['LOW']
+        self.medium_threshold = rules['thresholds']['MEDIUM']
+
+    @staticmethod
+    def _weight_entry(weight, share, rules, kind):
+        """Precompute (weight, contribution, factor label) for one code."""
+        if kind == 'category':
+            if weight >= rules['high_risk_category_weight']:
+                label = 'High-risk business category'
+            elif weight >= rules['medium_risk_category_weight']:
+                label = 'Medium-risk business category'
+            else:
+                label = None
+        else:
+            label = 'Higher-risk jurisdiction' if weight >= rules['high_risk_country_weight'] else None
+        return weight, weight * share, label
+
+    def category_weight(self, category):
+        return self.category_table.get(category, self.default_category)[0]
+
+    def country_weight(self, country):
+        return self.country_table.get(country, self.default_country)[0]
+
+    def risk_level(self, score):
+        """Convert a score to a risk level."""
+        if score <= self.low_threshold:
+            return 'LOW'
+        elif score <= self.medium_threshold:
+            return 'MEDIUM'
+        return 'HIGH'
+
+    def score(self, merchant, small_shareholders, pep_count, links=(1, 0)):
+        """
+        Apply the rules to a merchant's features.
+
+        links is (link cluster size, adverse linked merchants), as returned
+        by merchants.links.link_features.
+
+        Returns:
+            tuple: (score: int, factors: list, risk_level: str)
+        """
+        factors = []
+
+        # Business category weight
+        _, score, label = self.category_table.get(merchant.business_category, self.default_category)
+        if label:
+            factors.append(f"{label}: {merchant.get_business_category_display()}")
+
+        # Country risk
+        _, contribution, label = self.country_table.get(merchant.country, self.default_country)
+        score += contribution
+        if label:
+            factors.append(f"{label}: {merchant.get_country_display()}")
+
+        # Beneficial ownership complexity
+        if small_shareholders >= self.complex_min:
+            score += self.complex_points
+            factors.append(
+                f"Complex ownership structure: {small_shareholders} shareholders "
+                f"with <{self.minority_threshold:g}% ownership"
+            )
+        elif small_shareholders >= self.multiple_min:
+            score += self.multiple_points
+            factors.append(f"Multiple minority shareholders: {small_shareholders}")
+
+        # PEP exposure
+        if pep_count:
+            score += self.pep_points
+            factors.append(f"PEP involvement: {pep_count} politically exposed person(s)")
+
+        # Merchants sharing owners or contact details
+        cluster_size, adverse = links
+        if cluster_size >= self.linked_min_size:
+            score += self.linked_points
+            factors.append(f"Linked merchants: shares owners or contact details with {cluster_size - 1} other merchant(s)")
+        if adverse:
+            score += self.linked_adverse_points
+            factors.append(f"Linked to {adverse} rejected or sanctions-matched merchant(s)")
+
+        score = min(int(score), 100)  # Cap at 100
+
+        return score, factors, self.risk_level(score)
 
-def calculate_risk_score(merchant):
+
+_default_rules = CompiledRules(DEFAULT_RULES, version=0)
+_active_rules = _default_rules
+_rules_checked_at = None
+_rules_lock = threading.Lock()
+_version_rules = {}
+
+
+def reload_rules():
+    """
+    Load the newest active rule set and swap it in if its version changed.
+
+    An invalid stored rule set is logged and the previous rules stay active.
+
+    Returns:
+        CompiledRules: The active rules
+    """
+    global _active_rules, _rules_checked_at
+
+    with _rules_lock:
+        ruleset = RiskRuleSet.objects.filter(is_active=True).order_by('-version').first()
+        version = ruleset.version if ruleset else 0
+        digest = rules_digest(ruleset.rules) if ruleset else _default_rules.digest
+
+        if (version, digest) != (_active_rules.version, _active_rules.digest):
+            if ruleset is None:
+                _active_rules = _default_rules
+            else:
+                try:
+                    _active_rules = CompiledRules(ruleset.rules, version=version)
+                except ValueError as exc:
+                    logger.error(f"Risk rules version {version} rejected, keeping version {_active_rules.version}: {exc}")
+                else:
+                    logger.info(f"Risk rules version {version} activated")
+
+        _rules_checked_at = time.monotonic()
+        return _active_rules
+
+
+def get_active_rules():
+    """Get the compiled active rules, checking for a new version at most every RULES_REFRESH_SECONDS."""
+    checked_at = _rules_checked_at
+    if checked_at is not None and time.monotonic() - checked_at < RULES_REFRESH_SECONDS:
+        return _active_rules
+    return reload_rules()
+
+
+def rules_for_version(version):
+    """
+    Get the compiled rules of a recorded rule set version.
+
+    Used to read an assessment with the rules that scored it. Versions other
+    than the built-in and active ones are loaded once and kept. A version
+    that no longer exists or no longer validates falls back to the active
+    rules.
+    """
+    if version == _default_rules.version:
+        return _default_rules
+    active = _active_rules
+    if version == active.version:
+        return active
+    rules = _version_rules.get(version)
+    if rules is not None:
+        return rules
+
+    ruleset = RiskRuleSet.objects.filter(version=version).first()
+    try:
+        if ruleset is None:
+            raise ValueError("rule set not found")
+        rules = CompiledRules(ruleset.rules, version=version)
+    except ValueError as exc:
+        logger.warning(f"Risk rules version {version} unavailable, using the active rules: {exc}")
+        return get_active_rules()
+    _version_rules[version] = rules
+    return rules
+
+
+@receiver(post_save, sender=RiskRuleSet)
+@receiver(post_delete, sender=RiskRuleSet)
+def _expire_rules(sender, **kwargs):
+    """Make this worker pick up rule changes on its next scoring call."""
+    global _rules_checked_at
+    _rules_checked_at = None
+    _version_rules.clear()
+
+
+def calculate_risk_score(merchant, owners=None, rules=None, links=None):
     """
     Calculate risk score for a merchant.
 
+    Args:
+        merchant: Merchant to score
+        owners: Already-loaded beneficial owners; when given, no owner
+            queries are run
+        rules: CompiledRules to apply, defaulting to the active rules
+        links: Preloaded link_features; looked up when the merchant is in
+            a link cluster
+
+    Corporate shareholders are resolved to their ultimate beneficial owners,
+    whose effective percentages are scored. Without owners, the merchant's
+    stored owner counters are used when the rules' minority threshold
+    matches theirs and it has no corporate shareholders.
+
     Returns:
         tuple: (score: int, factors: list, risk_level: str)
     """
-    score = 0
-    factors = []
-
-    # Business category weight (40% of score)
-    category_weight = CATEGORY_WEIGHTS.get(merchant.business_category, 50)
-    category_contribution = category_weight * 0.4
-    score += category_contribution
-
-    if category_weight >= 80:
-        factors.append(f"High-risk business category: {merchant.get_business_category_display()}")
-    elif category_weight >= 40:
-        factors.append(f"Medium-risk business category: {merchant.get_business_category_display()}")
-
-    # Country risk (30% of score)
-    country_weight = COUNTRY_WEIGHTS.get(merchant.country, 30)
-    country_contribution = country_weight * 0.3
-    score += country_contribution
-
-    if country_weight >= 40:
-        factors.append(f"Higher-risk jurisdiction: {merchant.get_country_display()}")
-
-    # Beneficial ownership complexity (15% of score)
-    owners = merchant.owners.all()
-    small_shareholders = owners.filter(ownership_percentage__lt=25).count()
-
-    if small_shareholders > 3:
-        score += 15
-        factors.append(f"Complex ownership structure: {small_shareholders} shareholders with <25% ownership")
-    elif small_shareholders > 1:
-        score += 8
-        factors.append(f"Multiple minority shareholders: {small_shareholders}")
-
-    # PEP exposure (15% of score)
-    pep_owners = owners.filter(is_pep=True)
-    if pep_owners.exists():
-        pep_count = pep_owners.count()
-        score += 15
-        factors.append(f"PEP involvement: {pep_count} politically exposed person(s)")
-
-    # Determine risk level
-    score = min(int(score), 100)  # Cap at 100
-
-    if score <= RISK_THRESHOLDS['LOW']:
-        risk_level = 'LOW'
-    elif score <= RISK_THRESHOLDS['MEDIUM']:
-        risk_level = 'MEDIUM'
+    if rules is None:
+        rules = get_active_rules()
+
+    if owners is None and rules.minority_threshold == MINORITY_THRESHOLD and not merchant.corporate_owner_count:
+        small_shareholders = merchant.minority_owner_count
+        pep_count = merchant.pep_owner_count
     else:
-        risk_level = 'HIGH'
+        owners = resolve_beneficial_owners(merchant, owners)
+        small_shareholders = sum(1 for owner in owners if owner.ownership_percentage < rules.minority_threshold)
+        pep_count = sum(1 for owner in owners if owner.is_pep)
+
+    if links is None:
+        links = link_features(merchant)
+
+    score, factors, risk_level = rules.score(merchant, small_shareholders, pep_count, links)
 
     logger.info(f"Risk assessment for {merchant.business_name}: score={score}, level={risk_level}, factors={factors}")
 
     return score, factors, risk_level
 
 
-def should_require_beneficial_owners(merchant):
+def calculate_risk_scores(queryset, persist=True, batch_size=500, rules=None):
+    """
+    Calculate risk scores for every merchant in a queryset.
+
+    Ownership features for all merchants come from their stored owner
+    counters, or one aggregated query when the rules use a different
+    minority threshold. Merchants with corporate shareholders have their
+    ultimate owners resolved. Link cluster features come from the same
+    query. Scores are identical to calculate_risk_score.
+
+    Args:
+        queryset: Merchant queryset to score
+        persist: Record a RiskAssessment per merchant and update risk_level
+            and risk_score where they changed
+        batch_size: Rows per bulk write
+        rules: CompiledRules to apply, defaulting to the active rules
+
+    Returns:
+        dict: merchant pk -> (score, factors, risk_level)
+    """
+    if rules is None:
+        rules = get_active_rules()
+
+    use_counters = rules.minority_threshold == MINORITY_THRESHOLD
+    merchants = queryset
+    if not use_counters:
+        merchants = queryset.annotate(
+            small_shareholders=Count('owners', filter=Q(owners__ownership_percentage__lt=rules.minority_threshold)),
+            pep_count=Count('owners', filter=Q(owners__is_pep=True)),
+        )
+
+    merchants = list(with_link_features(merchants))
+    corporate_features = resolve_owner_features(
+        [merchant.pk for merchant in merchants if merchant.corporate_owner_count], rules.minority_threshold,
+    )
+    stats = {
+        merchant.link_cluster_id: (merchant.cluster_members, merchant.cluster_adverse)
+        for merchant in merchants if merchant.link_cluster_id is not None
+    }
+
+    results = {}
+    changed = []
+    level_changes = 0
+    for merchant in merchants:
+        if merchant.pk in corporate_features:
+            small_shareholders, pep_count = corporate_features[merchant.pk]
+        elif use_counters:
+            small_shareholders, pep_count = merchant.minority_owner_count, merchant.pep_owner_count
+        else:
+            small_shareholders, pep_count = merchant.small_shareholders, merchant.pep_count
+        links = link_features(merchant, stats)
+        score, factors, risk_level = rules.score(merchant, small_shareholders, pep_count, links)
+        results[merchant.pk] = (score, factors, risk_level)
+        if (merchant.risk_level, merchant.risk_score) != (risk_level, score):
+            if merchant.risk_level != risk_level:
+                level_changes += 1
+            merchant.risk_level, merchant.risk_score = risk_level, score
+            changed.append(merchant)
+
+    if persist and results:
+        with transaction.atomic():
+            RiskAssessment.objects.bulk_create(
+                [
+                    RiskAssessment(
+                        merchant_id=pk,
+                        risk_score=score,
+                        risk_factors=factors,
+                        assessed_by='SYSTEM',
+                        rule_version=rules.version,
+                    )
+                    for pk, (score, factors, _) in results.items()
+                ],
+                batch_size=batch_size,
+            )
+            Merchant.objects.bulk_update(changed, ['risk_level', 'risk_score'], batch_size=batch_size)
+
+    logger.info(f"Batch risk assessment: {len(results)} merchant(s) scored, {level_changes} risk level change(s)")
+
+    return results
+
+
+def should_require_beneficial_owners(merchant, rules=None):
     """
     Determine if merchant registration should require beneficial owner info.
     High-risk merchants always require beneficial ownership details.
     """
-    category_weight = CATEGORY_WEIGHTS.get(merchant.business_category, 50)
-    country_weight = COUNTRY_WEIGHTS.get(merchant.country, 30)
+    if rules is None:
+        rules = get_active_rules()
+
+    required_weight = rules.rules['beneficial_owner_required_weight']
 
     # Require for high-risk categories or countries
-    if category_weight >= 40 or country_weight >= 40:
+    if rules.category_weight(merchant.business_category) >= required_weight:
+        return True
+    if rules.country_weight(merchant.country) >= required_weight:
         return True
 
     return False
@@ -123,16 +512,23 @@ def get_due_diligence_level(risk_level):
     return 'ENHANCED'
 
 
-def can_auto_approve(merchant, screening_status):
+def can_auto_approve(merchant, screening_status, assessment=None):
     """
     Determine if a merchant can be auto-approved.
 
-    Only LOW risk merchants with CLEAR screening can be auto-approved.
+    Only LOW risk merchants with CLEAR screening can be auto-approved, and
+    never one resembling a previously rejected merchant. The risk level is
+    that of the assessment's score under the thresholds of the rule version
+    that scored it. Pass the assessment just created to avoid reloading it.
     """
     if screening_status != 'CLEAR':
         return False
 
-    assessment = merchant.get_latest_risk_assessment()
+    if has_rejected_lookalike(merchant):
+        return False
+
+    if assessment is None:
+        assessment = merchant.get_latest_risk_assessment()
     if not assessment:
         return False
 
@@ -0,0 +1,144 @@
+"""
+Signal handlers keeping Merchant owner counters in step with BeneficialOwner,
+recording merchant status and risk changes for the dashboard,
+invalidating resolved ownership chains, and scheduling re-risking when
+ownership or risk-relevant fields change.
+
+Each owner save or delete applies its change as an F() delta to the
+merchant row, so concurrent writers never overwrite each other's counts.
+Bulk writes that send no signals are covered by BeneficialOwnerQuerySet.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import (
+    DASHBOARD_FIELDS, REVIEW_EVENT_FIELDS, BeneficialOwner, EntityOwnership, Merchant, dashboard_tracking_enabled,
+    record_dashboard_changes,
+)
+from .rerisk import RERISK_FIELDS
+from .tasks import schedule_rerisk
+from .ubo import dependent_entity_ids, invalidate_entities
+
+
+def _apply_delta(owner, merchant_id, contribution, sign):
+    """Add (sign=1) or remove (sign=-1) an owner's contribution to a merchant."""
+    changes = {field: value for field, value in contribution.items() if value}
+    if merchant_id is None or not changes:
+        return
+    Merchant.objects.filter(pk=merchant_id).update(
+        **{field: F(field) + sign * value for field, value in changes.items()}
+    )
+    # Keep an already-loaded merchant coherent with the row
+    if BeneficialOwner.merchant.field.is_cached(owner) and owner.merchant_id == merchant_id:
+        merchant = owner.merchant
+        for field, value in changes.items():
+            setattr(merchant, field, getattr(merchant, field) + sign * value)
+
+
+def _remember_state(owner):
+    owner._counter_state = (owner.merchant_id, owner.counter_contribution())
+
+
+@receiver(post_init, sender=BeneficialOwner)
+def remember_loaded_owner(sender, instance, **kwargs):
+    if instance.pk is not None:
+        _remember_state(instance)
+
+
+@receiver(post_save, sender=BeneficialOwner)
+def update_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_counter_state', None)
+    current = (instance.merchant_id, instance.counter_contribution())
+    if previous != current:
+        if previous is None and not created:
+            # Saved from an instance that was never loaded; recount instead
+            Merchant.objects.filter(pk=instance.merchant_id).refresh_owner_counters()
+        else:
+            if previous is not None:
+                _apply_delta(instance, *previous, sign=-1)
+            _apply_delta(instance, *current, sign=1)
+        if previous is not None and previous[0] != current[0]:
+            schedule_rerisk(previous[0])
+    _remember_state(instance)
+    schedule_rerisk(instance.merchant_id)
+
+
+@receiver(post_delete, sender=BeneficialOwner)
+def update_counters_on_delete(sender, instance, **kwargs):
+    merchant_id, contribution = getattr(instance, '_counter_state', None) or (
+        instance.merchant_id, instance.counter_contribution()
+    )
+    _apply_delta(instance, merchant_id, contribution, sign=-1)
+    schedule_rerisk(merchant_id)
+
+
+def _remember_risk_fields(merchant):
+    # Read from __dict__ so deferred fields are never loaded just to track them
+    merchant._rerisk_state = {field: merchant.__dict__[field] for field in RERISK_FIELDS if field in merchant.__dict__}
+
+
+def _review_values(merchant):
+    return {field: getattr(merchant, field) for field in REVIEW_EVENT_FIELDS}
+
+
+def _dashboard_state(merchant):
+    if 'status' in merchant.__dict__ and 'risk_level' in merchant.__dict__:
+        return merchant.status, merchant.risk_level
+    return None
+
+
+@receiver(post_init, sender=Merchant)
+def remember_loaded_merchant(sender, instance, **kwargs):
+    if instance.pk is not None:
+        _remember_risk_fields(instance)
+        instance._dashboard_state = _dashboard_state(instance)
+
+
+@receiver(post_save, sender=Merchant)
+def rerisk_on_merchant_change(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, '_rerisk_state', None)
+    if not created and not raw and previous is not None:
+        if any(instance.__dict__.get(field, value) != value for field, value in previous.items()):
+            schedule_rerisk(instance.pk)
+    _remember_risk_fields(instance)
+
+
+@receiver(post_save, sender=Merchant)
+def record_dashboard_changes_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if update_fields is not None and not DASHBOARD_FIELDS & update_fields:
+        return
+    current = _dashboard_state(instance)
+    if not raw and dashboard_tracking_enabled():
+        previous = None if created else getattr(instance, '_dashboard_state', None)
+        # A merchant saved from an instance that was never loaded is left to reconciliation
+        if created or previous is not None:
+            record_dashboard_changes([(previous, current, _review_values(instance))], using=kwargs.get('using'))
+    instance._dashboard_state = current
+
+
+@receiver(post_delete, sender=Merchant)
+def record_dashboard_changes_on_delete(sender, instance, **kwargs):
+    previous = getattr(instance, '_dashboard_state', None) or _dashboard_state(instance)
+    if previous is not None and dashboard_tracking_enabled():
+        record_dashboard_changes([(previous, None, None)], using=kwargs.get('using'))
+
+
+@receiver(post_save, sender=EntityOwnership)
+@receiver(post_delete, sender=EntityOwnership)
+def ownership_chain_changed(sender, instance, raw=False, **kwargs):
+    """Forget resolutions that include the edited edge and re-risk affected merchants."""
+    if raw:
+        return
+    entity_ids = dependent_entity_ids(instance.entity_id)
+    invalidate_entities(entity_ids)
+    # Again after commit, in case another thread cached the old chain meanwhile
+    transaction.on_commit(lambda: invalidate_entities(entity_ids))
+    merchant_ids = set(
+        BeneficialOwner.objects.filter(corporate_entity_id__in=entity_ids).values_list('merchant_id', flat=True)
+    )
+    for merchant_id in merchant_ids:
+        schedule_rerisk(merchant_id)
@@ -0,0 +1,310 @@
+"""
+Near-duplicate merchant detection with MinHash locality-sensitive hashing.
+
+A merchant's name, address, email and phone are broken into shingles and
+summarized as a MinHash signature, whose bands are indexed in
+SimilarityBucket. Merchants sharing any band bucket are candidates, and
+candidates are confirmed by comparing signatures, so a lookup touches only
+a handful of index entries however large the portfolio grows.
+"""
+import hashlib
+import logging
+import re
+import zlib
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Merchant, MerchantSignature, SimilarityBucket
+
+logger = logging.getLogger(__name__)
+
+BANDS = 20
+ROWS_PER_BAND = 3
+NUM_PERMUTATIONS = BANDS * ROWS_PER_BAND
+
+# Estimated Jaccard similarity at which a prior merchant is flagged
+SIMILARITY_THRESHOLD = 0.5
+
+# Upper bound on candidates verified per lookup
+MAX_CANDIDATES = 500
+
+_PRIME = (1 << 31) - 1
+_random = np.random.RandomState(20240601)
+_A = _random.randint(1, _PRIME, size=NUM_PERMUTATIONS).astype(np.int64)
+_B = _random.randint(0, _PRIME, size=NUM_PERMUTATIONS).astype(np.int64)
+
+LEGAL_SUFFIXES = {
+    'ltd', 'limited', 'pte', 'inc', 'llc', 'corp', 'corporation', 'co', 'company',
+    'sdn', 'bhd', 'pt', 'tbk', 'plc', 'jsc', 'gmbh',
+}
+
+
+def _words(value):
+    return re.sub(r'[^\w\s]', ' ', (value or '').lower()).split()
+
+
+def merchant_shingles(merchant):
+    """
+    Shingles describing a merchant's identity.
+
+    Business names contribute character trigrams without legal suffixes,
+    addresses their words, and email and phone whole-value tokens.
+
+    Returns:
+        set: Field-prefixed shingle strings
+    """
+    shingles = set()
+    name = ' '.join(word for word in _words(merchant.business_name) if word not in LEGAL_SUFFIXES)
+    padded = f" {name} "
+    shingles.update(f"n:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    shingles.update(f"a:{word}" for word in _words(merchant.address))
+
+    email = (merchant.email or '').strip().lower()
+    if email:
+        shingles.add(f"e:{email}")
+        shingles.add(f"d:{email.rpartition('@')[2]}")
+    phone = re.sub(r'\D', '', merchant.phone or '')
+    if phone:
+        shingles.add(f"p:{phone[-8:]}")
+    return shingles
+
+
+def compute_signature(shingles):
+    """MinHash signature of a shingle set, as an int64 array."""
+    if not shingles:
+        return np.full(NUM_PERMUTATIONS, _PRIME, dtype=np.int64)
+    hashes = np.fromiter((zlib.crc32(s.encode()) & _PRIME for s in shingles), dtype=np.int64)
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def band_buckets(signature):
+    """(band, bucket) pairs for a signature's LSH bands."""
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(rows.tobytes(), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, 'big', signed=True)))
+    return buckets
+
+
+def _pack(signature):
+    return signature.astype('<u4').tobytes()
+
+
+def _unpack(data):
+    return np.frombuffer(bytes(data), dtype='<u4').astype(np.int64)
+
+
+def find_similar_merchants(merchant, signature=None, threshold=SIMILARITY_THRESHOLD):
+    """
+    Find earlier merchants whose identity is similar to this one's.
+
+    Returns:
+        list: dicts with merchant_id, registration_number, business_name,
+            status and similarity, most similar first
+    """
+    if signature is None:
+        signature = compute_signature(merchant_shingles(merchant))
+
+    match = Q()
+    for band, bucket in band_buckets(signature):
+        match |= Q(band=band, bucket=bucket)
+    candidates = (
+        SimilarityBucket.objects.filter(match).exclude(merchant_id=merchant.pk)
+        .values('merchant_id').distinct()[:MAX_CANDIDATES]
+    )
+    rows = MerchantSignature.objects.filter(merchant_id__in=candidates).values_list(
+        'merchant_id', 'signature', 'merchant__registration_number', 'merchant__business_name', 'merchant__status',
+    )
+
+    similar = []
+    for merchant_id, data, registration_number, business_name, status in rows:
+        similarity = float(np.mean(_unpack(data) == signature))
+        if similarity >= threshold:
+            similar.append(_match(merchant_id, registration_number, business_name, status, similarity))
+    similar.sort(key=lambda match: -match['similarity'])
+    return similar
+
+
+def _match(merchant_id, registration_number, business_name, status, similarity):
+    return {
+        'merchant_id': merchant_id,
+        'registration_number': registration_number,
+        'business_name': business_name,
+        'status': status,
+        'similarity': round(similarity, 2),
+    }
+
+
+def index_merchant(merchant, signature=None, created=False):
+    """
+    Store a merchant's signature and band buckets for future lookups.
+
+    Args:
+        merchant: Merchant to index
+        signature: Precomputed signature
+        created: The merchant has never been indexed, so nothing is replaced
+    """
+    if signature is None:
+        signature = compute_signature(merchant_shingles(merchant))
+    if created:
+        MerchantSignature.objects.create(merchant=merchant, signature=_pack(signature))
+    else:
+        SimilarityBucket.objects.filter(merchant=merchant).delete()
+        MerchantSignature.objects.update_or_create(merchant=merchant, defaults={'signature': _pack(signature)})
+    SimilarityBucket.objects.bulk_create(
+        [SimilarityBucket(merchant=merchant, band=band, bucket=bucket) for band, bucket in band_buckets(signature)]
+    )
+
+
+def flag_similar_merchants(merchant, created=False):
+    """
+    Look up similar earlier merchants, record them as review flags and index the merchant.
+
+    Flags are set on merchant.review_flags for the caller to save.
+
+    Returns:
+        list: The similar merchants found
+    """
+    signature = compute_signature(merchant_shingles(merchant))
+    similar = find_similar_merchants(merchant, signature)
+    _set_flags(merchant, similar)
+    index_merchant(merchant, signature, created=created)
+    return similar
+
+
+def _set_flags(merchant, similar):
+    flags = [flag for flag in merchant.review_flags if flag.get('type') != 'SIMILAR_MERCHANT']
+    flags.extend({'type': 'SIMILAR_MERCHANT', **match} for match in similar)
+    merchant.review_flags = flags
+
+    rejected = [match for match in similar if match['status'] == 'REJECTED']
+    if rejected:
+        logger.warning(
+            f"Merchant {merchant.business_name} resembles rejected merchant(s): "
+            f"{', '.join(match['registration_number'] for match in rejected)}"
+        )
+
+
+def flag_similar_merchants_batch(merchants, threshold=SIMILARITY_THRESHOLD, chunk_size=500):
+    """
+    Flag and index a batch of new merchants in a few bulk queries.
+
+    Earlier merchants are found through one bucket lookup per chunk of
+    buckets, matching each band's buckets within that band so every term
+    probes the (band, bucket) index, and batch members are also compared with the members before
+    them, as if they had registered one after another.
+
+    Returns:
+        dict: merchant pk -> list of similar merchants found
+    """
+    signatures = {merchant.pk: compute_signature(merchant_shingles(merchant)) for merchant in merchants}
+    buckets = {pk: band_buckets(signature) for pk, signature in signatures.items()}
+    wanted = {}
+    for pairs in buckets.values():
+        for band, bucket in pairs:
+            wanted.setdefault(band, set()).add(bucket)
+    wanted = {band: sorted(band_buckets_wanted) for band, band_buckets_wanted in wanted.items()}
+
+    holders = {}
+    for start in range(0, max(map(len, wanted.values()), default=0), chunk_size):
+        match = Q()
+        for band, band_buckets_wanted in wanted.items():
+            if band_buckets_wanted[start:start + chunk_size]:
+                match |= Q(band=band, bucket__in=band_buckets_wanted[start:start + chunk_size])
+        rows = SimilarityBucket.objects.filter(match).values_list('band', 'bucket', 'merchant_id')
+        for band, bucket, merchant_id in rows:
+            holders.setdefault((band, bucket), set()).add(merchant_id)
+
+    candidates = {
+        pk: set().union(*(holders.get(pair, set()) for pair in pairs)) - {pk}
+        for pk, pairs in buckets.items()
+    }
+    earlier_ids = sorted(set().union(*candidates.values()))
+    earlier = {}
+    for start in range(0, len(earlier_ids), chunk_size):
+        rows = MerchantSignature.objects.filter(merchant_id__in=earlier_ids[start:start + chunk_size]).values_list(
+            'merchant_id', 'signature', 'merchant__registration_number', 'merchant__business_name', 'merchant__status',
+        )
+        for merchant_id, data, registration_number, business_name, status in rows:
+            earlier[merchant_id] = (_unpack(data), registration_number, business_name, status)
+
+    found = {}
+    batch_holders = {}
+    for merchant in merchants:
+        signature = signatures[merchant.pk]
+        similar = []
+        matched = [candidate for candidate in sorted(candidates[merchant.pk])[:MAX_CANDIDATES] if candidate in earlier]
+        others = list(set().union(*(batch_holders.get(pair, set()) for pair in buckets[merchant.pk])))
+        if matched or others:
+            # Compare against every candidate signature at once
+            stacked = np.array([earlier[candidate][0] for candidate in matched] + [signatures[o.pk] for o in others])
+            similarities = (stacked == signature).mean(axis=1)
+            for candidate, similarity in zip(matched, similarities):
+                if similarity >= threshold:
+                    _, registration_number, business_name, status = earlier[candidate]
+                    similar.append(_match(candidate, registration_number, business_name, status, float(similarity)))
+            for other, similarity in zip(others, similarities[len(matched):]):
+                if similarity >= threshold:
+                    similar.append(_match(
+                        other.pk, other.registration_number, other.business_name, other.status, float(similarity),
+                    ))
+        for pair in buckets[merchant.pk]:
+            batch_holders.setdefault(pair, set()).add(merchant)
+        similar.sort(key=lambda match: -match['similarity'])
+        _set_flags(merchant, similar)
+        found[merchant.pk] = similar
+
+    MerchantSignature.objects.bulk_create(
+        [MerchantSignature(merchant=merchant, signature=_pack(signatures[merchant.pk])) for merchant in merchants],
+        batch_size=chunk_size,
+    )
+    SimilarityBucket.objects.bulk_create(
+        [
+            SimilarityBucket(merchant=merchant, band=band, bucket=bucket)
+            for merchant in merchants for band, bucket in buckets[merchant.pk]
+        ],
+        batch_size=chunk_size,
+    )
+    return found
+
+
+def has_rejected_lookalike(merchant):
+    """Whether review flags point at a similar merchant that was rejected."""
+    return any(
+        flag.get('type') == 'SIMILAR_MERCHANT' and flag.get('status') == 'REJECTED'
+        for flag in merchant.review_flags
+    )
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Recompute every merchant's signature and buckets.
+
+    Returns:
+        int: Merchants indexed
+    """
+    indexed = 0
+    signatures, buckets = [], []
+    fields = ('pk', 'business_name', 'address', 'email', 'phone')
+    with transaction.atomic():
+        SimilarityBucket.objects.all().delete()
+        MerchantSignature.objects.all().delete()
+        for merchant in Merchant.objects.order_by('pk').only(*fields).iterator(chunk_size=batch_size):
+            signature = compute_signature(merchant_shingles(merchant))
+            signatures.append(MerchantSignature(merchant_id=merchant.pk, signature=_pack(signature)))
+            buckets.extend(
+                SimilarityBucket(merchant_id=merchant.pk, band=band, bucket=bucket)
+                for band, bucket in band_buckets(signature)
+            )
+            indexed += 1
+            if len(signatures) >= batch_size:
+                MerchantSignature.objects.bulk_create(signatures)
+                SimilarityBucket.objects.bulk_create(buckets)
+                signatures, buckets = [], []
+        MerchantSignature.objects.bulk_create(signatures)
+        SimilarityBucket.objects.bulk_create(buckets)
+    logger.info(f"Similarity index rebuilt for {indexed} merchant(s)")
+    return indexed
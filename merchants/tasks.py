@@ -0,0 +1,234 @@
+"""
+Background tasks for merchant onboarding.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from screening.services import ScreeningTimeout, screen_merchant, screen_merchants
+from taskqueue.queue import enqueue, task
+
+from .links import link_merchant, link_merchants
+from .models import BeneficialOwner, Merchant, RiskAssessment
+from .rerisk import RERISK_DEBOUNCE_SECONDS, rerisk_merchant, rerisk_suppressed, suppress_rerisk
+from .risk_engine import calculate_risk_score, calculate_risk_scores, can_auto_approve, get_active_rules
+from .similarity import flag_similar_merchants, flag_similar_merchants_batch, has_rejected_lookalike
+
+logger = logging.getLogger(__name__)
+
+DECIDE_REGISTRATION = 'merchants.decide_registration'
+DECIDE_REGISTRATIONS = 'merchants.decide_registrations'
+FINISH_REGISTRATION_SCREENING = 'merchants.finish_registration_screening'
+RERISK_MERCHANT = 'merchants.rerisk_merchant'
+
+# Columns a registration decision writes, in a single UPDATE
+DECISION_FIELDS = [
+    'risk_level', 'risk_score', 'status', 'review_notes', 'review_flags',
+    'current_screening_run', 'screening_status', 'screening_fingerprint', 'updated_at',
+]
+
+# Longest a registration request spends on risk scoring and screening before
+# deferring the rest of screening to the background
+REGISTRATION_TIME_BUDGET_SECONDS = getattr(settings, 'REGISTRATION_TIME_BUDGET_SECONDS', 3.0)
+
+
+def merchant_task_key(merchant_id):
+    return f"merchant:{merchant_id}"
+
+
+def apply_decision(merchant, screening_status, assessment):
+    """Set a screened merchant's status from its screening and risk outcome."""
+    if screening_status == 'MATCH':
+        merchant.status = 'REJECTED'
+        merchant.review_notes = 'Auto-rejected due to sanctions match.'
+        logger.warning(f"Merchant {merchant.business_name} auto-rejected: sanctions match")
+    elif screening_status == 'POTENTIAL_MATCH':
+        merchant.status = 'UNDER_REVIEW'
+        logger.info(f"Merchant {merchant.business_name} queued for review: potential sanctions match")
+    elif can_auto_approve(merchant, screening_status, assessment):
+        merchant.status = 'APPROVED'
+        merchant.review_notes = 'Auto-approved: Low risk, clear screening.'
+        logger.info(f"Merchant {merchant.business_name} auto-approved: low risk")
+    elif has_rejected_lookalike(merchant):
+        merchant.status = 'UNDER_REVIEW'
+        logger.info(f"Merchant {merchant.business_name} queued for review: resembles a rejected merchant")
+    else:
+        merchant.status = 'PENDING'
+        logger.info(f"Merchant {merchant.business_name} pending review: {merchant.risk_level} risk")
+
+
+def decide_merchant(merchant, owners, deadline=None):
+    """
+    Link, score and screen a newly registered merchant and decide its status.
+
+    Works on the given instances and writes the outcome to the merchant row
+    once, at the end; the caller provides the transaction.
+
+    Args:
+        merchant: Saved merchant whose counters already include its owners
+        owners: The merchant's beneficial owners
+        deadline: time.monotonic() value by which screening must finish. If
+            it runs over, the merchant is put UNDER_REVIEW with a screening
+            in progress flag and screening finishes in the background.
+    """
+    # Link to merchants sharing owners or contact details
+    link_merchant(merchant, owners)
+
+    # Flag near-duplicates of earlier applications for review
+    flag_similar_merchants(merchant, created=True)
+
+    # Calculate risk score
+    rules = get_active_rules()
+    score, factors, risk_level = calculate_risk_score(merchant, owners, rules)
+
+    # Create risk assessment
+    assessment = RiskAssessment.objects.create(
+        merchant=merchant,
+        risk_score=score,
+        risk_factors=factors,
+        assessed_by='SYSTEM',
+        rule_version=rules.version,
+    )
+    merchant.risk_level = risk_level
+    merchant.risk_score = score
+
+    # Run sanctions screening
+    try:
+        screening_status = screen_merchant(merchant, owners, deadline=deadline, commit=False)
+    except ScreeningTimeout:
+        merchant.status = 'UNDER_REVIEW'
+        merchant.review_flags = merchant.review_flags + [{'type': Merchant.SCREENING_IN_PROGRESS}]
+        merchant.save(update_fields=DECISION_FIELDS)
+        enqueue(
+            FINISH_REGISTRATION_SCREENING, key=merchant_task_key(merchant.pk), background=True,
+            merchant_id=merchant.pk,
+        )
+        logger.info(f"Merchant {merchant.business_name} under review: screening over budget, finishing in background")
+        return
+
+    apply_decision(merchant, screening_status, assessment)
+    merchant.save(update_fields=DECISION_FIELDS)
+
+
+@task(DECIDE_REGISTRATION)
+def decide_registration(merchant_id):
+    """
+    Decide a registration in a worker.
+
+    Runs in one transaction, so a failed attempt leaves nothing behind and
+    the task can be retried. Merchants that have already been screened are
+    skipped, so a retry after a lost lease doesn't decide twice.
+    """
+    with transaction.atomic(), suppress_rerisk():
+        merchant = Merchant.objects.select_for_update().filter(pk=merchant_id).first()
+        if merchant is None or merchant.screening_status != 'NOT_SCREENED' or merchant.screening_in_progress:
+            return
+        decide_merchant(merchant, list(merchant.owners.all()))
+
+
+def decide_merchants(merchants, owners_by_merchant, matches=None):
+    """
+    Link, score, screen and decide a batch of newly registered merchants.
+
+    The set-based counterpart of decide_merchant: linking, similarity,
+    scoring and screening each run as a few bulk queries for the whole
+    batch, and the outcomes are written with one bulk update. The caller
+    provides the transaction.
+
+    Args:
+        merchants: Saved merchants whose counters already include their owners
+        owners_by_merchant: merchant pk -> list of its beneficial owners
+        matches: Sanctions matches from match_merchants, if already matched
+    """
+    if not merchants:
+        return
+    link_merchants(merchants, owners_by_merchant)
+    flag_similar_merchants_batch(merchants)
+
+    rules = get_active_rules()
+    scores = calculate_risk_scores(
+        Merchant.objects.filter(pk__in=[merchant.pk for merchant in merchants]), persist=False, rules=rules,
+    )
+    assessments = RiskAssessment.objects.bulk_create([
+        RiskAssessment(
+            merchant=merchant,
+            risk_score=scores[merchant.pk][0],
+            risk_factors=scores[merchant.pk][1],
+            assessed_by='SYSTEM',
+            rule_version=rules.version,
+        )
+        for merchant in merchants
+    ])
+
+    statuses = screen_merchants(merchants, owners_by_merchant, matches)
+    now = timezone.now()
+    for merchant, assessment in zip(merchants, assessments):
+        merchant.risk_score, _, merchant.risk_level = scores[merchant.pk]
+        apply_decision(merchant, statuses[merchant.pk], assessment)
+        merchant.updated_at = now
+    Merchant.objects.bulk_update(merchants, DECISION_FIELDS)
+
+
+@task(DECIDE_REGISTRATIONS)
+def decide_registrations(merchant_ids):
+    """Decide a batch of registrations in a worker, skipping merchants already screened."""
+    with transaction.atomic(), suppress_rerisk():
+        merchants = list(
+            Merchant.objects.select_for_update().filter(pk__in=merchant_ids, screening_status='NOT_SCREENED')
+            .order_by('pk')
+        )
+        owners_by_merchant = {merchant.pk: [] for merchant in merchants}
+        for owner in BeneficialOwner.objects.filter(merchant__in=merchants):
+            owners_by_merchant[owner.merchant_id].append(owner)
+        decide_merchants(merchants, owners_by_merchant)
+
+
+@task(FINISH_REGISTRATION_SCREENING)
+def finish_registration_screening(merchant_id):
+    """
+    Screen a merchant whose registration ran out of time, then decide it.
+
+    The decision is only applied while the merchant still awaits it; if a
+    compliance officer has already acted, screening is recorded and the
+    officer's status kept.
+    """
+    with transaction.atomic(), suppress_rerisk():
+        merchant = Merchant.objects.select_for_update().filter(pk=merchant_id).first()
+        if merchant is None or not merchant.screening_in_progress:
+            return
+
+        screening_status = screen_merchant(merchant, commit=False)
+        merchant.review_flags = [
+            flag for flag in merchant.review_flags if flag.get('type') != Merchant.SCREENING_IN_PROGRESS
+        ]
+        if merchant.status == 'UNDER_REVIEW' and merchant.reviewed_by_id is None:
+            apply_decision(merchant, screening_status, merchant.get_latest_risk_assessment())
+        elif screening_status == 'MATCH':
+            logger.warning(f"Merchant {merchant.business_name} matched sanctions after review as {merchant.status}")
+        merchant.save(update_fields=DECISION_FIELDS)
+
+
+@task(RERISK_MERCHANT)
+def rerisk(merchant_id):
+    """Re-risk and rescreen a merchant after its owners or risk-relevant details changed."""
+    rerisk_merchant(merchant_id)
+
+
+def schedule_rerisk(merchant_id):
+    """
+    Queue a re-risk of a merchant with the current transaction.
+
+    The task waits RERISK_DEBOUNCE_SECONDS, and a schedule while it is still
+    waiting pushes it back rather than queueing another, so a burst of edits
+    is re-risked once. In eager mode the wait is a timer in this process, so
+    a re-risk pending at a restart is only run by a task worker.
+    """
+    if merchant_id is None or rerisk_suppressed():
+        return
+    enqueue(
+        RERISK_MERCHANT, key=merchant_task_key(merchant_id), delay=RERISK_DEBOUNCE_SECONDS, coalesce=True,
+        merchant_id=merchant_id,
+    )
@@ -1,20 +1,62 @@
 """
 Automated tests for the Yuno KYB Merchant Onboarding System.
 """
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
 from decimal import Decimal
-from django.test import TestCase, Client
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
 
-from .models import Merchant, BeneficialOwner, RiskAssessment
+from .models import (
+    Merchant, BeneficialOwner, CorporateEntity, DashboardCounter, EntityOwnership, IdempotencyKey, LinkCluster,
+    MerchantSignature, ReviewDecision, RiskAssessment, RiskRuleSet, SimilarityBucket,
+)
+from .dashboard import dashboard_stats, reconcile_counters
+from .events import Broker, broker
+from .idempotency import _LeaseRenewal, _extend_lease, request_fingerprint
+from . import pagination
+from .pagination import CREATED_ORDER, InvalidCursor, keyset_page
+from .importer import import_merchants
+from .links import link_merchant
+from .registration import owner_formset_data
+from .similarity import find_similar_merchants, flag_similar_merchants, has_rejected_lookalike, index_merchant
 from .risk_engine import (
     calculate_risk_score,
+    calculate_risk_scores,
+    get_active_rules,
+    reload_rules,
+    validate_rules,
+    CompiledRules,
+    DEFAULT_RULES,
     should_require_beneficial_owners,
     can_auto_approve,
     CATEGORY_WEIGHTS,
     COUNTRY_WEIGHTS,
 )
-from screening.services import screen_merchant, screen_entity
+from .ubo import (
+    clear_cache as clear_ubo_cache, resolve_beneficial_owners, resolve_entity_owners, resolve_owner_features,
+)
+from .rerisk import rerisk_merchant, suppress_rerisk
+from .tasks import RERISK_MERCHANT, merchant_task_key, schedule_rerisk
+from . import review_queue as review_queue_module
+from .review_queue import claim_next, decide_cases, release_claim, review_queue
+from .portfolio import load_features, score_features, recompute_portfolio_risk, RISK_LEVELS
+from .simulation import simulate_rules
+from screening.models import ScreeningRun
+from screening.services import ScreeningTimeout, screen_merchant, screen_entity
+from taskqueue.models import Task
+from taskqueue.queue import run_pending
 
 
 class RiskEngineTestCase(TestCase):
@@ -168,6 +210,1040 @@ class RiskEngineTestCase(TestCase):
         print("✓ Low-risk category does not require beneficial owners")
 
 
+class PreloadedRiskScoringTestCase(TestCase):
+    """Tests for scoring and decisioning with already-loaded data."""
+
+    def setUp(self):
+        self.merchant = Merchant.objects.create(
+            business_name="Preloaded Co",
+            registration_number="SG10101",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@example.com",
+            phone="+65 1234 5678",
+            address="Singapore",
+        )
+        self.owners = [
+            BeneficialOwner.objects.create(
+                merchant=self.merchant,
+                full_name=f"Owner {i}",
+                nationality="SG",
+                ownership_percentage=Decimal("20.00"),
+                id_document_type="PASSPORT",
+                id_document_number=f"PL{i}",
+                is_pep=(i == 0),
+            )
+            for i in range(2)
+        ]
+
+    def test_preloaded_owners_match_queried_owners(self):
+        """Scoring with preloaded owners should equal scoring from the database."""
+        with self.assertNumQueries(0):
+            preloaded = calculate_risk_score(self.merchant, self.owners)
+
+        self.assertEqual(preloaded, calculate_risk_score(self.merchant))
+        print(f"✓ Preloaded owners scored without queries: {preloaded[0]}")
+
+    def test_auto_approve_with_precomputed_assessment(self):
+        """Passing the fresh assessment should skip reloading it."""
+        score, factors, _ = calculate_risk_score(self.merchant, [])
+        assessment = RiskAssessment.objects.create(merchant=self.merchant, risk_score=score, risk_factors=factors)
+
+        with self.assertNumQueries(0):
+            result = can_auto_approve(self.merchant, "CLEAR", assessment)
+
+        self.assertTrue(result)
+        print("✓ Auto-approval decided without queries")
+
+
+class RiskRuleSetTestCase(TestCase):
+    """Tests for versioned, hot-reloadable risk rules."""
+
+    def setUp(self):
+        self.addCleanup(lambda: RiskRuleSet.objects.all().delete())
+        self.merchant = Merchant.objects.create(
+            business_name="Rules Test Co",
+            registration_number="SG20202",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@example.com",
+            phone="+65 1234 5678",
+            address="Singapore",
+        )
+
+    def test_builtin_rules_are_version_zero(self):
+        """Without stored rule sets the built-in rules should apply."""
+        rules = reload_rules()
+
+        self.assertEqual(rules.version, 0)
+        self.assertEqual(calculate_risk_score(self.merchant)[0], 7)
+        print("✓ Built-in rules active as version 0")
+
+    def test_new_version_is_picked_up(self):
+        """Publishing a version should change scoring without a deploy."""
+        RiskRuleSet.objects.create(version=1, rules={"country_weights": {**COUNTRY_WEIGHTS, "SG": 100}})
+
+        rules = get_active_rules()
+        score, factors, _ = calculate_risk_score(self.merchant, [], rules)
+
+        self.assertEqual(rules.version, 1)
+        self.assertEqual(score, 34)
+        self.assertTrue(any("Higher-risk jurisdiction" in f for f in factors))
+        print(f"✓ Rules v{rules.version} applied: score={score}")
+
+    def test_registration_records_rule_version(self):
+        """Assessments should record which rule version produced them."""
+        RiskRuleSet.objects.create(version=3, rules={"pep_points": 20})
+        data = {
+            "business_name": "Versioned Ltd",
+            "registration_number": "SG30303",
+            "country": "SG",
+            "business_category": "ECOMMERCE",
+            "email": "test@versioned.com",
+            "phone": "+65 3030 3030",
+            "address": "Singapore",
+            "owners-TOTAL_FORMS": "0",
+            "owners-INITIAL_FORMS": "0",
+            "owners-MIN_NUM_FORMS": "0",
+            "owners-MAX_NUM_FORMS": "1000",
+        }
+
+        self.client.post(reverse("register_merchant"), data)
+
+        merchant = Merchant.objects.get(registration_number="SG30303")
+        self.assertEqual(merchant.get_latest_risk_assessment().rule_version, 3)
+        print("✓ Assessment records rule version 3")
+
+    def test_auto_approval_uses_active_thresholds(self):
+        """Raised risk thresholds should auto-approve scores the built-in ones call MEDIUM."""
+        RiskRuleSet.objects.create(version=4, rules={"thresholds": {"LOW": 50, "MEDIUM": 70, "HIGH": 100}})
+        data = {
+            "business_name": "Threshold Games",
+            "registration_number": "ID40404",
+            "country": "ID",
+            "business_category": "GAMING",
+            "email": "test@threshold.com",
+            "phone": "+62 4040 4040",
+            "address": "Jakarta",
+            "owners-TOTAL_FORMS": "0",
+            "owners-INITIAL_FORMS": "0",
+            "owners-MIN_NUM_FORMS": "0",
+            "owners-MAX_NUM_FORMS": "1000",
+        }
+
+        self.client.post(reverse("register_merchant"), data)
+
+        merchant = Merchant.objects.get(registration_number="ID40404")
+        self.assertGreater(merchant.risk_score, 30)
+        self.assertEqual(merchant.risk_level, "LOW")
+        self.assertEqual(merchant.status, "APPROVED")
+        print(f"✓ Score {merchant.risk_score} auto-approved under LOW=50")
+
+    def test_assessment_graded_by_its_rule_version(self):
+        """An assessment should keep the risk level of the rules that scored it after a new version."""
+        RiskRuleSet.objects.create(version=4, rules={"thresholds": {"LOW": 50, "MEDIUM": 70, "HIGH": 100}})
+        reload_rules()
+        assessment = RiskAssessment.objects.create(merchant=self.merchant, risk_score=40, rule_version=4)
+        builtin = RiskAssessment.objects.create(merchant=self.merchant, risk_score=40, rule_version=0)
+
+        RiskRuleSet.objects.create(version=5, rules={"thresholds": {"LOW": 10, "MEDIUM": 40, "HIGH": 100}})
+        self.assertEqual(reload_rules().version, 5)
+
+        self.assertEqual(assessment.get_risk_level(), "LOW")
+        self.assertEqual(builtin.get_risk_level(), "MEDIUM")
+        self.assertTrue(can_auto_approve(self.merchant, "CLEAR", assessment))
+        self.assertFalse(can_auto_approve(self.merchant, "CLEAR", builtin))
+        print("✓ Assessments graded by the rule version that scored them")
+
+    def test_invalid_rules_rejected(self):
+        """Malformed rule definitions should fail validation."""
+        invalid = [
+            {"unknown_key": 1},
+            {"category_share": 2},
+            {"thresholds": {"LOW": 70, "MEDIUM": 60, "HIGH": 100}},
+            {"country_weights": {"SG": "high"}},
+        ]
+        for rules in invalid:
+            with self.assertRaises(ValueError):
+                validate_rules(rules)
+        print(f"✓ {len(invalid)} invalid rule sets rejected")
+
+    def test_invalid_stored_version_keeps_previous_rules(self):
+        """A bad stored rule set should not replace working rules."""
+        RiskRuleSet.objects.create(version=1, rules={"pep_points": 20})
+        self.assertEqual(reload_rules().version, 1)
+
+        RiskRuleSet.objects.create(version=2, rules={"category_share": 5})
+
+        self.assertEqual(reload_rules().version, 1)
+        print("✓ Invalid rule set ignored, v1 kept")
+
+    def test_compiled_defaults_match_thresholds(self):
+        """Compiled rules should reproduce the documented level boundaries."""
+        rules = CompiledRules(DEFAULT_RULES)
+
+        self.assertEqual(rules.risk_level(30), "LOW")
+        self.assertEqual(rules.risk_level(31), "MEDIUM")
+        self.assertEqual(rules.risk_level(61), "HIGH")
+        print("✓ Compiled thresholds match defaults")
+
+
+class OwnerCounterTestCase(TestCase):
+    """Tests for the denormalized owner counters on Merchant."""
+
+    def setUp(self):
+        self.merchant = Merchant.objects.create(
+            business_name="Counter Test Ltd",
+            registration_number="CNT001",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@example.com",
+            phone="+65 1234 5678",
+            address="Singapore",
+        )
+
+    def make_owner(self, percentage, is_pep=False, merchant=None, **kwargs):
+        return BeneficialOwner(
+            merchant=merchant or self.merchant,
+            full_name=kwargs.pop("full_name", "Owner"),
+            nationality="SG",
+            ownership_percentage=Decimal(percentage),
+            id_document_type="PASSPORT",
+            id_document_number=kwargs.pop("id_document_number", "P1"),
+            is_pep=is_pep,
+        )
+
+    def assertCounters(self, merchant, owners, minority, pep):
+        merchant.refresh_from_db()
+        self.assertEqual(
+            (merchant.owner_count, merchant.minority_owner_count, merchant.pep_owner_count),
+            (owners, minority, pep),
+        )
+
+    def test_counters_follow_owner_changes(self):
+        """Creating, editing, moving and deleting owners should adjust the counters."""
+        owner = self.make_owner("10.00", is_pep=True)
+        owner.save()
+        self.make_owner("60.00").save()
+        self.assertCounters(self.merchant, 2, 1, 1)
+
+        owner = BeneficialOwner.objects.get(pk=owner.pk)
+        owner.ownership_percentage = Decimal("30.00")
+        owner.is_pep = False
+        owner.save()
+        self.assertCounters(self.merchant, 2, 0, 0)
+
+        other = Merchant.objects.create(
+            business_name="Other Ltd",
+            registration_number="CNT002",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@example.com",
+            phone="+65 1234 5678",
+            address="Singapore",
+        )
+        owner.merchant = other
+        owner.save()
+        self.assertCounters(self.merchant, 1, 0, 0)
+        self.assertCounters(other, 1, 0, 0)
+
+        owner.delete()
+        self.assertCounters(other, 0, 0, 0)
+        print("✓ Owner counters follow saves, moves and deletes")
+
+    def test_stale_merchant_save_keeps_counters(self):
+        """Saving an instance loaded before owners were added must not reset the counters."""
+        stale = Merchant.objects.get(pk=self.merchant.pk)
+        BeneficialOwner.objects.create(
+            merchant_id=self.merchant.pk,
+            full_name="Owner",
+            nationality="SG",
+            ownership_percentage=Decimal("10.00"),
+            id_document_type="PASSPORT",
+            id_document_number="P1",
+            is_pep=True,
+        )
+        stale.review_notes = "Edited"
+        stale.save()
+        self.assertCounters(self.merchant, 1, 1, 1)
+        print("✓ Stale merchant saves leave owner counters alone")
+
+    def test_bulk_writes_refresh_counters(self):
+        """bulk_create, bulk_update and update() should keep counters correct."""
+        owners = BeneficialOwner.objects.bulk_create([
+            self.make_owner("10.00", id_document_number=f"P{i}") for i in range(3)
+        ])
+        self.assertCounters(self.merchant, 3, 3, 0)
+
+        BeneficialOwner.objects.filter(pk=owners[0].pk).update(is_pep=True)
+        self.assertCounters(self.merchant, 3, 3, 1)
+
+        for owner in owners:
+            owner.ownership_percentage = Decimal("30.00")
+        BeneficialOwner.objects.bulk_update(owners, ["ownership_percentage"])
+        self.assertCounters(self.merchant, 3, 0, 1)
+
+        BeneficialOwner.objects.filter(merchant=self.merchant).delete()
+        self.assertCounters(self.merchant, 0, 0, 0)
+        print("✓ Bulk owner writes keep counters correct")
+
+    def test_scoring_reads_counters(self):
+        """Scoring without owners should use the counters without querying owners."""
+        for i in range(4):
+            self.make_owner("10.00", is_pep=(i == 0), id_document_number=f"P{i}").save()
+        merchant = Merchant.objects.get(pk=self.merchant.pk)
+
+        with self.assertNumQueries(0):
+            score, factors, _ = calculate_risk_score(merchant, rules=CompiledRules(DEFAULT_RULES))
+        self.assertEqual((score, factors), calculate_risk_score(merchant, list(merchant.owners.all()))[:2])
+        print("✓ Scoring reads stored owner counters")
+
+    def test_verify_command_repairs_drift(self):
+        """verify_owner_counters --repair should fix counters changed behind its back."""
+        self.make_owner("10.00", is_pep=True).save()
+        Merchant.objects.filter(pk=self.merchant.pk).update(owner_count=5, pep_owner_count=0)
+
+        out = StringIO()
+        call_command("verify_owner_counters", stdout=out)
+        self.assertIn("1 merchant(s) have drifted", out.getvalue())
+        self.assertCounters(self.merchant, 5, 1, 0)
+
+        call_command("verify_owner_counters", "--repair", stdout=out)
+        self.assertCounters(self.merchant, 1, 1, 1)
+        self.assertFalse(Merchant.objects.with_owner_counter_drift().exists())
+        print("✓ verify_owner_counters repairs drift")
+
+
+class ReRiskTestCase(TestCase):
+    """Tests for delayed, coalesced re-risking after ownership and business edits."""
+
+    def setUp(self):
+        self.merchant = Merchant.objects.create(
+            business_name="Rerisk Test Ltd",
+            registration_number="RRK001",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@example.com",
+            phone="+65 1234 5678",
+            address="Singapore",
+            risk_level="LOW",
+        )
+
+    def add_owner(self, percentage, is_pep=False, number="P1"):
+        return BeneficialOwner.objects.create(
+            merchant=self.merchant,
+            full_name=f"Owner {number}",
+            nationality="SG",
+            ownership_percentage=Decimal(percentage),
+            id_document_type="PASSPORT",
+            id_document_number=number,
+            is_pep=is_pep,
+        )
+
+    def rerisk_tasks(self):
+        return Task.objects.filter(name=RERISK_MERCHANT)
+
+    @override_settings(TASK_QUEUE_EAGER=False)
+    def test_schedules_coalesce_into_one_delayed_task(self):
+        """Repeated schedules for a merchant should push back one waiting task."""
+        other = Merchant.objects.create(
+            business_name="Other Ltd", registration_number="RRK002", country="SG", business_category="ECOMMERCE",
+            email="other@example.com", phone="+65 1234 0000", address="Singapore",
+        )
+        for _ in range(5):
+            schedule_rerisk(self.merchant.pk)
+        schedule_rerisk(other.pk)
+
+        self.assertEqual(
+            sorted(self.rerisk_tasks().values_list("key", flat=True)),
+            sorted([merchant_task_key(self.merchant.pk), merchant_task_key(other.pk)]),
+        )
+        self.assertEqual(run_pending("test-worker"), 0)
+        self.rerisk_tasks().update(run_after=timezone.now())
+        self.assertEqual(run_pending("test-worker"), 2)
+        self.assertEqual(self.merchant.risk_assessments.count(), 1)
+
+        # Once the task has run, the next schedule queues a new one
+        schedule_rerisk(self.merchant.pk)
+        self.assertEqual(self.rerisk_tasks().filter(status="QUEUED").count(), 1)
+        print("✓ Re-risk schedules coalesce into one delayed task per merchant")
+
+    @override_settings(TASK_QUEUE_EAGER=False)
+    def test_owner_edits_schedule_rerisk(self):
+        """Owner saves and deletes should queue one re-risk of this merchant with the transaction."""
+        owner = self.add_owner("10.00")
+        owner.is_pep = True
+        owner.save()
+        owner.delete()
+
+        queued = self.rerisk_tasks().get()
+        self.assertEqual(queued.key, merchant_task_key(self.merchant.pk))
+        self.assertEqual(queued.payload, {"merchant_id": self.merchant.pk})
+        self.assertGreater(queued.run_after, timezone.now())
+        print("✓ Owner edits schedule re-risk")
+
+    @override_settings(TASK_QUEUE_EAGER=False)
+    def test_merchant_changes_schedule_only_for_risk_fields(self):
+        """Only business name, country and category edits should schedule re-risk."""
+        merchant = Merchant.objects.get(pk=self.merchant.pk)
+        merchant.review_notes = "Looked at it"
+        merchant.save()
+        self.assertFalse(self.rerisk_tasks().exists())
+
+        merchant.country = "ID"
+        merchant.save()
+        self.assertEqual(self.rerisk_tasks().get().payload, {"merchant_id": merchant.pk})
+        print("✓ Only risk-relevant merchant edits schedule re-risk")
+
+    @override_settings(TASK_QUEUE_EAGER=False)
+    def test_suppressed_writes_do_not_schedule(self):
+        """Writes inside suppress_rerisk should not schedule anything."""
+        with suppress_rerisk():
+            self.add_owner("10.00")
+        self.assertFalse(self.rerisk_tasks().exists())
+        print("✓ Suppressed writes skip re-risk")
+
+    def test_rerisk_updates_level_and_records_assessment(self):
+        """Re-risking should record an assessment and store a changed level."""
+        for i in range(4):
+            self.add_owner("10.00", is_pep=(i == 0), number=f"P{i}")
+        Merchant.objects.filter(pk=self.merchant.pk).update(business_category="CRYPTO")
+
+        score, _, risk_level = rerisk_merchant(self.merchant.pk)
+
+        self.merchant.refresh_from_db()
+        self.assertEqual(self.merchant.risk_level, risk_level)
+        self.assertNotEqual(risk_level, "LOW")
+        self.assertEqual(self.merchant.get_latest_risk_assessment().risk_score, score)
+        self.assertEqual(self.merchant.screening_status, "CLEAR")
+        self.assertIsNone(rerisk_merchant(0))
+        print(f"✓ Re-risk raised level to {risk_level} and rescreened")
+
+
+class UltimateBeneficialOwnerTestCase(TestCase):
+    """Tests for resolving owners through corporate ownership chains."""
+
+    def setUp(self):
+        clear_ubo_cache()
+        self.addCleanup(clear_ubo_cache)
+        self.merchant = Merchant.objects.create(
+            business_name="Chain Test Ltd",
+            registration_number="UBO001",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@example.com",
+            phone="+65 1234 5678",
+            address="Singapore",
+        )
+
+    def entity(self, name):
+        return CorporateEntity.objects.create(name=name, country="SG")
+
+    def person_stake(self, entity, name, percentage, number, is_pep=False):
+        return EntityOwnership.objects.create(
+            entity=entity,
+            full_name=name,
+            nationality="SG",
+            id_document_type="PASSPORT",
+            id_document_number=number,
+            is_pep=is_pep,
+            ownership_percentage=Decimal(percentage),
+        )
+
+    def entity_stake(self, entity, owner, percentage):
+        return EntityOwnership.objects.create(entity=entity, owner_entity=owner, ownership_percentage=Decimal(percentage))
+
+    def merchant_owner(self, percentage, entity=None, name="Direct Owner", number="D1", is_pep=False):
+        return BeneficialOwner.objects.create(
+            merchant=self.merchant,
+            corporate_entity=entity,
+            full_name=entity.name if entity else name,
+            nationality="SG",
+            ownership_percentage=Decimal(percentage),
+            id_document_type="PASSPORT",
+            id_document_number="" if entity else number,
+            is_pep=is_pep,
+        )
+
+    def test_percentages_multiply_and_combine_along_paths(self):
+        """Indirect shares multiply along a path and sum per person."""
+        holdco = self.entity("HoldCo")
+        parent = self.entity("ParentCo")
+        self.entity_stake(holdco, parent, "50.00")
+        self.person_stake(holdco, "Second Person", "50.00", "D2")
+        self.person_stake(parent, "Direct Owner", "100.00", "D1")
+        self.merchant_owner("20.00")
+        self.merchant_owner("80.00", entity=holdco)
+
+        owners = {owner.full_name: owner for owner in resolve_beneficial_owners(self.merchant)}
+
+        self.assertEqual(owners["Direct Owner"].ownership_percentage, Decimal("60.00"))
+        self.assertEqual(owners["Second Person"].ownership_percentage, Decimal("40.00"))
+        self.assertEqual(owners["Second Person"].via, ("HoldCo",))
+        print("✓ Effective ownership multiplies along chains and combines per person")
+
+    def test_cycles_are_cut(self):
+        """Circular holdings should terminate, counting each loop once."""
+        a = self.entity("A Holdings")
+        b = self.entity("B Holdings")
+        self.entity_stake(a, b, "50.00")
+        self.entity_stake(b, a, "50.00")
+        self.person_stake(b, "Cycle Person", "50.00", "C1")
+
+        owners = resolve_entity_owners(a.pk)
+
+        self.assertEqual(len(owners), 1)
+        self.assertEqual(owners[0].ownership_percentage, Decimal("25.00"))
+        self.assertEqual(owners[0].via, ("B Holdings",))
+        print("✓ Ownership cycles are cut")
+
+    def test_resolutions_cached_until_edges_change(self):
+        """Cached chains should need no queries, and edge edits should invalidate them."""
+        holdco = self.entity("HoldCo")
+        parent = self.entity("ParentCo")
+        self.entity_stake(holdco, parent, "100.00")
+        stake = self.person_stake(parent, "Owner One", "100.00", "O1")
+        resolve_entity_owners(holdco.pk)
+
+        with self.assertNumQueries(0):
+            resolve_entity_owners(holdco.pk)
+
+        stake.full_name = "Owner Two"
+        stake.id_document_number = "O2"
+        stake.save()
+        self.assertEqual([owner.full_name for owner in resolve_entity_owners(holdco.pk)], ["Owner Two"])
+        print("✓ Resolved chains are cached and invalidated on edge changes")
+
+    def test_large_structures_resolve_with_one_query_per_level(self):
+        """Densely shared layers should resolve through memoization, not path enumeration."""
+        layers = [[self.entity(f"L{depth}-{i}") for i in range(20)] for depth in range(5)]
+        EntityOwnership.objects.bulk_create([
+            EntityOwnership(entity=owned, owner_entity=owner, ownership_percentage=Decimal("5.00"))
+            for upper, lower in zip(layers, layers[1:])
+            for owned in upper
+            for owner in lower
+        ])
+        EntityOwnership.objects.bulk_create([
+            EntityOwnership(
+                entity=entity, full_name=f"Person {i}", nationality="SG",
+                id_document_type="PASSPORT", id_document_number=f"LP{i}", ownership_percentage=Decimal("100.00"),
+            )
+            for i, entity in enumerate(layers[-1])
+        ])
+
+        with self.assertNumQueries(len(layers)):
+            owners = resolve_entity_owners(layers[0][0].pk)
+
+        self.assertEqual(len(owners), 20)
+        self.assertEqual(sum(owner.ownership_percentage for owner in owners), Decimal("100.00"))
+        print("✓ 1,620-edge structure resolved with one query per level")
+
+    def test_scoring_and_screening_use_ultimate_owners(self):
+        """Risk scoring and screening should see people behind corporate shareholders."""
+        holdco = self.entity("Shell Corp Ltd")
+        self.person_stake(holdco, "John Politician", "100.00", "PEP1", is_pep=True)
+        self.merchant_owner("100.00", entity=holdco)
+        merchant = Merchant.objects.get(pk=self.merchant.pk)
+        self.assertEqual(merchant.corporate_owner_count, 1)
+
+        _, factors, _ = calculate_risk_score(merchant)
+        self.assertIn("PEP involvement: 1 politically exposed person(s)", factors)
+        self.assertEqual(calculate_risk_scores(Merchant.objects.filter(pk=merchant.pk), persist=False)[merchant.pk][1], factors)
+
+        self.assertEqual(screen_merchant(merchant), "MATCH")
+        entities = set(merchant.get_current_screening_results().values_list("screened_entity", flat=True))
+        self.assertIn("Corporate owner: Shell Corp Ltd", entities)
+        self.assertIn("Owner: John Politician", entities)
+        print("✓ Scoring and screening consume resolved UBOs")
+
+    def test_corporate_owners_without_shareholders_are_kept_and_screened(self):
+        """A company with no recorded shareholders should still be an owner, scored and screened."""
+        holdco = self.entity("HoldCo")
+        leaf = self.entity("Blacklisted Enterprises")
+        self.entity_stake(holdco, leaf, "10.00")
+        self.person_stake(holdco, "Second Person", "90.00", "D2")
+        shell = self.entity("Shell Corp Ltd")
+        self.merchant_owner("60.00", entity=shell)
+        self.merchant_owner("40.00", entity=holdco)
+        merchant = Merchant.objects.get(pk=self.merchant.pk)
+
+        owners = {owner.full_name: owner for owner in resolve_beneficial_owners(merchant)}
+        self.assertEqual(set(owners), {"Shell Corp Ltd", "Blacklisted Enterprises", "Second Person"})
+        self.assertEqual(owners["Shell Corp Ltd"].ownership_percentage, Decimal("60.00"))
+        self.assertEqual(owners["Blacklisted Enterprises"].ownership_percentage, Decimal("4.00"))
+        self.assertEqual(owners["Blacklisted Enterprises"].via, ("HoldCo",))
+
+        self.assertEqual(resolve_owner_features([merchant.pk], 25), {merchant.pk: (1, 0)})
+
+        self.assertEqual(screen_merchant(merchant), "MATCH")
+        results = dict(merchant.get_current_screening_results().values_list("screened_entity", "status"))
+        self.assertEqual(results["Corporate owner: Shell Corp Ltd"], "MATCH")
+        self.assertEqual(results["Corporate owner: Blacklisted Enterprises"], "MATCH")
+        self.assertIn("Corporate owner: HoldCo", results)
+        self.assertNotIn("Owner: Shell Corp Ltd", results)
+        print("✓ Corporate owners with no recorded shareholders are kept and screened")
+
+
+class LinkAnalysisTestCase(TestCase):
+    """Tests for clustering merchants that share owners or contact details."""
+
+    def make_merchant(self, suffix, email=None, phone=None, address="Singapore", owner_document=None, **kwargs):
+        merchant = Merchant.objects.create(
+            business_name=f"Linked Merchant {suffix}",
+            registration_number=f"LNK{suffix}",
+            country="SG",
+            business_category="ECOMMERCE",
+            email=email or f"{suffix}@example.com",
+            phone=phone or f"+65 9000 {suffix:0>4}",
+            address=address,
+            **kwargs,
+        )
+        if owner_document:
+            BeneficialOwner.objects.create(
+                merchant=merchant,
+                full_name=f"Owner {suffix}",
+                nationality="SG",
+                ownership_percentage=Decimal("100.00"),
+                id_document_type="PASSPORT",
+                id_document_number=owner_document,
+            )
+        return merchant
+
+    def test_shared_identifiers_cluster_transitively(self):
+        """Merchants sharing an owner document or phone should end up in one cluster."""
+        a = self.make_merchant("1", owner_document="S1234567A")
+        b = self.make_merchant("2", owner_document="s1234567a", phone="+65 8888 0000")
+        c = self.make_merchant("3", phone="65-8888-0000")
+        loner = self.make_merchant("4")
+        for merchant in (a, b, c, loner):
+            link_merchant(merchant)
+
+        clusters = {m.pk: m.link_cluster_id for m in Merchant.objects.filter(pk__in=[a.pk, b.pk, c.pk, loner.pk])}
+        self.assertIsNotNone(clusters[a.pk])
+        self.assertEqual(clusters[a.pk], clusters[b.pk])
+        self.assertEqual(clusters[b.pk], clusters[c.pk])
+        self.assertIsNone(clusters[loner.pk])
+        self.assertEqual(LinkCluster.objects.get().size, 3)
+        print("✓ Shared owners and phones cluster merchants transitively")
+
+    def test_same_name_different_people_do_not_link(self):
+        """Owners sharing only a name should not link; name and nationality do without documents."""
+        def owned_by(suffix, nationality, number):
+            merchant = self.make_merchant(suffix)
+            BeneficialOwner.objects.create(
+                merchant=merchant, full_name="Wei Ming Tan", nationality=nationality,
+                ownership_percentage=Decimal("100.00"), id_document_type="PASSPORT", id_document_number=number,
+            )
+            return merchant
+
+        link_merchant(owned_by("1", "SG", "E1111111"))
+        self.assertIsNone(link_merchant(owned_by("2", "SG", "E2222222")))
+        link_merchant(owned_by("3", "MY", ""))
+        self.assertIsNone(link_merchant(owned_by("4", "SG", "")))
+        self.assertIsNotNone(link_merchant(owned_by("5", "MY", "")))
+        print("✓ Owners are linked on documents, not on a shared name")
+
+    def test_generic_address_does_not_link(self):
+        """A bare city as address is too generic to link merchants on."""
+        a = self.make_merchant("1")
+        b = self.make_merchant("2")
+        link_merchant(a)
+        self.assertIsNone(link_merchant(b))
+        print("✓ Generic addresses are not linked on")
+
+    def test_bridge_merges_clusters_with_bounded_queries(self):
+        """Joining two clusters should relabel the smaller one in a fixed number of queries."""
+        big = [self.make_merchant(str(i), email="big@example.com") for i in range(10)]
+        small = [self.make_merchant(str(i), email="small@example.com") for i in range(10, 13)]
+        for merchant in big + small:
+            link_merchant(merchant)
+        bridge = self.make_merchant("99", email="big@example.com", phone=small[0].phone)
+
+        # Owner load, index insert and lookup, cluster lock, relabel, delete, join, resize
+        with self.assertNumQueries(9):
+            cluster = link_merchant(bridge)
+
+        self.assertEqual(cluster.size, 14)
+        self.assertEqual(LinkCluster.objects.count(), 1)
+        self.assertEqual(Merchant.objects.filter(link_cluster=cluster).count(), 14)
+        print("✓ Cluster merge relabels the smaller cluster in 9 queries")
+
+    def test_adverse_linked_merchant_adds_risk(self):
+        """Links to a rejected merchant should raise risk identically across scoring paths."""
+        rejected = self.make_merchant("1", owner_document="X999", status="REJECTED")
+        applicant = self.make_merchant("2", owner_document="X999")
+        link_merchant(rejected)
+        link_merchant(applicant)
+        applicant = Merchant.objects.get(pk=applicant.pk)
+
+        score, factors, _ = calculate_risk_score(applicant)
+        self.assertIn("Linked to 1 rejected or sanctions-matched merchant(s)", factors)
+        self.assertNotIn("Linked to", " ".join(calculate_risk_score(Merchant.objects.get(pk=rejected.pk))[1]))
+
+        batch = calculate_risk_scores(Merchant.objects.filter(pk=applicant.pk), persist=False)
+        self.assertEqual(batch[applicant.pk], (score, factors, calculate_risk_score(applicant)[2]))
+        features = load_features(Merchant.objects.filter(pk=applicant.pk))
+        scores, _ = score_features(features)
+        self.assertEqual(int(scores[0]), score)
+        print(f"✓ Adverse link adds risk consistently (score {score})")
+
+    def test_pep_match_is_not_adverse(self):
+        """Only a sanctions match, not a PEP owner, should make a linked merchant adverse."""
+        pep_owned = self.make_merchant("1", owner_document="P111", screening_status="MATCH")
+        sanctioned = self.make_merchant("2", owner_document="P111", screening_status="MATCH")
+        applicant = self.make_merchant("3", owner_document="P111")
+        for merchant, overall_status in ((pep_owned, "POTENTIAL_MATCH"), (sanctioned, "MATCH")):
+            run = ScreeningRun.objects.create(merchant=merchant, overall_status=overall_status)
+            Merchant.objects.filter(pk=merchant.pk).update(current_screening_run=run)
+        for merchant in (pep_owned, sanctioned, applicant):
+            link_merchant(merchant)
+        applicant = Merchant.objects.get(pk=applicant.pk)
+
+        _, factors, _ = calculate_risk_score(applicant)
+        self.assertIn("Linked to 1 rejected or sanctions-matched merchant(s)", factors)
+        _, factors, _ = calculate_risk_score(Merchant.objects.get(pk=sanctioned.pk))
+        self.assertFalse(any("sanctions-matched" in factor for factor in factors))
+        features = load_features(Merchant.objects.filter(pk__in=[sanctioned.pk, applicant.pk]))
+        adverse = dict(zip(features.ids.tolist(), features.linked_adverse.tolist()))
+        self.assertEqual(adverse, {sanctioned.pk: 0, applicant.pk: 1})
+        print("✓ PEP-only matches don't count as adverse links")
+
+    def test_rebuild_splits_stale_clusters(self):
+        """rebuild_link_clusters should split clusters once the shared owner is gone."""
+        a = self.make_merchant("1", owner_document="Z1")
+        b = self.make_merchant("2", owner_document="Z1")
+        link_merchant(a)
+        link_merchant(b)
+        b.owners.update(id_document_number="Z2", full_name="Someone Else")
+
+        out = StringIO()
+        call_command("rebuild_link_clusters", stdout=out)
+
+        self.assertIn("0 link cluster(s)", out.getvalue())
+        self.assertFalse(Merchant.objects.filter(link_cluster__isnull=False).exists())
+        print("✓ Rebuild splits clusters whose links were removed")
+
+
+class SimilarMerchantTestCase(TestCase):
+    """Tests for MinHash LSH detection of near-duplicate merchants."""
+
+    def make_merchant(self, name, registration_number, address, email, phone, status="PENDING"):
+        merchant = Merchant.objects.create(
+            business_name=name,
+            registration_number=registration_number,
+            country="SG",
+            business_category="ECOMMERCE",
+            email=email,
+            phone=phone,
+            address=address,
+            status=status,
+        )
+        index_merchant(merchant, created=True)
+        return merchant
+
+    def setUp(self):
+        self.rejected = self.make_merchant(
+            "Shady Payments Pte Ltd", "SIM001", "12 Marina Bay Road #05-01 Singapore",
+            "ops@shadypay.sg", "+65 6123 4567", status="REJECTED",
+        )
+        self.make_merchant(
+            "Green Leaf Grocers", "SIM002", "88 Orchard Street Singapore", "hello@greenleaf.sg", "+65 6999 0000",
+        )
+
+    def test_renamed_reapplication_is_flagged(self):
+        """A slightly renamed application at the same address and phone should match."""
+        applicant = Merchant(
+            business_name="Shady Payment Ltd", registration_number="SIM003",
+            address="12 Marina Bay Road #05-01, Singapore", email="admin@shady-pay.com", phone="6123 4567",
+        )
+        applicant.save()
+
+        similar = flag_similar_merchants(applicant, created=True)
+
+        self.assertEqual([match["registration_number"] for match in similar], ["SIM001"])
+        self.assertGreaterEqual(similar[0]["similarity"], 0.5)
+        self.assertTrue(has_rejected_lookalike(applicant))
+        self.assertEqual(MerchantSignature.objects.filter(merchant=applicant).count(), 1)
+        print(f"✓ Renamed re-application flagged ({similar[0]['similarity']:.0%} similar)")
+
+    def test_unrelated_merchant_not_flagged(self):
+        """A different business should not be flagged."""
+        applicant = Merchant.objects.create(
+            business_name="Blue Ocean Travel", registration_number="SIM004", country="SG",
+            business_category="DIGITAL_SERVICES", email="trips@blueocean.sg", phone="+65 6000 1111",
+            address="3 Harbourfront Walk Singapore",
+        )
+        self.assertEqual(flag_similar_merchants(applicant, created=True), [])
+        self.assertFalse(has_rejected_lookalike(applicant))
+        print("✓ Unrelated merchant not flagged")
+
+    def test_lookup_is_one_indexed_query(self):
+        """Finding similar merchants should be a single query whatever the index size."""
+        for i in range(100):
+            self.make_merchant(
+                f"Filler Business {i}", f"FILL{i}", f"{i} Filler Lane Singapore", f"f{i}@filler.sg", f"+65 7000 {i:04}",
+            )
+        applicant = Merchant(business_name="Shady Payments", address="12 Marina Bay Road", email="", phone="")
+
+        with self.assertNumQueries(1):
+            similar = find_similar_merchants(applicant)
+        self.assertIn("SIM001", [match["registration_number"] for match in similar])
+        print("✓ Similarity lookup is one query over 102 indexed merchants")
+
+    def test_registration_routes_lookalike_to_review(self):
+        """A low-risk registration resembling a rejected merchant should not be auto-approved."""
+        data = {
+            "business_name": "Shady Payments Singapore Pte Ltd",
+            "registration_number": "SIM005",
+            "country": "SG",
+            "business_category": "ECOMMERCE",
+            "email": "ops@shadypay.sg",
+            "phone": "+65 6123 4567",
+            "address": "12 Marina Bay Road #05-01 Singapore",
+            "owners-TOTAL_FORMS": "0",
+            "owners-INITIAL_FORMS": "0",
+            "owners-MIN_NUM_FORMS": "0",
+            "owners-MAX_NUM_FORMS": "1000",
+        }
+        self.client.post(reverse("register_merchant"), data)
+
+        merchant = Merchant.objects.get(registration_number="SIM005")
+        self.assertEqual(merchant.status, "UNDER_REVIEW")
+        self.assertEqual(merchant.review_flags[0]["registration_number"], "SIM001")
+        print("✓ Look-alike of a rejected merchant routed to review")
+
+    def test_rebuild_command_indexes_existing_merchants(self):
+        """rebuild_similarity_index should index merchants created without it."""
+        Merchant.objects.create(
+            business_name="Legacy Merchant", registration_number="SIM006", country="SG",
+            business_category="ECOMMERCE", email="legacy@example.com", phone="+65 6555 5555",
+            address="1 Old Street Singapore",
+        )
+        out = StringIO()
+        call_command("rebuild_similarity_index", stdout=out)
+
+        self.assertIn("Indexed 3 merchant(s)", out.getvalue())
+        self.assertEqual(SimilarityBucket.objects.count(), 3 * 20)
+        print("✓ Similarity index rebuilt for existing merchants")
+
+
+class BatchRiskScoringTestCase(TestCase):
+    """Tests for set-based risk scoring over querysets."""
+
+    def setUp(self):
+        profiles = [
+            ("SG", "ECOMMERCE", [("20.00", False), ("20.00", False)]),
+            ("ID", "CRYPTO", [("10.00", True), ("10.00", False), ("10.00", False), ("10.00", False)]),
+            ("PH", "GAMING", [("60.00", True)]),
+            ("VN", "REMITTANCES", []),
+        ]
+        for i, (country, category, owners) in enumerate(profiles):
+            merchant = Merchant.objects.create(
+                business_name=f"Batch Merchant {i}",
+                registration_number=f"BATCH{i}",
+                country=country,
+                business_category=category,
+                email="test@example.com",
+                phone="+65 1234 5678",
+                address="Singapore",
+            )
+            for j, (percentage, is_pep) in enumerate(owners):
+                BeneficialOwner.objects.create(
+                    merchant=merchant,
+                    full_name=f"Owner {i}-{j}",
+                    nationality=country,
+                    ownership_percentage=Decimal(percentage),
+                    id_document_type="PASSPORT",
+                    id_document_number=f"P{i}{j}",
+                    is_pep=is_pep,
+                )
+
+    def test_batch_matches_per_merchant_scoring(self):
+        """Batch scores, factors and levels should equal calculate_risk_score."""
+        results = calculate_risk_scores(Merchant.objects.all(), persist=False)
+
+        for merchant in Merchant.objects.all():
+            self.assertEqual(results[merchant.pk], calculate_risk_score(merchant))
+        print(f"✓ Batch scoring matches per-merchant scoring for {len(results)} merchants")
+
+    def test_batch_scoring_uses_single_query(self):
+        """Scoring a whole queryset should take one aggregated query."""
+        with self.assertNumQueries(1):
+            calculate_risk_scores(Merchant.objects.all(), persist=False)
+
+        # Clustered merchants with screening runs are still read in the same query
+        cluster = LinkCluster.objects.create(size=Merchant.objects.count())
+        for merchant in Merchant.objects.all():
+            run = ScreeningRun.objects.create(
+                merchant=merchant, overall_status="MATCH" if merchant.country == "PH" else "CLEAR",
+            )
+            Merchant.objects.filter(pk=merchant.pk).update(link_cluster=cluster, current_screening_run=run)
+        with self.assertNumQueries(1):
+            results = calculate_risk_scores(Merchant.objects.all(), persist=False)
+        for merchant in Merchant.objects.all():
+            self.assertEqual(results[merchant.pk], calculate_risk_score(merchant))
+        self.assertEqual(sum("sanctions-matched" in " ".join(factors) for _, factors, _ in results.values()), 3)
+        print("✓ Batch scoring uses a single query")
+
+    def test_batch_scoring_persists_assessments_and_levels(self):
+        """Persisting should record assessments and update changed risk levels."""
+        results = calculate_risk_scores(Merchant.objects.all())
+
+        self.assertEqual(RiskAssessment.objects.count(), len(results))
+        for merchant in Merchant.objects.all():
+            score, _, risk_level = results[merchant.pk]
+            self.assertEqual(merchant.risk_level, risk_level)
+            self.assertEqual(merchant.get_latest_risk_assessment().risk_score, score)
+        print("✓ Batch scoring persisted assessments and risk levels")
+
+
+class PortfolioRecomputeTestCase(TestCase):
+    """Tests for vectorized portfolio risk recomputation."""
+
+    def setUp(self):
+        profiles = [
+            ("SG", "ECOMMERCE", 0, 0),
+            ("SG", "DIGITAL_SERVICES", 2, 0),
+            ("ID", "CRYPTO", 4, 1),
+            ("PH", "GAMING", 0, 1),
+            ("VN", "REMITTANCES", 3, 0),
+            ("MY", "UNKNOWN", 1, 0),
+        ]
+        for i, (country, category, small, pep) in enumerate(profiles):
+            merchant = Merchant.objects.create(
+                business_name=f"Portfolio Merchant {i}",
+                registration_number=f"PORT{i}",
+                country=country,
+                business_category=category,
+                email="test@example.com",
+                phone="+65 1234 5678",
+                address="Singapore",
+            )
+            for j in range(max(small, pep)):
+                BeneficialOwner.objects.create(
+                    merchant=merchant,
+                    full_name=f"Owner {i}-{j}",
+                    nationality=country,
+                    ownership_percentage=Decimal("10.00") if j < small else Decimal("60.00"),
+                    id_document_type="PASSPORT",
+                    id_document_number=f"PF{i}{j}",
+                    is_pep=j < pep,
+                )
+        for merchant in Merchant.objects.all():
+            merchant.risk_level = calculate_risk_score(merchant)[2]
+            merchant.save()
+
+    def test_vectorized_scores_match_per_merchant_scoring(self):
+        """Vectorized scores and levels should equal calculate_risk_score."""
+        rules = CompiledRules({"pep_points": 22, "country_share": 0.35}, version=9)
+        features = load_features(minority_threshold=rules.minority_threshold)
+        scores, levels = score_features(features, rules)
+
+        for pk, score, level in zip(features.ids, scores, levels):
+            merchant = Merchant.objects.get(pk=pk)
+            expected_score, _, expected_level = calculate_risk_score(merchant, rules=rules)
+            self.assertEqual((int(score), RISK_LEVELS[level]), (expected_score, expected_level))
+        print(f"✓ Vectorized scoring matches for {len(features)} merchants")
+
+    def test_recompute_writes_only_changed_levels(self):
+        """Recomputing should update only merchants whose level moved and report directions."""
+        rules = CompiledRules({"thresholds": {"LOW": 5, "MEDIUM": 40, "HIGH": 100}}, version=9)
+        expected = {
+            merchant.pk: calculate_risk_score(merchant, rules=rules)
+            for merchant in Merchant.objects.all()
+        }
+        moved = sum(1 for merchant in Merchant.objects.all() if merchant.risk_level != expected[merchant.pk][2])
+
+        report = recompute_portfolio_risk(rules=rules, chunk_size=2)
+
+        self.assertEqual(report["scored"], 6)
+        self.assertEqual(report["rescored"], 6)
+        self.assertEqual(report["changed"], moved)
+        self.assertEqual(report["raised"], moved)
+        self.assertEqual(report["lowered"], 0)
+        self.assertEqual(sum(report["transitions"].values()), moved)
+        for merchant in Merchant.objects.all():
+            score, _, level = expected[merchant.pk]
+            self.assertEqual((merchant.risk_score, merchant.risk_level), (score, level))
+
+        # A score change that keeps the level is written too
+        Merchant.objects.filter(pk=merchant.pk).update(risk_score=expected[merchant.pk][0] + 1)
+        report = recompute_portfolio_risk(rules=rules)
+        self.assertEqual((report["rescored"], report["changed"]), (1, 0))
+        self.assertEqual(Merchant.objects.get(pk=merchant.pk).risk_score, expected[merchant.pk][0])
+        print(f"✓ Recompute changed {moved} risk level(s): {report['transitions']}")
+
+    def test_dry_run_does_not_write(self):
+        """A dry run should report changes without saving them."""
+        rules = CompiledRules({"thresholds": {"LOW": 5, "MEDIUM": 40, "HIGH": 100}}, version=9)
+        before = dict(Merchant.objects.values_list("pk", "risk_level"))
+
+        report = recompute_portfolio_risk(rules=rules, dry_run=True)
+
+        self.assertGreater(report["changed"], 0)
+        self.assertEqual(dict(Merchant.objects.values_list("pk", "risk_level")), before)
+        print("✓ Dry run left risk levels unchanged")
+
+
+class RiskRuleSimulationTestCase(TestCase):
+    """Tests for what-if simulation of risk rule changes."""
+
+    def setUp(self):
+        self.approver = User.objects.create_user(username="officer", password="x")
+        rows = [
+            ("SG", "ECOMMERCE", "APPROVED", None),
+            ("SG", "DIGITAL_SERVICES", "APPROVED", self.approver),
+            ("PH", "ECOMMERCE", "PENDING", None),
+            ("ID", "CRYPTO", "PENDING", None),
+        ]
+        for i, (country, category, status, reviewer) in enumerate(rows):
+            merchant = Merchant.objects.create(
+                business_name=f"Simulated Merchant {i}",
+                registration_number=f"SIM{i}",
+                country=country,
+                business_category=category,
+                email="test@example.com",
+                phone="+65 1234 5678",
+                address="Singapore",
+                status=status,
+                reviewed_by=reviewer,
+            )
+            score, factors, risk_level = calculate_risk_score(merchant)
+            RiskAssessment.objects.create(merchant=merchant, risk_score=score, risk_factors=factors)
+            merchant.risk_level = risk_level
+            merchant.save()
+            screen_merchant(merchant)
+
+    def test_simulation_reports_transitions_without_writing(self):
+        """Raising the SG weight should move SG merchants up and write nothing."""
+        candidate = CompiledRules({"country_weights": {**COUNTRY_WEIGHTS, "SG": 100}}, version=5)
+        before = list(Merchant.objects.values_list("pk", "risk_level", "status", "updated_at"))
+        assessments = RiskAssessment.objects.count()
+
+        report = simulate_rules(candidate, baseline=CompiledRules(DEFAULT_RULES))
+
+        self.assertEqual(report["merchants"], 4)
+        self.assertEqual(report["transition_matrix"]["LOW"]["MEDIUM"], 2)
+        self.assertEqual(report["by_country"]["SG"], {"merchants": 2, "raised": 2, "lowered": 0})
+        self.assertEqual(report["by_country"]["PH"]["raised"], 0)
+        # Only the unreviewed approval counts as an auto-approval
+        self.assertEqual(report["auto_approvals_blocked"], 1)
+        self.assertEqual(list(Merchant.objects.values_list("pk", "risk_level", "status", "updated_at")), before)
+        self.assertEqual(RiskAssessment.objects.count(), assessments)
+        print(f"✓ Simulation: {report['changed']} change(s), {report['auto_approvals_blocked']} approval(s) blocked")
+
+    def test_simulation_threshold_change(self):
+        """Loosening thresholds should surface newly auto-approvable merchants and historic moves."""
+        candidate = CompiledRules({"thresholds": {"LOW": 60, "MEDIUM": 80, "HIGH": 100}}, version=6)
+
+        report = simulate_rules(candidate, baseline=CompiledRules(DEFAULT_RULES))
+
+        self.assertEqual(report["newly_auto_approvable"], 1)
+        self.assertEqual(report["historic_assessments"]["evaluated"], 4)
+        self.assertEqual(report["historic_assessments"]["transition_matrix"]["MEDIUM"]["LOW"], 1)
+        print(f"✓ Threshold simulation: {report['newly_auto_approvable']} newly auto-approvable")
+
+
 class SanctionsScreeningTestCase(TestCase):
     """Tests for sanctions screening service."""
 
@@ -227,6 +1303,26 @@ class SanctionsScreeningTestCase(TestCase):
         self.assertTrue(merchant.screening_results.exists())
         print(f"✓ Screening created {merchant.screening_results.count()} result(s)")
 
+    def test_screening_past_deadline_records_nothing(self):
+        """Screening that runs out of time should raise and leave no run behind."""
+        merchant = Merchant.objects.create(
+            business_name="Slow Screen Ltd",
+            registration_number="SLOW001",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@slowscreen.com",
+            phone="+65 1234",
+            address="Singapore",
+        )
+
+        with self.assertRaises(ScreeningTimeout):
+            screen_merchant(merchant, deadline=time.monotonic())
+
+        merchant.refresh_from_db()
+        self.assertEqual(merchant.screening_status, "NOT_SCREENED")
+        self.assertFalse(merchant.screening_runs.exists())
+        print("✓ Screening past its deadline records nothing")
+
 
 class MerchantAutoApprovalTestCase(TestCase):
     """Tests for auto-approval logic."""
@@ -348,6 +1444,56 @@ class MerchantRegistrationViewTestCase(TestCase):
         self.assertEqual(merchant.risk_level, "LOW")
         print(f"✓ Low-risk registration auto-approved: {merchant.status}")
 
+    def registration_data(self, registration_number, owner_count):
+        data = {
+            "business_name": "Query Count Ltd",
+            "registration_number": registration_number,
+            "country": "SG",
+            "business_category": "ECOMMERCE",
+            "email": f"test-{registration_number}@querycount.com",
+            "phone": f"+65 1212 12{owner_count:02d}",
+            "address": "Singapore",
+            "owners-TOTAL_FORMS": str(owner_count),
+            "owners-INITIAL_FORMS": "0",
+            "owners-MIN_NUM_FORMS": "0",
+            "owners-MAX_NUM_FORMS": "1000",
+        }
+        for i in range(owner_count):
+            data.update({
+                f"owners-{i}-full_name": f"Jane Doe {owner_count}-{i}",
+                f"owners-{i}-nationality": "SG",
+                f"owners-{i}-ownership_percentage": str(Decimal(100) / owner_count),
+                f"owners-{i}-id_document_type": "PASSPORT",
+                f"owners-{i}-id_document_number": f"E1212{owner_count:02d}{i}",
+            })
+        return data
+
+    def test_registration_query_count(self):
+        """Registration should insert the merchant once and write its decision once, whatever the owner count."""
+        # Savepoint, merchant and owner inserts, identifier insert and
+        # linked-merchant lookup, similarity lookup and signature and bucket
+        # inserts, assessment insert, list version lookup, screening run and
+        # results inserts in their savepoint, the decision UPDATE, release.
+        # Without owners there is no owner insert
+        reload_rules()
+        for owner_count, expected in ((0, 15), (1, 16), (10, 16)):
+            registration_number = f"SG1212{owner_count}"
+            with self.subTest(owners=owner_count):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.post(reverse("register_merchant"), self.registration_data(registration_number, owner_count))
+                self.assertEqual(len(queries), expected, "\n".join(query["sql"] for query in queries))
+
+                merchant_writes = [
+                    query["sql"] for query in queries if query["sql"].startswith('UPDATE "merchants_merchant"')
+                ]
+                self.assertEqual(len(merchant_writes), 1)
+                merchant = Merchant.objects.get(registration_number=registration_number)
+                self.assertEqual(merchant.status, "APPROVED")
+                self.assertEqual(merchant.owner_count, owner_count)
+                self.assertEqual(merchant.minority_owner_count, 10 if owner_count == 10 else 0)
+                self.assertEqual(merchant.screening_status, "CLEAR")
+        print("✓ Registration query counts locked at 15/16/16 for 0/1/10 owners")
+
     def test_elevated_risk_registration_pending(self):
         """Submitting elevated-risk registration should result in PENDING status."""
         data = {
@@ -425,6 +1571,214 @@ class MerchantRegistrationViewTestCase(TestCase):
         self.assertContains(response, "Approved")
         print("✓ Status check finds merchant successfully")
 
+    def test_formatting_variant_registration_rejected(self):
+        """A registration number differing only in formatting is a duplicate."""
+        Merchant.objects.create(
+            business_name="First Variant Ltd",
+            registration_number="SG-123 456",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@firstvariant.com",
+            phone="+65 1111 2222",
+            address="Singapore",
+        )
+        data = {
+            "business_name": "Second Variant Ltd",
+            "registration_number": "sg123456",
+            "country": "SG",
+            "business_category": "ECOMMERCE",
+            "email": "test@secondvariant.com",
+            "phone": "+65 3333 4444",
+            "address": "Singapore",
+            "owners-TOTAL_FORMS": "0",
+            "owners-INITIAL_FORMS": "0",
+            "owners-MIN_NUM_FORMS": "0",
+            "owners-MAX_NUM_FORMS": "1000",
+        }
+
+        response = self.client.post(reverse("register_merchant"), data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "already exists")
+        self.assertEqual(Merchant.objects.count(), 1)
+        print("✓ Formatting-variant registration number rejected as duplicate")
+
+    def test_status_check_matches_formatting_variant(self):
+        """Status lookups accept the registration number in any formatting, in one query."""
+        Merchant.objects.create(
+            business_name="Variant Lookup Pte Ltd",
+            registration_number="201912345K",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@variantlookup.com",
+            phone="+65 5555 6666",
+            address="Singapore",
+        )
+
+        with self.assertNumQueries(1):
+            merchant = Merchant.objects.get_by_registration_number("sg 2019-12345k")
+        self.assertEqual(merchant.business_name, "Variant Lookup Pte Ltd")
+        self.assertIsNone(Merchant.objects.get_by_registration_number("2019-12345X"))
+
+        response = self.client.post(reverse("check_status"), {"registration_number": "2019 12345 k"})
+        self.assertContains(response, "Variant Lookup Pte Ltd")
+        response = self.client.get(reverse("merchant_status", args=["sg-201912345k"]))
+        self.assertContains(response, "Variant Lookup Pte Ltd")
+        print("✓ Status lookup matches formatting variants")
+
+    def test_country_prefixed_numbers_are_distinct(self):
+        """The same digits under different country codes are different merchants."""
+        Merchant.objects.create(
+            business_name="Singapore Prefix Pte Ltd",
+            registration_number="SG-123456",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@sgprefix.com",
+            phone="+65 1234 0000",
+            address="Singapore",
+        )
+        data = {
+            "business_name": "Philippines Prefix Inc",
+            "registration_number": "PH-123456",
+            "country": "PH",
+            "business_category": "ECOMMERCE",
+            "email": "test@phprefix.com",
+            "phone": "+63 1234 0000",
+            "address": "Manila",
+            "owners-TOTAL_FORMS": "0",
+            "owners-INITIAL_FORMS": "0",
+            "owners-MIN_NUM_FORMS": "0",
+            "owners-MAX_NUM_FORMS": "1000",
+        }
+
+        response = self.client.post(reverse("register_merchant"), data)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Merchant.objects.get_by_registration_number("ph 123456").business_name, "Philippines Prefix Inc")
+        self.assertEqual(Merchant.objects.get_by_registration_number("SG123456").business_name, "Singapore Prefix Pte Ltd")
+        self.assertIsNone(Merchant.objects.get_by_registration_number("MY-123456"))
+        print("✓ Country-prefixed registration numbers kept apart")
+
+    def test_own_country_prefix_is_same_number(self):
+        """A number with and without the merchant's own country code is a duplicate."""
+        Merchant.objects.create(
+            business_name="Unprefixed Pte Ltd",
+            registration_number="123456",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@unprefixed.com",
+            phone="+65 1234 1111",
+            address="Singapore",
+        )
+        data = {
+            "business_name": "Prefixed Pte Ltd",
+            "registration_number": "SG-123456",
+            "country": "SG",
+            "business_category": "ECOMMERCE",
+            "email": "test@prefixed.com",
+            "phone": "+65 1234 2222",
+            "address": "Singapore",
+            "owners-TOTAL_FORMS": "0",
+            "owners-INITIAL_FORMS": "0",
+            "owners-MIN_NUM_FORMS": "0",
+            "owners-MAX_NUM_FORMS": "1000",
+        }
+
+        response = self.client.post(reverse("register_merchant"), data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "already exists")
+        self.assertEqual(Merchant.objects.count(), 1)
+        self.assertEqual(Merchant.objects.get_by_registration_number("sg 123456").business_name, "Unprefixed Pte Ltd")
+        print("✓ Own country prefix does not make a new number")
+
+    @override_settings(TASK_QUEUE_EAGER=False)
+    def test_registration_decided_by_worker(self):
+        """With workers, registration commits PENDING and a worker applies the decision."""
+        data = {
+            "business_name": "Queued Decision Ltd",
+            "registration_number": "SG54321",
+            "country": "SG",
+            "business_category": "ECOMMERCE",
+            "email": "test@queueddecision.com",
+            "phone": "+65 5432 1000",
+            "address": "Singapore",
+            "owners-TOTAL_FORMS": "0",
+            "owners-INITIAL_FORMS": "0",
+            "owners-MIN_NUM_FORMS": "0",
+            "owners-MAX_NUM_FORMS": "1000",
+        }
+
+        response = self.client.post(reverse("register_merchant"), data, follow=True)
+
+        merchant = Merchant.objects.get(registration_number="SG54321")
+        self.assertEqual(merchant.status, "PENDING")
+        self.assertEqual(merchant.screening_status, "NOT_SCREENED")
+        self.assertContains(response, "in progress")
+        self.assertEqual(Task.objects.get().key, f"merchant:{merchant.pk}")
+
+        self.assertEqual(run_pending("test-worker"), 1)
+
+        merchant.refresh_from_db()
+        self.assertEqual(merchant.status, "APPROVED")
+        self.assertEqual(merchant.screening_status, "CLEAR")
+        self.assertEqual(Task.objects.get().status, "DONE")
+        response = self.client.get(reverse("merchant_status", args=["SG54321"]))
+        self.assertNotContains(response, "in progress")
+        print("✓ Worker applies the registration decision")
+
+    def over_budget_registration(self, registration_number):
+        data = {
+            "business_name": "Over Budget Ltd",
+            "registration_number": registration_number,
+            "country": "SG",
+            "business_category": "ECOMMERCE",
+            "email": "test@overbudget.com",
+            "phone": "+65 7777 8888",
+            "address": "Singapore",
+            "owners-TOTAL_FORMS": "0",
+            "owners-INITIAL_FORMS": "0",
+            "owners-MIN_NUM_FORMS": "0",
+            "owners-MAX_NUM_FORMS": "1000",
+        }
+        with mock.patch("merchants.views.REGISTRATION_TIME_BUDGET_SECONDS", 0):
+            response = self.client.post(reverse("register_merchant"), data, follow=True)
+        return response, Merchant.objects.get(registration_number=registration_number)
+
+    def test_screening_over_budget_finishes_in_background(self):
+        """Registration out of time should commit UNDER_REVIEW and decide after background screening."""
+        response, merchant = self.over_budget_registration("SG77777")
+
+        self.assertEqual(merchant.status, "UNDER_REVIEW")
+        self.assertTrue(merchant.screening_in_progress)
+        self.assertEqual(merchant.screening_status, "NOT_SCREENED")
+        self.assertEqual(merchant.risk_level, "LOW")
+        self.assertContains(response, "Screening in progress")
+
+        self.assertEqual(run_pending("test-worker"), 1)
+
+        merchant.refresh_from_db()
+        self.assertEqual(merchant.status, "APPROVED")
+        self.assertEqual(merchant.screening_status, "CLEAR")
+        self.assertFalse(merchant.screening_in_progress)
+        print("✓ Over-budget screening finished in background before deciding")
+
+    def test_background_screening_keeps_officer_decision(self):
+        """An officer decision made while screening finishes should not be overridden."""
+        _, merchant = self.over_budget_registration("SG77778")
+        officer = User.objects.create_user(username="budget_officer", password="test123")
+        merchant.status = "REJECTED"
+        merchant.reviewed_by = officer
+        merchant.save()
+
+        run_pending("test-worker")
+
+        merchant.refresh_from_db()
+        self.assertEqual(merchant.status, "REJECTED")
+        self.assertEqual(merchant.screening_status, "CLEAR")
+        self.assertFalse(merchant.screening_in_progress)
+        print("✓ Background screening keeps the officer's decision")
+
     def test_dashboard_loads(self):
         """Dashboard should load with statistics."""
         response = self.client.get(reverse("dashboard"))
@@ -434,6 +1788,830 @@ class MerchantRegistrationViewTestCase(TestCase):
         print("✓ Dashboard loads successfully")
 
 
+def api_registration_data(n, owner_count=1, **overrides):
+    """JSON registration for the API, unique per n."""
+    data = {
+        "business_name": f"Batch Merchant {n} Ltd",
+        "registration_number": f"SG7700{n:02d}",
+        "country": "SG",
+        "business_category": "ECOMMERCE",
+        "email": f"ops{n}@batch{n}.com",
+        "phone": f"+65 7700 {n:04d}",
+        "address": "Singapore",
+        "owners": [
+            {
+                "full_name": f"Batch Owner {n}-{i}",
+                "nationality": "SG",
+                "ownership_percentage": str(Decimal(100) / owner_count),
+                "id_document_type": "PASSPORT",
+                "id_document_number": f"E77{n:02d}{i}",
+            }
+            for i in range(owner_count)
+        ],
+    }
+    data.update(overrides)
+    return data
+
+
+class RegistrationApiTestCase(TestCase):
+    """Tests for the JSON registration API."""
+
+    def setUp(self):
+        self.client = Client()
+        reload_rules()
+
+    def post(self, name, payload):
+        return self.client.post(reverse(name), json.dumps(payload), content_type="application/json")
+
+    def test_single_registration_created(self):
+        """A valid registration should be created and decided in the response."""
+        response = self.post("api_register_merchant", api_registration_data(1))
+
+        self.assertEqual(response.status_code, 201)
+        result = response.json()
+        merchant = Merchant.objects.get(pk=result["id"])
+        self.assertEqual(result["status"], "APPROVED")
+        self.assertEqual(merchant.status, "APPROVED")
+        self.assertEqual(merchant.screening_status, "CLEAR")
+        self.assertEqual(merchant.owner_count, 1)
+        self.assertEqual(merchant.risk_assessments.count(), 1)
+        print("✓ API registration created and decided")
+
+    def test_single_registration_errors(self):
+        """Invalid JSON, invalid fields and duplicates should be rejected with the form's errors."""
+        response = self.client.post(reverse("api_register_merchant"), "{", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+        response = self.post("api_register_merchant", api_registration_data(2, email="not-an-email"))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("email", response.json()["errors"])
+
+        response = self.post("api_register_merchant", api_registration_data(3, owners=[{"nationality": "SG"}]))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("full_name", response.json()["errors"]["owners"][0])
+
+        self.post("api_register_merchant", api_registration_data(4))
+        response = self.post("api_register_merchant", api_registration_data(4, registration_number="sg-770004"))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Merchant.objects.count(), 1)
+        print("✓ API registration errors reported per field")
+
+    def test_batch_reports_per_item_results(self):
+        """Invalid and duplicate items should be reported without blocking the rest of the batch."""
+        Merchant.objects.create(
+            business_name="Existing Ltd", registration_number="SG770009", country="SG",
+            business_category="ECOMMERCE", email="existing@example.com",
+        )
+        items = [
+            api_registration_data(1),
+            api_registration_data(2, business_category="UNKNOWN"),
+            api_registration_data(3),
+            api_registration_data(4, registration_number="SG 7700 03"),
+            api_registration_data(9),
+            api_registration_data(5, business_name="Shell Corp Ltd", owner_count=0),
+        ]
+
+        response = self.post("api_register_merchants_batch", {"merchants": items})
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["registered"], body["rejected"]), (3, 3))
+        results = body["results"]
+        self.assertEqual([result["index"] for result in results], list(range(6)))
+        self.assertIn("business_category", results[1]["errors"])
+        self.assertIn("registration_number", results[3]["errors"])
+        self.assertIn("registration_number", results[4]["errors"])
+        self.assertEqual(results[0]["status"], "APPROVED")
+        self.assertEqual(results[5]["status"], "REJECTED")
+
+        merchant = Merchant.objects.get(pk=results[2]["id"])
+        self.assertEqual((merchant.status, merchant.owner_count), ("APPROVED", 1))
+        self.assertEqual(Merchant.objects.get(pk=results[5]["id"]).screening_status, "MATCH")
+        print("✓ Batch registration reports per-item results")
+
+    def test_batch_links_members_to_each_other(self):
+        """Merchants in one batch sharing an owner should land in one link cluster."""
+        shared_owner = api_registration_data(1)["owners"]
+        items = [api_registration_data(1), api_registration_data(2, owners=shared_owner)]
+
+        results = self.post("api_register_merchants_batch", {"merchants": items}).json()["results"]
+
+        first, second = Merchant.objects.filter(pk__in=[result["id"] for result in results]).order_by("pk")
+        self.assertIsNotNone(first.link_cluster_id)
+        self.assertEqual(first.link_cluster_id, second.link_cluster_id)
+        print("✓ Batch members sharing an owner linked")
+
+    def test_batch_limit_enforced(self):
+        """Batches over REGISTRATION_BATCH_LIMIT or without a merchants list should be rejected."""
+        with mock.patch("merchants.api.REGISTRATION_BATCH_LIMIT", 2):
+            response = self.post("api_register_merchants_batch", {"merchants": [api_registration_data(n) for n in range(3)]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post("api_register_merchants_batch", [api_registration_data(1)]).status_code, 400)
+        self.assertFalse(Merchant.objects.exists())
+        print("✓ Batch limit enforced")
+
+    def test_batch_uses_fraction_of_form_post_queries(self):
+        """Registering ten merchants in one batch should take far fewer queries than ten form posts."""
+        items = [api_registration_data(n, owner_count=2) for n in range(10)]
+        with CaptureQueriesContext(connection) as batch_queries:
+            response = self.post("api_register_merchants_batch", {"merchants": items})
+        self.assertEqual(response.json()["registered"], 10)
+
+        form_posts = []
+        for n in range(10, 20):
+            data = api_registration_data(n, owner_count=2)
+            owners = data.pop("owners")
+            form_posts.append({**data, **owner_formset_data(owners)})
+        with CaptureQueriesContext(connection) as form_queries:
+            for data in form_posts:
+                self.client.post(reverse("register_merchant"), data)
+        self.assertEqual(Merchant.objects.filter(status="APPROVED").count(), 20)
+
+        self.assertLess(len(batch_queries) * 5, len(form_queries))
+        print(f"✓ Batch of 10 used {len(batch_queries)} queries against {len(form_queries)} for form posts")
+
+    @override_settings(TASK_QUEUE_EAGER=False)
+    def test_batch_decided_by_worker(self):
+        """With workers, a batch should commit PENDING and queue one task that decides it."""
+        items = [api_registration_data(n) for n in range(3)]
+
+        results = self.post("api_register_merchants_batch", {"merchants": items}).json()["results"]
+
+        self.assertEqual({result["status"] for result in results}, {"PENDING"})
+        self.assertEqual(Task.objects.get().name, "merchants.decide_registrations")
+        self.assertEqual(run_pending("test-worker"), 1)
+        self.assertEqual(
+            set(Merchant.objects.values_list("status", "screening_status")), {("APPROVED", "CLEAR")},
+        )
+        print("✓ Batch decided by one worker task")
+
+
+class IdempotencyKeyTestCase(TestCase):
+    """Tests for idempotent registration submissions."""
+
+    def setUp(self):
+        self.client = Client()
+        reload_rules()
+
+    def post(self, payload, key="key-1", **extra):
+        return self.client.post(
+            reverse("api_register_merchant"), json.dumps(payload), content_type="application/json",
+            headers={"Idempotency-Key": key}, **extra,
+        )
+
+    def fingerprint(self, payload):
+        return request_fingerprint(
+            RequestFactory().post(reverse("api_register_merchant"), json.dumps(payload), content_type="application/json")
+        )
+
+    def in_flight(self, payload, locked_until):
+        return IdempotencyKey.objects.create(
+            scope="api_register_merchant", client="ip:127.0.0.1", key="key-1",
+            request_fingerprint=self.fingerprint(payload),
+            locked_until=locked_until, expires_at=timezone.now() + timedelta(days=1),
+        )
+
+    def test_api_retry_replays_first_response(self):
+        """A retried API registration should replay the first response and register once."""
+        payload = api_registration_data(1)
+        first = self.post(payload)
+        retry = self.post(payload)
+
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Merchant.objects.count(), 1)
+        self.assertEqual(RiskAssessment.objects.count(), 1)
+
+        self.assertEqual(self.post(payload, key="key-2").status_code, 409)
+        print("✓ API retry replays the first response")
+
+    def test_key_reused_for_different_request_refused(self):
+        """Reusing a key for a different registration should be refused."""
+        self.post(api_registration_data(1))
+
+        response = self.post(api_registration_data(2))
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Merchant.objects.count(), 1)
+        print("✓ Key reuse with a different body refused")
+
+    def test_form_double_submit_registers_once(self):
+        """Submitting the registration form twice with one key should redirect both times to one merchant."""
+        data = {
+            "business_name": "Double Submit Ltd",
+            "registration_number": "SG424242",
+            "country": "SG",
+            "business_category": "ECOMMERCE",
+            "email": "ops@doublesubmit.com",
+            "phone": "+65 4242 4242",
+            "address": "Singapore",
+            "idempotency_key": "form-key",
+            "owners-TOTAL_FORMS": "0",
+            "owners-INITIAL_FORMS": "0",
+            "owners-MIN_NUM_FORMS": "0",
+            "owners-MAX_NUM_FORMS": "1000",
+        }
+        first = self.client.post(reverse("register_merchant"), data)
+        retry = self.client.post(reverse("register_merchant"), data)
+
+        self.assertEqual(retry.status_code, 302)
+        self.assertEqual(retry["Location"], first["Location"])
+        self.assertEqual(Merchant.objects.count(), 1)
+        self.assertContains(self.client.get(reverse("register_merchant")), 'name="idempotency_key"')
+        print("✓ Form double submit registers once")
+
+    def test_duplicate_waits_for_in_flight_request(self):
+        """A retry arriving mid-request should wait for the first response rather than register again."""
+        payload = api_registration_data(1)
+        record = self.in_flight(payload, timezone.now() + timedelta(minutes=1))
+
+        def first_request_finishes(seconds):
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status="COMPLETE", response_status=201, response_body=b'{"id": 99}',
+                response_headers={"Content-Type": "application/json"},
+            )
+
+        with mock.patch("merchants.idempotency.time.sleep", side_effect=first_request_finishes) as sleep:
+            response = self.post(payload)
+
+        sleep.assert_called_once()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"id": 99})
+        self.assertFalse(Merchant.objects.exists())
+        print("✓ Concurrent duplicate waits for the in-flight response")
+
+    def test_in_flight_request_busy_then_taken_over(self):
+        """A retry should get 409 while the holder's lease lasts, and take the key over once it expires."""
+        payload = api_registration_data(1)
+        record = self.in_flight(payload, timezone.now() + timedelta(minutes=1))
+
+        with mock.patch("merchants.idempotency.IDEMPOTENCY_WAIT_SECONDS", 0):
+            self.assertEqual(self.post(payload).status_code, 409)
+
+        IdempotencyKey.objects.filter(pk=record.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        response = self.post(payload)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get().status, "COMPLETE")
+        print("✓ Expired in-flight key taken over")
+
+    def test_keys_scoped_per_client(self):
+        """The same key from different clients should be independent submissions."""
+        first = self.post(api_registration_data(1))
+        other_client = self.post(api_registration_data(2), REMOTE_ADDR="10.0.0.2")
+
+        self.assertEqual((first.status_code, other_client.status_code), (201, 201))
+        self.assertNotIn("Idempotent-Replayed", other_client)
+        self.assertEqual(Merchant.objects.count(), 2)
+        self.assertEqual(
+            set(IdempotencyKey.objects.values_list("client", "key")),
+            {("ip:127.0.0.1", "key-1"), ("ip:10.0.0.2", "key-1")},
+        )
+        print("✓ Idempotency keys are scoped per client")
+
+    def test_running_request_renews_its_lease(self):
+        """A slow request should keep renewing its lease, and stop once a take-over changed it."""
+        payload = api_registration_data(1)
+        record = self.in_flight(payload, timezone.now() + timedelta(seconds=5))
+
+        self.assertTrue(_extend_lease(record))
+        self.assertGreater(IdempotencyKey.objects.get().locked_until, timezone.now() + timedelta(seconds=30))
+
+        IdempotencyKey.objects.update(locked_until=timezone.now() + timedelta(minutes=5))
+        self.assertFalse(_extend_lease(record))
+
+        renewals = []
+        with mock.patch("merchants.idempotency.IDEMPOTENCY_LOCK_SECONDS", 0.03), \
+                mock.patch("merchants.idempotency._extend_lease", side_effect=lambda held: renewals.append(held) or True):
+            with _LeaseRenewal(record):
+                time.sleep(0.1)
+        self.assertGreaterEqual(len(renewals), 2)
+        print(f"✓ Lease renewed {len(renewals)} times during a slow request")
+
+    def test_expired_keys_purged(self):
+        """Expired keys should not be replayed and should be deleted by the purge command."""
+        payload = api_registration_data(1)
+        self.post(payload)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.post(payload).status_code, 409)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        out = StringIO()
+        call_command("purge_idempotency_keys", stdout=out)
+        self.assertIn("Deleted 1 expired", out.getvalue())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        print("✓ Expired keys re-run and purged")
+
+    def test_server_error_releases_key(self):
+        """A request that fails should release its key so a retry runs afresh."""
+        payload = api_registration_data(1)
+        with mock.patch("merchants.api.register_merchants", side_effect=RuntimeError("database went away")):
+            with self.assertRaises(RuntimeError):
+                self.post(payload)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.assertEqual(self.post(payload).status_code, 201)
+        print("✓ Failed request releases its key")
+
+
+class ImportMerchantsTestCase(TestCase):
+    """Tests for the streaming merchant import."""
+
+    CSV_HEADER = (
+        "business_name,registration_number,country,business_category,email,phone,address,"
+        "owner1_full_name,owner1_nationality,owner1_ownership_percentage,owner1_id_document_type,"
+        "owner1_id_document_number,owner2_full_name,owner2_nationality,owner2_ownership_percentage,"
+        "owner2_id_document_type,owner2_id_document_number\n"
+    )
+
+    def setUp(self):
+        reload_rules()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+        return path
+
+    def test_csv_import_registers_and_rejects(self):
+        """CSV rows should be registered with their owners, and bad or duplicate rows written to the reject file."""
+        Merchant.objects.create(
+            business_name="Existing Ltd", registration_number="SG880003", country="SG",
+            business_category="ECOMMERCE", email="existing@example.com",
+        )
+        path = self.write("merchants.csv", self.CSV_HEADER + (
+            "Import One Ltd,SG880001,SG,ECOMMERCE,one@importone.com,+65 8800 0001,Singapore,"
+            "Ann Import,SG,60,PASSPORT,E880011,Ben Import,SG,40,PASSPORT,E880012\n"
+            "Import Two Ltd,SG880002,SG,NOT_A_CATEGORY,two@importtwo.com,+65 8800 0002,Singapore,,,,,,,,,,\n"
+            "Import Three Ltd,sg-880003,SG,ECOMMERCE,three@importthree.com,+65 8800 0003,Singapore,,,,,,,,,,\n"
+            "Shell Corp Ltd,SG880004,SG,ECOMMERCE,four@importfour.com,+65 8800 0004,Singapore,,,,,,,,,,\n"
+        ))
+        rejects = os.path.join(self.directory.name, "rejects.ndjson")
+        out = StringIO()
+
+        call_command("import_merchants", path, "--rejects", rejects, stdout=out)
+
+        self.assertIn("Imported 2 of 4 row(s)", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
+        merchant = Merchant.objects.get(registration_number="SG880001")
+        self.assertEqual((merchant.status, merchant.screening_status), ("APPROVED", "CLEAR"))
+        self.assertEqual(merchant.owner_count, 2)
+        self.assertEqual(merchant.risk_assessments.count(), 1)
+        self.assertEqual(merchant.get_current_screening_results().count(), 5)
+        self.assertEqual(Merchant.objects.get(registration_number="SG880004").status, "REJECTED")
+
+        with open(rejects, encoding="utf-8") as file:
+            rejected = [json.loads(line) for line in file]
+        self.assertEqual([row["line"] for row in rejected], [3, 4])
+        self.assertIn("business_category", rejected[0]["errors"])
+        self.assertIn("registration_number", rejected[1]["errors"])
+        self.assertEqual(rejected[1]["row"]["business_name"], "Import Three Ltd")
+        print("✓ CSV import registers valid rows and rejects the rest")
+
+    def test_ndjson_import_across_chunks(self):
+        """NDJSON should import in chunks, rejecting unparseable lines and numbers repeated in later chunks."""
+        lines = [json.dumps(api_registration_data(n)) for n in range(5)]
+        lines.insert(2, "{not json")
+        lines.append(json.dumps(api_registration_data(6, registration_number="SG 7700 01")))
+        path = self.write("merchants.ndjson", "\n".join(lines) + "\n")
+        reports = []
+
+        with open(path, encoding="utf-8") as stream:
+            report = import_merchants(
+                stream, "ndjson", chunk_size=2, rejects=StringIO(), progress=lambda r: reports.append(dict(r)),
+            )
+
+        self.assertEqual((report["rows"], report["imported"], report["rejected"]), (7, 5, 2))
+        self.assertEqual([r["rows"] for r in reports], [2, 4, 6, 7])
+        self.assertEqual(Merchant.objects.filter(status="APPROVED").count(), 5)
+        self.assertEqual(RiskAssessment.objects.count(), 5)
+        print("✓ NDJSON import chunked with bad lines and cross-chunk duplicates rejected")
+
+    def test_write_failure_stops_pipeline(self):
+        """A failing write should stop the reading stages and propagate."""
+        lines = "".join(json.dumps(api_registration_data(n)) + "\n" for n in range(20))
+
+        with mock.patch("merchants.importer.save_registrations", side_effect=RuntimeError("disk full")):
+            with self.assertRaises(RuntimeError):
+                import_merchants(StringIO(lines), "ndjson", chunk_size=1)
+
+        self.assertFalse([thread for thread in threading.enumerate() if thread.name.startswith("import-")])
+        self.assertFalse(Merchant.objects.exists())
+        print("✓ Write failure stops the import pipeline")
+
+
+class DashboardStatsTestCase(TestCase):
+    """Tests for dashboard statistics and their materialized counters."""
+
+    def setUp(self):
+        self.merchants = [
+            Merchant.objects.create(
+                business_name=f"Dashboard {n} Ltd", registration_number=f"SG6600{n}", country="SG",
+                business_category="ECOMMERCE", email=f"d{n}@dashboard.com", status=status, risk_level=risk_level,
+            )
+            for n, (status, risk_level) in enumerate([
+                ("PENDING", "LOW"), ("APPROVED", "LOW"), ("REJECTED", "HIGH"), ("UNDER_REVIEW", "MEDIUM"),
+            ])
+        ]
+
+    def assertCountersMatch(self):
+        self.assertEqual(
+            dict(DashboardCounter.objects.values_list("name", "count")), Merchant.objects.dashboard_stats(),
+        )
+
+    def test_dashboard_stats_in_one_query(self):
+        """The dashboard should compute every statistic in one aggregate query."""
+        with self.assertNumQueries(1):
+            stats = dashboard_stats()
+        self.assertEqual(stats, {
+            "total": 4, "pending": 1, "under_review": 1, "approved": 1, "rejected": 1,
+            "high_risk": 1, "medium_risk": 1, "low_risk": 2,
+        })
+
+        # Statistics, pending list and recent list
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.context["stats"], stats)
+        print("✓ Dashboard statistics from one aggregate query")
+
+    @override_settings(DASHBOARD_COUNTERS=True)
+    def test_counters_follow_merchant_writes(self):
+        """Counters should follow saves, queryset updates, bulk writes and deletes."""
+        out = StringIO()
+        call_command("reconcile_dashboard_counters", stdout=out)
+        self.assertIn("Corrected 8 dashboard counter(s)", out.getvalue())
+        self.assertCountersMatch()
+
+        merchant = self.merchants[0]
+        merchant.status = "APPROVED"
+        merchant.save()
+        self.assertCountersMatch()
+
+        Merchant.objects.filter(status="APPROVED").update(status="UNDER_REVIEW")
+        self.assertCountersMatch()
+
+        for merchant in self.merchants:
+            merchant.risk_level = "HIGH"
+        Merchant.objects.bulk_update(self.merchants, ["risk_level"])
+        self.assertCountersMatch()
+
+        Merchant.objects.bulk_create([
+            Merchant(business_name="Bulk Dashboard Ltd", registration_number="SG660099", country="SG",
+                     business_category="ECOMMERCE", email="bulk@dashboard.com"),
+        ])
+        self.assertCountersMatch()
+
+        self.merchants[2].delete()
+        Merchant.objects.filter(registration_number="SG660099").delete()
+        self.assertCountersMatch()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(dashboard_stats()["total"], 3)
+        print("✓ Dashboard counters follow merchant writes")
+
+    @override_settings(DASHBOARD_COUNTERS=True)
+    def test_registration_updates_counters(self):
+        """A registration and its decision should be counted once."""
+        reconcile_counters()
+        self.client.post(reverse("api_register_merchants_batch"), json.dumps({
+            "merchants": [api_registration_data(1), api_registration_data(2)],
+        }), content_type="application/json")
+        data = api_registration_data(3)
+        owners = data.pop("owners")
+        self.client.post(reverse("register_merchant"), {**data, **owner_formset_data(owners)})
+
+        self.assertEqual(Merchant.objects.count(), 7)
+        self.assertCountersMatch()
+        print("✓ Registrations keep dashboard counters exact")
+
+    @override_settings(DASHBOARD_COUNTERS=True)
+    def test_reconcile_corrects_drift(self):
+        """Reconciliation should report and correct drifted counters; uninitialized counters fall back to aggregation."""
+        self.assertEqual(dashboard_stats()["total"], 4)
+        reconcile_counters()
+        DashboardCounter.objects.filter(name="approved").update(count=40)
+
+        out = StringIO()
+        call_command("reconcile_dashboard_counters", "--dry-run", stdout=out)
+        self.assertIn("approved: 40 (actual 1)", out.getvalue())
+        self.assertEqual(DashboardCounter.objects.get(name="approved").count, 40)
+
+        self.assertEqual(reconcile_counters(), {"approved": (40, 1)})
+        self.assertCountersMatch()
+        self.assertEqual(reconcile_counters(), {})
+        print("✓ Reconciliation corrects dashboard counter drift")
+
+
+class DashboardEventsTestCase(TestCase):
+    """Tests for the dashboard's live update stream."""
+
+    def setUp(self):
+        self.subscription = broker.subscribe()
+        self.addCleanup(broker.unsubscribe, self.subscription)
+
+    def create_merchant(self, n, **fields):
+        return Merchant.objects.create(
+            business_name=f"Live {n} Ltd", registration_number=f"SG6700{n}", country="SG",
+            business_category="ECOMMERCE", email=f"l{n}@live.com", **fields,
+        )
+
+    def received(self):
+        messages = []
+        while (message := self.subscription.get(timeout=0)) is not None:
+            messages.append(message[:2])
+        return messages
+
+    def test_changes_published_on_commit(self):
+        """Counter changes and merchants entering review should be published once committed."""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            merchant = self.create_merchant(1, status="APPROVED", risk_level="LOW")
+            self.assertEqual(self.received(), [])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.received(), [
+            ("counters", {"total": 1, "approved": 1, "low_risk": 1}),
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Merchant.objects.filter(pk=merchant.pk).update(status="UNDER_REVIEW")
+        (counters, review), = [self.received()]
+        self.assertEqual(counters, ("counters", {"approved": -1, "under_review": 1}))
+        self.assertEqual(review[0], "review")
+        self.assertEqual(review[1]["id"], merchant.pk)
+        self.assertEqual(review[1]["business_name"], "Live 1 Ltd")
+        self.assertEqual(review[1]["country_display"], "Singapore")
+
+        # Saves that leave status and risk level alone publish nothing
+        with self.captureOnCommitCallbacks(execute=True):
+            merchant.refresh_from_db()
+            merchant.business_name = "Live One Ltd"
+            merchant.save()
+        self.assertEqual(self.received(), [])
+        self.assertFalse(DashboardCounter.objects.exists())
+        print("✓ Dashboard changes published on commit")
+
+    def test_stale_subscriber_marked(self):
+        """A subscriber whose buffer fills should be marked stale while others keep receiving."""
+        local = Broker()
+        slow, fast = local.subscribe(buffer=2), local.subscribe(buffer=10)
+        for n in range(3):
+            local.publish("counters", {"total": n})
+        self.assertTrue(slow.stale.is_set())
+        self.assertFalse(fast.stale.is_set())
+        self.assertEqual([fast.get(timeout=0)[1] for _ in range(3)], [{"total": 0}, {"total": 1}, {"total": 2}])
+
+        slow.drain()
+        self.assertFalse(slow.stale.is_set())
+        self.assertIsNone(slow.get(timeout=0))
+        local.unsubscribe(slow)
+        local.unsubscribe(fast)
+        self.assertFalse(local.has_subscribers())
+        print("✓ Stale dashboard subscribers marked for a snapshot")
+
+    def test_event_stream(self):
+        """The stream should open with a snapshot, then relay changes until its time is up."""
+        self.create_merchant(1, status="PENDING", risk_level="HIGH")
+        with mock.patch("merchants.events.EVENT_STREAM_MAX_SECONDS", 0.5):
+            response = self.client.get(reverse("dashboard_events"))
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+            self.assertEqual(response["Cache-Control"], "no-cache")
+            stream = iter(response.streaming_content)
+            self.assertTrue(next(stream).decode().startswith("retry:"))
+            snapshot = next(stream).decode()
+            self.assertIn("event: snapshot", snapshot)
+            self.assertIn('"pending": 1', snapshot)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.create_merchant(2, status="PENDING", risk_level="LOW")
+            rest = b"".join(stream).decode()
+        self.assertIn("event: counters", rest)
+        self.assertIn("event: review", rest)
+        self.assertIn("Live 2 Ltd", rest)
+        # Only this test's own subscription remains once the stream ends
+        self.assertEqual(len(broker._subscriptions), 1)
+        print("✓ Dashboard event stream relays changes")
+
+
+class ReviewQueueTestCase(TestCase):
+    """Tests for the prioritized review queue and its claims."""
+
+    def setUp(self):
+        self.officers = [
+            User.objects.create_user(username=f"officer{n}", password="testpass123", is_staff=True) for n in range(2)
+        ]
+
+    def create_merchant(self, n, screening_status="CLEAR", risk_score=10, status="PENDING"):
+        return Merchant.objects.create(
+            business_name=f"Queue {n} Ltd", registration_number=f"SG6800{n}", country="SG",
+            business_category="ECOMMERCE", email=f"q{n}@queue.com", status=status,
+            screening_status=screening_status, risk_score=risk_score,
+        )
+
+    def test_priority_order(self):
+        """Possible matches come first, then by risk score, then oldest first, from the queue index."""
+        low = self.create_merchant(1, risk_score=10)
+        running = self.create_merchant(2, screening_status="NOT_SCREENED", risk_score=90)
+        potential = self.create_merchant(3, screening_status="POTENTIAL_MATCH", risk_score=5)
+        high = self.create_merchant(4, risk_score=70)
+        low_later = self.create_merchant(5, risk_score=10)
+        self.create_merchant(6, risk_score=99, status="APPROVED")
+
+        self.assertEqual(list(review_queue()), [potential, high, low, low_later, running])
+
+        with connection.cursor() as cursor:
+            sql, params = review_queue().values("pk")[:1].query.sql_with_params()
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " ".join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn("merchant_review_queue", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+        print("✓ Review queue ordered by priority from its index")
+
+    def test_registration_records_risk_score(self):
+        """Deciding a registration should store its risk score for the queue."""
+        self.client.post(reverse("api_register_merchant"), json.dumps(api_registration_data(1)),
+                         content_type="application/json")
+        merchant = Merchant.objects.get()
+        self.assertEqual(merchant.risk_score, merchant.get_latest_risk_assessment().risk_score)
+
+        rerisk_merchant(merchant.pk)
+        merchant.refresh_from_db()
+        self.assertEqual(merchant.risk_score, merchant.get_latest_risk_assessment().risk_score)
+        print("✓ Risk score kept on the merchant")
+
+    def test_claims(self):
+        """Officers should claim different cases, keep their own, and get expired ones back."""
+        first, second = self.create_merchant(1, risk_score=50), self.create_merchant(2, risk_score=40)
+        alice, bob = self.officers
+
+        self.assertEqual(claim_next(alice), first)
+        self.assertEqual(claim_next(bob), second)
+        self.assertEqual(claim_next(alice), first)
+        self.assertIsNone(claim_next(User.objects.create_user(username="officer2", is_staff=True)))
+
+        # An expired lease returns the case to the queue
+        Merchant.objects.filter(pk=first.pk).update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(release_claim(second, bob))
+        self.assertFalse(release_claim(second, alice))
+        self.assertEqual(claim_next(bob), first)
+        self.assertEqual(claim_next(alice), second)
+
+        # A decided case leaves the queue
+        Merchant.objects.filter(pk=second.pk).update(status="APPROVED")
+        self.assertIsNone(claim_next(alice))
+        print("✓ Review cases claimed under a lease")
+
+    def test_compare_and_swap_claim_loses_race(self):
+        """Without SKIP LOCKED, a case claimed between read and update should be skipped."""
+        first, second = self.create_merchant(1, risk_score=50), self.create_merchant(2, risk_score=40)
+        alice, bob = self.officers
+        claimable = review_queue_module._claimable
+        lookups = []
+
+        def claimed_in_between(now):
+            if len(lookups) == 1:
+                Merchant.objects.filter(pk=first.pk).update(
+                    claimed_by=bob, claimed_until=now + timedelta(minutes=5),
+                )
+            lookups.append(now)
+            return claimable(now)
+
+        with mock.patch.object(connection.features, "has_select_for_update_skip_locked", False), \
+                mock.patch("merchants.review_queue._claimable", side_effect=claimed_in_between):
+            self.assertEqual(claim_next(alice), second)
+        self.assertEqual(Merchant.objects.get(pk=first.pk).claimed_by, bob)
+        print("✓ Compare-and-swap review claim skips cases taken by another officer")
+
+    def test_claim_view(self):
+        """Staff should be sent to the claimed case in the admin."""
+        merchant = self.create_merchant(1)
+        self.client.login(username="officer0", password="testpass123")
+        response = self.client.post(reverse("claim_review_case"))
+        self.assertRedirects(
+            response, reverse("admin:merchants_merchant_change", args=[merchant.pk]), fetch_redirect_response=False,
+        )
+        merchant.refresh_from_db()
+        self.assertEqual(merchant.claimed_by, self.officers[0])
+
+        response = self.client.post(reverse("claim_review_case"))
+        self.assertRedirects(
+            response, reverse("admin:merchants_merchant_change", args=[merchant.pk]), fetch_redirect_response=False,
+        )
+        self.client.logout()
+        response = self.client.post(reverse("claim_review_case"))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("login", response.url)
+        print("✓ Review next case view claims and opens the case")
+
+
+class KeysetPaginationTestCase(TestCase):
+    """Tests for cursor pagination of merchant listings."""
+
+    def setUp(self):
+        self.merchants = [
+            Merchant.objects.create(
+                business_name=f"Page {n} Ltd", registration_number=f"SG6900{n:02d}", country="SG",
+                business_category="ECOMMERCE", email=f"p{n}@page.com",
+                status="PENDING" if n % 2 else "APPROVED", screening_status="CLEAR", risk_score=n,
+            )
+            for n in range(12)
+        ]
+        # Ties on created_at are broken by id
+        Merchant.objects.filter(pk__in=[m.pk for m in self.merchants[4:8]]).update(
+            created_at=self.merchants[4].created_at,
+        )
+        self.newest_first = list(Merchant.objects.order_by("-created_at", "-id"))
+        self.staff = User.objects.create_user(username="pager", is_staff=True)
+
+    def test_pages_cover_listing_once(self):
+        """Walking the pages should return every row once, in order, one query per page."""
+        seen, cursor = [], None
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                page = keyset_page(Merchant.objects.all(), CREATED_ORDER, cursor, size=5)
+            self.assertEqual(len(queries), 1)
+            self.assertNotIn("OFFSET", queries[0]["sql"])
+            seen.extend(page.items)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, self.newest_first)
+
+        cursor = keyset_page(Merchant.objects.all(), CREATED_ORDER, size=5).next_cursor
+        after = pagination._after(CREATED_ORDER, pagination.decode_cursor(Merchant, CREATED_ORDER, cursor))
+        sql, params = Merchant.objects.filter(after).order_by(*CREATED_ORDER).values("pk")[:5].query.sql_with_params()
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " ".join(str(row[-1]) for row in db_cursor.fetchall())
+        self.assertIn("merchant_created_keyset", plan)
+        print("✓ Keyset pages cover the listing once")
+
+    def test_invalid_cursors(self):
+        """Malformed cursors and cursors for another ordering should be refused."""
+        cursor = keyset_page(Merchant.objects.all(), CREATED_ORDER, size=5).next_cursor
+        for bad in ("not a cursor", "e30", cursor[:-4]):
+            with self.assertRaises(InvalidCursor):
+                keyset_page(Merchant.objects.all(), CREATED_ORDER, bad)
+        with self.assertRaises(InvalidCursor):
+            keyset_page(Merchant.objects.all(), ("-updated_at", "-id"), cursor)
+        print("✓ Invalid cursors refused")
+
+    def test_listing_api(self):
+        """The listing API should page by cursor, filter by status and require staff."""
+        url = reverse("api_list_merchants")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.staff)
+
+        response = self.client.get(url, {"limit": 4})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([item["id"] for item in body["results"]], [m.pk for m in self.newest_first[:4]])
+        body = self.client.get(url, {"limit": 4, "cursor": body["next_cursor"]}).json()
+        self.assertEqual([item["id"] for item in body["results"]], [m.pk for m in self.newest_first[4:8]])
+
+        body = self.client.get(url, {"status": "PENDING", "sort": "updated", "limit": 100}).json()
+        self.assertEqual(len(body["results"]), 6)
+        self.assertIsNone(body["next_cursor"])
+
+        for params in ({"limit": 0}, {"limit": "x"}, {"cursor": "bad"}, {"sort": "name"}, {"status": "LOST"}):
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+        print("✓ Merchant listing API pages by cursor")
+
+    def test_review_queue_api(self):
+        """The review queue API should list cases in priority order with their claims."""
+        claim_next(self.staff)
+        self.client.force_login(self.staff)
+        body = self.client.get(reverse("api_review_queue"), {"limit": 4}).json()
+        expected = [m.pk for m in sorted(
+            (m for m in self.merchants if m.status == "PENDING"), key=lambda m: -m.risk_score,
+        )]
+        self.assertEqual([item["id"] for item in body["results"]], expected[:4])
+        self.assertEqual(body["results"][0]["claimed_by"], "pager")
+        body = self.client.get(reverse("api_review_queue"), {"limit": 4, "cursor": body["next_cursor"]}).json()
+        self.assertEqual([item["id"] for item in body["results"]], expected[4:])
+        self.assertIsNone(body["next_cursor"])
+        print("✓ Review queue API pages by cursor")
+
+    def test_dashboard_pages(self):
+        """The dashboard's lists should page by cursor, ignoring bad cursors."""
+        pending = [m for m in self.newest_first if m.status == "PENDING"]
+        recent = list(Merchant.objects.order_by("-updated_at", "-id"))
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.context["pending_merchants"], pending)
+        self.assertIsNone(response.context["pending_next"])
+        self.assertEqual(response.context["recent_merchants"], recent[:5])
+
+        response = self.client.get(reverse("dashboard"), {"recent": response.context["recent_next"]})
+        self.assertEqual(response.context["recent_merchants"], recent[5:10])
+        self.assertContains(response, "Newest")
+
+        response = self.client.get(reverse("dashboard"), {"recent": "bad"})
+        self.assertEqual(response.context["recent_merchants"], recent[:5])
+        print("✓ Dashboard lists page by cursor")
+
+
 class ComplianceOfficerWorkflowTestCase(TestCase):
     """Tests for compliance officer admin workflows."""
 
@@ -464,6 +2642,42 @@ class ComplianceOfficerWorkflowTestCase(TestCase):
         self.assertContains(response, "Admin Test Corp")
         print("✓ Admin can view merchant list")
 
+    def test_admin_edit_to_taken_registration_number_rejected(self):
+        """Editing a merchant onto another's registration number should show a form error, not fail."""
+        Merchant.objects.create(
+            business_name="Taken Number Pte Ltd", registration_number="SG-777001", country="SG",
+            business_category="ECOMMERCE", email="test@taken.com", phone="+65 7770 0001", address="Singapore",
+        )
+        merchant = Merchant.objects.create(
+            business_name="Editing Pte Ltd", registration_number="SG-777002", country="SG",
+            business_category="ECOMMERCE", email="test@editing.com", phone="+65 7770 0002", address="Singapore",
+        )
+        url = reverse("admin:merchants_merchant_change", args=[merchant.pk])
+        data = {
+            "business_name": merchant.business_name, "registration_number": "777001", "country": "SG",
+            "business_category": "ECOMMERCE", "email": merchant.email, "phone": merchant.phone,
+            "address": merchant.address, "risk_level": merchant.risk_level, "status": merchant.status,
+            "review_notes": "",
+        }
+        for inline in self.client.get(url).context["inline_admin_formsets"]:
+            prefix = inline.formset.prefix
+            data.update({
+                f"{prefix}-TOTAL_FORMS": "0", f"{prefix}-INITIAL_FORMS": "0",
+                f"{prefix}-MIN_NUM_FORMS": "0", f"{prefix}-MAX_NUM_FORMS": "1000",
+            })
+
+        response = self.client.post(url, data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "already exists")
+        merchant.refresh_from_db()
+        self.assertEqual(merchant.registration_number, "SG-777002")
+
+        data["registration_number"] = "sg 777002"
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        print("✓ Admin edit onto a taken registration number rejected")
+
     def test_admin_can_approve_merchant(self):
         """Admin should be able to approve a merchant."""
         merchant = Merchant.objects.create(
@@ -548,6 +2762,85 @@ class ComplianceOfficerWorkflowTestCase(TestCase):
         print(f"✓ Audit trail: reviewed_by={merchant.reviewed_by}, date={merchant.review_date}")
 
 
+class BulkDecisionTestCase(TestCase):
+    """Tests for set-based bulk approval and rejection."""
+
+    def setUp(self):
+        self.officer = User.objects.create_superuser(username="bulkofficer", email="bulk@test.com", password="x")
+        statuses = ["PENDING", "UNDER_REVIEW", "APPROVED", "REJECTED"]
+        Merchant.objects.bulk_create([
+            Merchant(
+                business_name=f"Bulk {n} Ltd", registration_number=f"SG7000{n:03d}", country="SG",
+                business_category="ECOMMERCE", email=f"b{n}@bulk.com", status=statuses[n % 4], risk_level="LOW",
+            )
+            for n in range(120)
+        ])
+
+    @override_settings(DASHBOARD_COUNTERS=True)
+    def test_decide_cases_in_chunks(self):
+        """Cases awaiting review should be decided a chunk at a time with one UPDATE and one INSERT each."""
+        reconcile_counters()
+        awaiting = list(Merchant.objects.filter(status__in=["PENDING", "UNDER_REVIEW"]).order_by("pk"))
+        claim_next(self.officer)
+        already_rejected = Merchant.objects.filter(status="REJECTED").first()
+        Merchant.objects.filter(pk=already_rejected.pk).update(
+            claimed_by=self.officer, claimed_until=timezone.now() + timedelta(minutes=5),
+        )
+
+        with CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks(execute=True):
+            decided = decide_cases(Merchant.objects.all(), "APPROVED", self.officer, notes="Batch sign-off", chunk_size=25)
+        self.assertEqual(decided, [merchant.pk for merchant in awaiting])
+        statements = [query["sql"].split()[0] for query in queries]
+        # Merchants and dashboard counters per chunk, then claims on already decided merchants
+        self.assertEqual(statements.count("UPDATE"), 3 + 3 + 1)
+        self.assertEqual(statements.count("INSERT"), 3)
+
+        self.assertFalse(Merchant.objects.filter(status__in=["PENDING", "UNDER_REVIEW"]).exists())
+        self.assertFalse(Merchant.objects.filter(claimed_by__isnull=False).exists())
+        self.assertEqual(Merchant.objects.filter(reviewed_by=self.officer).count(), 60)
+        already_rejected.refresh_from_db()
+        self.assertEqual(already_rejected.status, "REJECTED")
+        self.assertIsNone(already_rejected.claimed_by)
+
+        decisions = ReviewDecision.objects.filter(decided_by=self.officer)
+        self.assertEqual(decisions.count(), 60)
+        self.assertEqual(
+            dict(decisions.values_list("merchant_id", "previous_status")),
+            {merchant.pk: merchant.status for merchant in awaiting},
+        )
+        self.assertEqual(set(decisions.values_list("notes", flat=True)), {"Batch sign-off"})
+        self.assertEqual(
+            dict(DashboardCounter.objects.values_list("name", "count")), Merchant.objects.dashboard_stats(),
+        )
+
+        # Nothing left to decide
+        self.assertEqual(decide_cases(Merchant.objects.all(), "REJECTED", self.officer), [])
+        with self.assertRaises(ValueError):
+            decide_cases(Merchant.objects.all(), "PENDING", self.officer)
+        print("✓ Bulk decisions made set-based in chunks")
+
+    def test_admin_actions(self):
+        """The admin actions should decide the selection as a set, skipping decided merchants."""
+        self.client.force_login(self.officer)
+        selected = list(Merchant.objects.order_by("pk").values_list("pk", flat=True)[:8])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("admin:merchants_merchant_changelist"),
+                {"action": "reject_merchants", "_selected_action": selected}, follow=True,
+            )
+        self.assertContains(response, "4 merchant(s) rejected.")
+        merchant_updates = [
+            query for query in queries if query["sql"].startswith('UPDATE "merchants_merchant"')
+        ]
+        self.assertEqual(len(merchant_updates), 2)  # The decisions, then claims on the skipped merchants
+        self.assertEqual(ReviewDecision.objects.filter(status="REJECTED").count(), 4)
+        # Two of the eight were already rejected and two approved
+        self.assertEqual(Merchant.objects.filter(pk__in=selected, status="REJECTED").count(), 6)
+        self.assertEqual(Merchant.objects.filter(pk__in=selected, status="APPROVED").count(), 2)
+        print("✓ Admin bulk actions decide merchants set-based")
+
+
 class IntegrationTestCase(TestCase):
     """End-to-end integration tests."""
 
@@ -0,0 +1,298 @@
+"""
+Ultimate beneficial owner (UBO) resolution through corporate ownership chains.
+
+A merchant's corporate shareholders are expanded through EntityOwnership
+edges down to natural persons, multiplying percentages along each path and
+summing them per person. Cycles are cut where they close. A corporate
+shareholder with no shareholders of its own recorded is kept as an owner in
+its own right, so it is still scored and screened. Resolved owner sets are
+cached per entity and dropped when an edge that feeds them changes.
+"""
+import logging
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+
+from .models import BeneficialOwner, EntityOwnership
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on how long another process's edge change can go unnoticed
+UBO_CACHE_SECONDS = getattr(settings, 'UBO_CACHE_SECONDS', 300)
+
+HUNDRED = Decimal(100)
+PERCENT = Decimal('0.01')
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class UltimateOwner:
+    """
+    An ultimate owner's effective holding, with the same fields scoring and screening read.
+
+    Usually a natural person. corporate_entity_id is set for a company whose
+    own shareholders aren't recorded.
+    """
+
+    def __init__(self, full_name, nationality, id_document_type, id_document_number, is_pep, share, via=(),
+                 corporate_entity_id=None):
+        self.full_name = full_name
+        self.nationality = nationality
+        self.id_document_type = id_document_type
+        self.id_document_number = id_document_number
+        self.is_pep = is_pep
+        self.share = share
+        self.via = via
+        self.corporate_entity_id = corporate_entity_id
+
+    @property
+    def ownership_percentage(self):
+        return (self.share * HUNDRED).quantize(PERCENT)
+
+    def __repr__(self):
+        path = ' > '.join(self.via)
+        return f"<UltimateOwner {self.full_name} {self.ownership_percentage}%{' via ' + path if path else ''}>"
+
+
+def _person_key(person):
+    """Identify a natural person across holdings by document, else by name."""
+    entity_id = getattr(person, 'corporate_entity_id', None)
+    if entity_id is not None:
+        return ('ENTITY', entity_id)
+    number = (person.id_document_number or '').strip().upper()
+    if number:
+        return ('DOC', person.id_document_type, number)
+    return ('NAME', ' '.join(person.full_name.lower().split()))
+
+
+def _add_holding(owners, person, share, via):
+    key = _person_key(person)
+    if key in owners:
+        owners[key].share += share
+    else:
+        owners[key] = UltimateOwner(
+            person.full_name, person.nationality, person.id_document_type,
+            person.id_document_number, person.is_pep, share, via, getattr(person, 'corporate_entity_id', None),
+        )
+
+
+def _entity_owner(entity):
+    """An unresolved corporate shareholder, held in its own right."""
+    return UltimateOwner(entity.name, entity.country, '', '', False, Decimal(1), corporate_entity_id=entity.pk)
+
+
+def _cached(entity_id, now):
+    entry = _cache.get(entity_id)
+    if entry is not None and now - entry[1] < UBO_CACHE_SECONDS:
+        return entry[0]
+    return None
+
+
+def _load_graph(entity_ids, now):
+    """
+    Load shareholder edges for every entity reachable from entity_ids.
+
+    Entities with a fresh cache entry are not expanded. Runs one query per
+    level of the ownership chain.
+
+    Returns:
+        tuple: (edges by entity id, owner entities by id, cached resolutions by id)
+    """
+    graph, entities, cached = {}, {}, {}
+    frontier = set(entity_ids)
+    while frontier:
+        to_load = []
+        for entity_id in frontier:
+            owners = _cached(entity_id, now)
+            if owners is None:
+                to_load.append(entity_id)
+            else:
+                cached[entity_id] = owners
+        next_frontier = set()
+        edges = EntityOwnership.objects.filter(entity_id__in=to_load).select_related('owner_entity').order_by('pk')
+        for entity_id in to_load:
+            graph[entity_id] = []
+        for edge in edges:
+            graph[edge.entity_id].append(edge)
+            if edge.owner_entity_id is not None:
+                entities[edge.owner_entity_id] = edge.owner_entity
+                if edge.owner_entity_id not in graph and edge.owner_entity_id not in cached:
+                    next_frontier.add(edge.owner_entity_id)
+        frontier = next_frontier
+    return graph, entities, cached
+
+
+def _resolve(entity_id, graph, entities, memo, depth_on_stack, depth):
+    """
+    Resolve one entity's ultimate owners by depth-first traversal.
+
+    Returns the owners and the shallowest stack depth reached by a cut
+    back-edge. A result is only memoized when no cycle reaches above the
+    entity, since otherwise it depends on where the traversal entered.
+    """
+    if entity_id in memo:
+        return memo[entity_id], depth + 1
+    if entity_id in depth_on_stack:
+        return {}, depth_on_stack[entity_id]
+
+    depth_on_stack[entity_id] = depth
+    owners = {}
+    low = depth + 1
+    for edge in graph.get(entity_id, ()):
+        share = edge.ownership_percentage / HUNDRED
+        if edge.owner_entity_id is None:
+            _add_holding(owners, edge, share, ())
+            continue
+        back_edge = edge.owner_entity_id in depth_on_stack
+        sub_owners, sub_low = _resolve(edge.owner_entity_id, graph, entities, memo, depth_on_stack, depth + 1)
+        low = min(low, sub_low)
+        if not sub_owners and not back_edge:
+            _add_holding(owners, _entity_owner(entities[edge.owner_entity_id]), share, ())
+            continue
+        via_name = entities[edge.owner_entity_id].name
+        for owner in sub_owners.values():
+            _add_holding(owners, owner, owner.share * share, (via_name,) + owner.via)
+    del depth_on_stack[entity_id]
+
+    if low >= depth:
+        memo[entity_id] = owners
+    return owners, low
+
+
+def _copy(owners):
+    # Cached resolutions are shared, so callers get their own objects
+    return [
+        UltimateOwner(
+            owner.full_name, owner.nationality, owner.id_document_type,
+            owner.id_document_number, owner.is_pep, owner.share, owner.via, owner.corporate_entity_id,
+        )
+        for owner in owners.values()
+    ]
+
+
+def _resolve_entities(entity_ids):
+    """Resolve several entities at once, sharing one graph load and memo."""
+    now = time.monotonic()
+    graph, entities, memo = _load_graph(entity_ids, now)
+    cached_before = set(memo)
+    resolved = {}
+    for entity_id in entity_ids:
+        resolved[entity_id], _ = _resolve(entity_id, graph, entities, memo, {}, 0)
+
+    with _cache_lock:
+        for entity_id, owners in memo.items():
+            if entity_id not in cached_before:
+                _cache[entity_id] = (owners, now)
+    return resolved
+
+
+def resolve_entity_owners(entity_id):
+    """
+    Resolve the natural persons who ultimately own a corporate entity.
+
+    Returns:
+        list: UltimateOwner per person or unresolved company, with effective
+            ownership of the entity
+    """
+    return _copy(_resolve_entities([entity_id])[entity_id])
+
+
+def resolve_beneficial_owners(merchant, owners=None):
+    """
+    Resolve a merchant's ultimate beneficial owners.
+
+    Direct natural-person owners are returned unchanged when the merchant
+    has no corporate shareholders. Otherwise corporate holdings are expanded
+    and every person's direct and indirect shares are combined. A corporate
+    shareholder whose shareholders aren't recorded is returned as it is.
+
+    Args:
+        merchant: Merchant whose owners to resolve
+        owners: Already-loaded BeneficialOwner rows of the merchant
+
+    Returns:
+        list: BeneficialOwner or UltimateOwner objects for natural persons
+            and unresolved companies
+    """
+    if owners is None:
+        owners = list(merchant.owners.all())
+    corporate = [owner for owner in owners if owner.corporate_entity_id is not None]
+    if not corporate:
+        return list(owners)
+
+    resolved_entities = _resolve_entities(list({owner.corporate_entity_id for owner in corporate}))
+    combined = {}
+    for owner in owners:
+        share = owner.ownership_percentage / HUNDRED
+        if owner.corporate_entity_id is None:
+            _add_holding(combined, owner, share, ())
+            continue
+        people = resolved_entities[owner.corporate_entity_id]
+        if not people:
+            _add_holding(combined, owner, share, ())
+            continue
+        for person in people.values():
+            _add_holding(combined, person, person.share * share, (owner.full_name,) + person.via)
+    return _copy(combined)
+
+
+def resolve_owner_features(merchant_ids, minority_threshold):
+    """
+    Count minority and PEP ultimate owners for merchants with corporate shareholders.
+
+    Returns:
+        dict: merchant pk -> (minority owner count, PEP owner count)
+    """
+    if not merchant_ids:
+        return {}
+    by_merchant = {merchant_id: [] for merchant_id in merchant_ids}
+    for owner in BeneficialOwner.objects.filter(merchant_id__in=by_merchant):
+        by_merchant[owner.merchant_id].append(owner)
+
+    features = {}
+    for merchant_id, owners in by_merchant.items():
+        people = resolve_beneficial_owners(None, owners)
+        features[merchant_id] = (
+            sum(1 for person in people if person.ownership_percentage < minority_threshold),
+            sum(1 for person in people if person.is_pep),
+        )
+    return features
+
+
+def is_corporate(owner):
+    """Whether a resolved owner is a company rather than a natural person."""
+    return getattr(owner, 'corporate_entity_id', None) is not None
+
+
+def corporate_chain_names(owners):
+    """Names of every company among or on the ownership paths of resolved owners."""
+    names = {name for owner in owners for name in getattr(owner, 'via', ())}
+    names.update(owner.full_name for owner in owners if is_corporate(owner))
+    return sorted(names)
+
+
+def dependent_entity_ids(entity_id):
+    """The entity plus every entity it owns, directly or through others."""
+    seen = {entity_id}
+    frontier = {entity_id}
+    while frontier:
+        frontier = set(
+            EntityOwnership.objects.filter(owner_entity_id__in=frontier).values_list('entity_id', flat=True)
+        ) - seen
+        seen |= frontier
+    return seen
+
+
+def invalidate_entities(entity_ids):
+    """Drop cached resolutions that may depend on changed edges."""
+    with _cache_lock:
+        for entity_id in entity_ids:
+            _cache.pop(entity_id, None)
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
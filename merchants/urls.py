@@ -2,7 +2,7 @@
 URL patterns for merchants app.
 """
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.home, name='home'),
@@ -10,4 +10,10 @@ urlpatterns = [
     path('status/', views.check_status, name='check_status'),
     path('status/<str:registration_number>/', views.merchant_status, name='merchant_status'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/events/', views.dashboard_events, name='dashboard_events'),
+    path('review/next/', views.claim_review_case, name='claim_review_case'),
+    path('api/merchants/', api.register_merchant, name='api_register_merchant'),
+    path('api/merchants/batch/', api.register_merchants_batch, name='api_register_merchants_batch'),
+    path('api/merchants/list/', api.list_merchants, name='api_list_merchants'),
+    path('api/review-queue/', api.list_review_queue, name='api_review_queue'),
 ]
@@ -2,19 +2,30 @@
 Views for merchant KYB onboarding.
 """
 import logging
-from django.shortcuts import render, redirect, get_object_or_404
+import time
+import uuid
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.db import transaction
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.http import require_POST
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 
-from .models import Merchant, RiskAssessment
+from .models import REVIEW_STATUSES, BeneficialOwner, Merchant, normalize_registration_number
 from .forms import (
     MerchantRegistrationForm,
     BeneficialOwnerFormSet,
     MerchantStatusCheckForm,
 )
-from .risk_engine import calculate_risk_score, can_auto_approve
-from screening.services import screen_merchant
+from .dashboard import dashboard_stats
+from .events import event_stream
+from .idempotency import idempotent
+from .pagination import CREATED_ORDER, UPDATED_ORDER, InvalidCursor, keyset_page
+from .rerisk import suppress_rerisk
+from .review_queue import claim_next
+from .tasks import DECIDE_REGISTRATION, REGISTRATION_TIME_BUDGET_SECONDS, decide_merchant, merchant_task_key
+from taskqueue.queue import enqueue, is_eager, latest_task
 
 logger = logging.getLogger(__name__)
 
@@ -24,59 +35,48 @@ def home(request):
     return render(request, 'merchants/home.html')
 
 
+@idempotent('register_merchant')
 def register_merchant(request):
     """Handle merchant registration."""
     if request.method == 'POST':
+        started = time.monotonic()
         form = MerchantRegistrationForm(request.POST)
         owner_formset = BeneficialOwnerFormSet(request.POST, prefix='owners')
 
         if form.is_valid() and owner_formset.is_valid():
-            with transaction.atomic():
-                # Save merchant
-                merchant = form.save(commit=False)
-                merchant.status = 'PENDING'
-                merchant.save()
-
-                # Save beneficial owners
-                owner_formset.instance = merchant
-                owner_formset.save()
-
-                # Calculate risk score
-                score, factors, risk_level = calculate_risk_score(merchant)
-
-                # Create risk assessment
-                RiskAssessment.objects.create(
-                    merchant=merchant,
-                    risk_score=score,
-                    risk_factors=factors,
-                    assessed_by='SYSTEM',
-                )
-
-                # Update merchant risk level
-                merchant.risk_level = risk_level
-                merchant.save()
-
-                # Run sanctions screening
-                screening_status = screen_merchant(merchant)
-
-                # Determine status based on screening and risk
-                if screening_status == 'MATCH':
-                    merchant.status = 'REJECTED'
-                    merchant.review_notes = 'Auto-rejected due to sanctions match.'
-                    logger.warning(f"Merchant {merchant.business_name} auto-rejected: sanctions match")
-                elif screening_status == 'POTENTIAL_MATCH':
-                    merchant.status = 'UNDER_REVIEW'
-                    logger.info(f"Merchant {merchant.business_name} queued for review: potential sanctions match")
-                elif can_auto_approve(merchant, screening_status):
-                    merchant.status = 'APPROVED'
-                    merchant.review_notes = 'Auto-approved: Low risk, clear screening.'
-                    logger.info(f"Merchant {merchant.business_name} auto-approved: low risk")
-                else:
+            try:
+                # Registration scores and screens the merchant itself
+                with transaction.atomic(), suppress_rerisk():
+                    # Save the merchant with its owner counters already counted,
+                    # then its owners in one insert
+                    merchant = form.save(commit=False)
                     merchant.status = 'PENDING'
-                    logger.info(f"Merchant {merchant.business_name} pending review: {risk_level} risk")
-
-                merchant.save()
-
+                    owner_formset.instance = merchant
+                    owners = owner_formset.save(commit=False)
+                    for owner in owners:
+                        for field, value in owner.counter_contribution().items():
+                            setattr(merchant, field, getattr(merchant, field) + value)
+                    merchant.save()
+                    for owner in owners:
+                        owner.merchant = merchant
+                    BeneficialOwner.objects.bulk_create(owners, refresh_counters=False)
+
+                    if is_eager():
+                        # Decide on the instances just saved, within the request's time budget
+                        decide_merchant(merchant, owners, deadline=started + REGISTRATION_TIME_BUDGET_SECONDS)
+                    else:
+                        # A worker links, scores, screens and decides once the merchant commits
+                        enqueue(DECIDE_REGISTRATION, key=merchant_task_key(merchant.pk), merchant_id=merchant.pk)
+            except IntegrityError:
+                # The unique canonical registration number is the duplicate check
+                normalized = normalize_registration_number(
+                    form.instance.registration_number, form.instance.country,
+                )
+                if not Merchant.objects.filter(registration_number_normalized=normalized).exists():
+                    raise
+                form.add_error('registration_number', form.DUPLICATE_REGISTRATION_NUMBER)
+                messages.error(request, 'Please correct the errors below.')
+            else:
                 messages.success(
                     request,
                     f'Registration submitted successfully. Your reference number is: {merchant.registration_number}'
@@ -91,6 +91,8 @@ def register_merchant(request):
     return render(request, 'merchants/register.html', {
         'form': form,
         'owner_formset': owner_formset,
+        # A fresh key per rendering, so a corrected resubmission isn't a replay
+        'idempotency_key': uuid.uuid4().hex,
     })
 
 
@@ -102,9 +104,8 @@ def check_status(request):
         form = MerchantStatusCheckForm(request.POST)
         if form.is_valid():
             registration_number = form.cleaned_data['registration_number']
-            try:
-                merchant = Merchant.objects.get(registration_number=registration_number)
-            except Merchant.DoesNotExist:
+            merchant = Merchant.objects.get_by_registration_number(registration_number)
+            if merchant is None:
                 messages.error(request, 'No merchant found with that registration number.')
     else:
         form = MerchantStatusCheckForm()
@@ -117,42 +118,65 @@ def check_status(request):
 
 def merchant_status(request, registration_number):
     """Display merchant status page."""
-    merchant = get_object_or_404(Merchant, registration_number=registration_number)
+    merchant = Merchant.objects.get_by_registration_number(registration_number)
+    if merchant is None:
+        raise Http404('No merchant found with that registration number.')
     risk_assessment = merchant.get_latest_risk_assessment()
-    screening_results = merchant.screening_results.all()
+    screening_results = merchant.get_current_screening_results()
 
     return render(request, 'merchants/status.html', {
         'merchant': merchant,
         'risk_assessment': risk_assessment,
         'screening_results': screening_results,
+        'processing_task': latest_task(merchant_task_key(merchant.pk)),
     })
 
 
+def _dashboard_page(request, param, queryset, ordering, size):
+    try:
+        return keyset_page(queryset, ordering, request.GET.get(param), size=size)
+    except InvalidCursor:
+        return keyset_page(queryset, ordering, size=size)
+
+
 def dashboard(request):
     """Compliance dashboard with statistics."""
     merchants = Merchant.objects.all()
+    stats = dashboard_stats()
 
-    stats = {
-        'total': merchants.count(),
-        'pending': merchants.filter(status='PENDING').count(),
-        'under_review': merchants.filter(status='UNDER_REVIEW').count(),
-        'approved': merchants.filter(status='APPROVED').count(),
-        'rejected': merchants.filter(status='REJECTED').count(),
-        'high_risk': merchants.filter(risk_level='HIGH').count(),
-        'medium_risk': merchants.filter(risk_level='MEDIUM').count(),
-        'low_risk': merchants.filter(risk_level='LOW').count(),
-    }
-
-    # Recent pending merchants
-    pending_merchants = merchants.filter(
-        status__in=['PENDING', 'UNDER_REVIEW']
-    ).order_by('-created_at')[:10]
+    # Pending merchants, newest first, paged by cursor
+    pending_page = _dashboard_page(
+        request, 'pending', merchants.filter(status__in=REVIEW_STATUSES), CREATED_ORDER, size=10,
+    )
 
     # Recent activity
-    recent_merchants = merchants.order_by('-updated_at')[:5]
+    recent_page = _dashboard_page(request, 'recent', merchants, UPDATED_ORDER, size=5)
 
     return render(request, 'merchants/dashboard.html', {
         'stats': stats,
-        'pending_merchants': pending_merchants,
-        'recent_merchants': recent_merchants,
+        'pending_merchants': pending_page.items,
+        'pending_next': pending_page.next_cursor,
+        'pending_paged': bool(request.GET.get('pending')),
+        'recent_merchants': recent_page.items,
+        'recent_next': recent_page.next_cursor,
+        'recent_paged': bool(request.GET.get('recent')),
     })
+
+
+def dashboard_events(request):
+    """Server-sent events stream of dashboard counter changes and merchants entering review."""
+    response = StreamingHttpResponse(event_stream(dashboard_stats), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@staff_member_required
+@require_POST
+def claim_review_case(request):
+    """Claim the next case in the review queue and open it in the admin."""
+    merchant = claim_next(request.user)
+    if merchant is None:
+        messages.info(request, 'Every merchant awaiting review is already claimed.')
+        return redirect('dashboard')
+    return redirect('admin:merchants_merchant_change', merchant.pk)
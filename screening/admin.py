@@ -4,7 +4,7 @@ Admin configuration for screening app.
 from django.contrib import admin
 from django.utils.html import format_html
 
-from .models import ScreeningResult, SanctionsList
+from .models import ScreeningResult, ScreeningRun, SanctionsList
 
 
 @admin.register(ScreeningResult)
@@ -41,6 +41,16 @@ class ScreeningResultAdmin(admin.ModelAdmin):
     status_display.admin_order_field = 'status'
 
 
+@admin.register(ScreeningRun)
+class ScreeningRunAdmin(admin.ModelAdmin):
+    """Admin for screening run history."""
+
+    list_display = ('merchant', 'overall_status', 'list_version', 'started_at', 'archived_at')
+    list_filter = ('overall_status', 'archived_at')
+    search_fields = ('merchant__business_name', 'merchant__registration_number')
+    readonly_fields = ('merchant', 'overall_status', 'fingerprint', 'list_version', 'started_at', 'archived_at')
+
+
 @admin.register(SanctionsList)
 class SanctionsListAdmin(admin.ModelAdmin):
     """Admin for sanctions lists reference."""
@@ -0,0 +1,17 @@
+"""
+Archive superseded screening runs in batches.
+"""
+from django.core.management.base import BaseCommand
+
+from screening.services import archive_screening_runs
+
+
+class Command(BaseCommand):
+    help = 'Archive screening runs that are no longer the current run of any merchant.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Runs archived per batch')
+
+    def handle(self, *args, **options):
+        archived = archive_screening_runs(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{archived} screening run(s) archived.'))
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchants', '0002_merchant_screening_fingerprint'),
+        ('screening', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScreeningRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('overall_status', models.CharField(choices=[('CLEAR', 'Clear'), ('MATCH', 'Match Found'), ('POTENTIAL_MATCH', 'Potential Match')], max_length=20)),
+                ('fingerprint', models.CharField(blank=True, max_length=64)),
+                ('list_version', models.CharField(blank=True, max_length=16)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('archived_at', models.DateTimeField(blank=True, null=True)),
+                ('merchant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='screening_runs', to='merchants.merchant')),
+            ],
+            options={
+                'verbose_name': 'Screening Run',
+                'verbose_name_plural': 'Screening Runs',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='screeningresult',
+            name='run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='results', to='screening.screeningrun'),
+        ),
+        migrations.AddIndex(
+            model_name='screeningresult',
+            index=models.Index(fields=['run', 'status'], name='screening_s_run_id_37830b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='screeningrun',
+            index=models.Index(fields=['archived_at', 'id'], name='screening_s_archive_e25677_idx'),
+        ),
+    ]
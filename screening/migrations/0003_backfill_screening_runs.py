@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+def backfill_screening_runs(apps, schema_editor):
+    """Group each merchant's existing results into a single current run."""
+    Merchant = apps.get_model('merchants', 'Merchant')
+    ScreeningRun = apps.get_model('screening', 'ScreeningRun')
+    ScreeningResult = apps.get_model('screening', 'ScreeningResult')
+
+    merchant_ids = ScreeningResult.objects.filter(run__isnull=True).values_list('merchant_id', flat=True).distinct()
+    for merchant_id in merchant_ids.iterator():
+        results = ScreeningResult.objects.filter(merchant_id=merchant_id, run__isnull=True)
+        statuses = list(results.values_list('screening_type', 'status'))
+        if any(t != 'PEP' and s == 'MATCH' for t, s in statuses):
+            overall_status = 'MATCH'
+        elif any(s in ('MATCH', 'POTENTIAL_MATCH') for _, s in statuses):
+            overall_status = 'POTENTIAL_MATCH'
+        else:
+            overall_status = 'CLEAR'
+
+        merchant = Merchant.objects.get(pk=merchant_id)
+        run = ScreeningRun.objects.create(
+            merchant_id=merchant_id,
+            overall_status=overall_status,
+            fingerprint=merchant.screening_fingerprint,
+        )
+        results.update(run=run)
+        Merchant.objects.filter(pk=merchant_id).update(current_screening_run=run)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchants', '0003_merchant_current_screening_run'),
+        ('screening', '0002_screening_run'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_screening_runs, migrations.RunPython.noop),
+    ]
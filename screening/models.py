@@ -5,6 +5,34 @@ from django.db import models
 from merchants.models import Merchant
 
 
+class ScreeningRun(models.Model):
+    """A single screening pass over a merchant. Runs are append-only."""
+
+    STATUS_CHOICES = [
+        ('CLEAR', 'Clear'),
+        ('MATCH', 'Match Found'),
+        ('POTENTIAL_MATCH', 'Potential Match'),
+    ]
+
+    merchant = models.ForeignKey(Merchant, on_delete=models.CASCADE, related_name='screening_runs')
+    overall_status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    fingerprint = models.CharField(max_length=64, blank=True)
+    list_version = models.CharField(max_length=16, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    archived_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        verbose_name = 'Screening Run'
+        verbose_name_plural = 'Screening Runs'
+        indexes = [
+            models.Index(fields=['archived_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Screening run #{self.pk} - {self.merchant.business_name}: {self.overall_status}"
+
+
 class ScreeningResult(models.Model):
     """Results from sanctions/AML screening."""
 
@@ -21,6 +49,7 @@ class ScreeningResult(models.Model):
     ]
 
     merchant = models.ForeignKey(Merchant, on_delete=models.CASCADE, related_name='screening_results')
+    run = models.ForeignKey(ScreeningRun, on_delete=models.CASCADE, null=True, blank=True, related_name='results')
     screening_type = models.CharField(max_length=20, choices=SCREENING_TYPE_CHOICES)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
     matched_list = models.CharField(max_length=100, blank=True)
@@ -32,6 +61,9 @@ class ScreeningResult(models.Model):
         ordering = ['-screened_at']
         verbose_name = 'Screening Result'
         verbose_name_plural = 'Screening Results'
+        indexes = [
+            models.Index(fields=['run', 'status']),
+        ]
 
     def __str__(self):
         return f"{self.get_screening_type_display()} - {self.merchant.business_name}: {self.status}"
@@ -1,10 +1,18 @@
 """
 Sanctions screening services.
 """
+import hashlib
+import json
 import logging
+import time
 from difflib import SequenceMatcher
 
-from .models import ScreeningResult
+from django.db import transaction
+from django.utils import timezone
+
+from merchants.models import Merchant
+from merchants.ubo import corporate_chain_names, is_corporate, resolve_beneficial_owners
+from .models import ScreeningResult, ScreeningRun, SanctionsList
 
 logger = logging.getLogger(__name__)
 
@@ -30,11 +38,114 @@ SIMILARITY_THRESHOLD = 0.8
 POTENTIAL_MATCH_THRESHOLD = 0.6
 
 
+class ScreeningTimeout(Exception):
+    """Screening ran past its deadline before finishing. Nothing was recorded."""
+
+
 def calculate_similarity(name1, name2):
     """Calculate string similarity between two names."""
     return SequenceMatcher(None, name1.lower(), name2.lower()).ratio()
 
 
+def normalize_name(name):
+    """Normalize a name for fingerprinting: case-folded, single-spaced."""
+    return ' '.join(name.casefold().split())
+
+
+def get_list_version():
+    """
+    Get a version stamp for the lists and thresholds screening runs against.
+
+    Changes whenever a list entry, a matching threshold or an active
+    SanctionsList reference row changes.
+    """
+    active_lists = SanctionsList.objects.filter(is_active=True).order_by('pk').values_list('pk', 'last_updated')
+    payload = {
+        'sanctions': MOCK_SANCTIONS_LIST,
+        'pep': MOCK_PEP_LIST,
+        'thresholds': [SIMILARITY_THRESHOLD, POTENTIAL_MATCH_THRESHOLD],
+        'lists': [[pk, last_updated.isoformat()] for pk, last_updated in active_lists],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def compute_screening_fingerprint(merchant, owners=None, list_version=None):
+    """
+    Compute a content fingerprint over everything screening depends on.
+
+    Covers the normalized business name, each ultimate owner's name and
+    identity attributes, the companies in any ownership chain, and the list
+    version. Ownership percentages are left out because they don't affect
+    screening outcomes.
+
+    Returns:
+        str: Hex digest
+    """
+    if owners is None:
+        owners = resolve_beneficial_owners(merchant)
+    if list_version is None:
+        list_version = get_list_version()
+
+    owner_keys = sorted(
+        [
+            normalize_name(owner.full_name),
+            owner.nationality.upper(),
+            owner.id_document_type,
+            owner.id_document_number.strip().upper(),
+            bool(owner.is_pep),
+        ]
+        for owner in owners
+    )
+    payload = {
+        'business_name': normalize_name(merchant.business_name),
+        'owners': owner_keys,
+        'list_version': list_version,
+    }
+    chain = corporate_chain_names(owners)
+    if chain:
+        payload['corporate_owners'] = [normalize_name(name) for name in chain]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def aggregate_result_status(statuses):
+    """
+    Get the worst individual result status, as stored on Merchant.screening_status.
+
+    Unlike overall_screening_status, a PEP match counts as a MATCH here.
+    """
+    statuses = set(statuses)
+    if 'MATCH' in statuses:
+        return 'MATCH'
+    if 'POTENTIAL_MATCH' in statuses:
+        return 'POTENTIAL_MATCH'
+    if statuses:
+        return 'CLEAR'
+    return 'NOT_SCREENED'
+
+
+def overall_screening_status(results):
+    """
+    Combine individual screening outcomes into an overall status.
+
+    Args:
+        results: Iterable of (screening_type, status) pairs
+
+    Returns:
+        str: 'CLEAR', 'MATCH' or 'POTENTIAL_MATCH'
+    """
+    overall_status = 'CLEAR'
+    for screening_type, status in results:
+        if screening_type == 'PEP':
+            # PEP match doesn't auto-reject but flags for review
+            if status in ['MATCH', 'POTENTIAL_MATCH'] and overall_status == 'CLEAR':
+                overall_status = 'POTENTIAL_MATCH'
+        elif status == 'MATCH':
+            overall_status = 'MATCH'
+        elif status == 'POTENTIAL_MATCH' and overall_status != 'MATCH':
+            overall_status = 'POTENTIAL_MATCH'
+    return overall_status
+
+
 def screen_entity(name, screening_type='SANCTIONS'):
     """
     Screen a name against sanctions/PEP lists.
@@ -81,75 +192,237 @@ def screen_entity(name, screening_type='SANCTIONS'):
     return "CLEAR", None
 
 
-def screen_merchant(merchant):
+def _check_deadline(deadline):
+    if deadline is not None and time.monotonic() >= deadline:
+        raise ScreeningTimeout("Screening deadline passed")
+
+
+def _screen_names(merchant, owners=None, deadline=None):
     """
-    Run full screening on a merchant.
+    Screen a merchant's name, ultimate owners and corporate chain.
 
     Returns:
-        str: Overall screening status ('CLEAR', 'MATCH', 'POTENTIAL_MATCH')
+        tuple: (resolved owners, unsaved ScreeningResult objects)
     """
-    overall_status = 'CLEAR'
+    owners = resolve_beneficial_owners(merchant, owners)
+    results = []
 
     # Screen business name
+    _check_deadline(deadline)
     status, match = screen_entity(merchant.business_name, 'SANCTIONS')
-    ScreeningResult.objects.create(
+    results.append(ScreeningResult(
         merchant=merchant,
         screening_type='SANCTIONS',
         status=status,
         matched_list=match.get('list', '') if match else '',
         match_details=match or {},
         screened_entity=merchant.business_name,
-    )
+    ))
 
-    if status == 'MATCH':
-        overall_status = 'MATCH'
-    elif status == 'POTENTIAL_MATCH' and overall_status != 'MATCH':
-        overall_status = 'POTENTIAL_MATCH'
+    # Screen every corporate owner, including companies in the ownership chain
+    for name in corporate_chain_names(owners):
+        _check_deadline(deadline)
+        status, match = screen_entity(name, 'SANCTIONS')
+        results.append(ScreeningResult(
+            merchant=merchant,
+            screening_type='SANCTIONS',
+            status=status,
+            matched_list=match.get('list', '') if match else '',
+            match_details=match or {},
+            screened_entity=f"Corporate owner: {name}",
+        ))
 
     # Screen beneficial owners
-    for owner in merchant.owners.all():
+    for owner in owners:
+        if is_corporate(owner):
+            continue
+        _check_deadline(deadline)
+
         # Sanctions check
         status, match = screen_entity(owner.full_name, 'SANCTIONS')
-        ScreeningResult.objects.create(
+        results.append(ScreeningResult(
             merchant=merchant,
             screening_type='SANCTIONS',
             status=status,
             matched_list=match.get('list', '') if match else '',
             match_details=match or {},
             screened_entity=f"Owner: {owner.full_name}",
-        )
-
-        if status == 'MATCH':
-            overall_status = 'MATCH'
-        elif status == 'POTENTIAL_MATCH' and overall_status != 'MATCH':
-            overall_status = 'POTENTIAL_MATCH'
+        ))
 
         # PEP check
         status, match = screen_entity(owner.full_name, 'PEP')
-        ScreeningResult.objects.create(
+        results.append(ScreeningResult(
             merchant=merchant,
             screening_type='PEP',
             status=status,
             matched_list=match.get('position', '') if match else '',
             match_details=match or {},
             screened_entity=f"Owner: {owner.full_name}",
+        ))
+    return owners, results
+
+
+def screen_merchant(merchant, owners=None, deadline=None, commit=True):
+    """
+    Run full screening on a merchant.
+
+    Each call records a new ScreeningRun with its results attached and makes
+    it the merchant's current run. Earlier runs are kept as history.
+    Corporate shareholders are resolved to their ultimate beneficial owners,
+    and the companies along each ownership chain are sanctions-screened too.
+
+    Args:
+        merchant: Merchant to screen
+        owners: Already-loaded beneficial owners, to skip reloading them
+        deadline: time.monotonic() value after which to give up
+        commit: Also write the new run and status to the merchant row;
+            otherwise they are only set on the instance, for the caller to save
+
+    Returns:
+        str: Overall screening status ('CLEAR', 'MATCH', 'POTENTIAL_MATCH')
+
+    Raises:
+        ScreeningTimeout: The deadline passed before every name was screened
+    """
+    owners, results = _screen_names(merchant, owners, deadline)
+    overall_status = overall_screening_status((r.screening_type, r.status) for r in results)
+
+    # Remember what was screened so unchanged merchants can skip rescreening
+    list_version = get_list_version()
+    fingerprint = compute_screening_fingerprint(merchant, owners, list_version)
+
+    with transaction.atomic():
+        run = ScreeningRun.objects.create(
+            merchant=merchant,
+            overall_status=overall_status,
+            fingerprint=fingerprint,
+            list_version=list_version,
         )
+        for result in results:
+            result.run = run
+        ScreeningResult.objects.bulk_create(results)
 
-        # PEP match doesn't auto-reject but flags for review
-        if status in ['MATCH', 'POTENTIAL_MATCH'] and overall_status == 'CLEAR':
-            overall_status = 'POTENTIAL_MATCH'
+        merchant.current_screening_run = run
+        merchant.screening_status = aggregate_result_status(r.status for r in results)
+        merchant.screening_fingerprint = fingerprint
+        if commit:
+            Merchant.objects.filter(pk=merchant.pk).update(
+                current_screening_run=run,
+                screening_status=merchant.screening_status,
+                screening_fingerprint=fingerprint,
+            )
 
     logger.info(f"Screening complete for {merchant.business_name}: {overall_status}")
     return overall_status
 
 
-def rescreen_merchant(merchant):
+def match_merchants(merchants, owners):
+    """
+    Match a batch of merchants' names against the lists, recording nothing.
+
+    Needs no database access for merchants without corporate shareholders,
+    so imports can match one batch while the previous one is being written.
+
+    Args:
+        merchants: Merchants to match, saved or not
+        owners: List of each merchant's beneficial owners, in merchant order
+
+    Returns:
+        list: (resolved owners, unsaved ScreeningResult objects) per merchant
+    """
+    return [_screen_names(merchant, merchant_owners) for merchant, merchant_owners in zip(merchants, owners)]
+
+
+def screen_merchants(merchants, owners_by_merchant, matches=None):
+    """
+    Screen a batch of merchants, recording their runs and results in bulk.
+
+    The outcome is set on each merchant instance for the caller to save,
+    as with screen_merchant(commit=False).
+
+    Args:
+        merchants: Saved merchants to screen
+        owners_by_merchant: merchant pk -> list of its beneficial owners
+        matches: match_merchants output for these merchants, if already matched
+
+    Returns:
+        dict: merchant pk -> overall screening status
+    """
+    if matches is None:
+        matches = match_merchants(merchants, [owners_by_merchant.get(merchant.pk, []) for merchant in merchants])
+    list_version = get_list_version()
+    runs, results = [], []
+    for merchant, (owners, merchant_results) in zip(merchants, matches):
+        runs.append(ScreeningRun(
+            merchant=merchant,
+            overall_status=overall_screening_status((r.screening_type, r.status) for r in merchant_results),
+            fingerprint=compute_screening_fingerprint(merchant, owners, list_version),
+            list_version=list_version,
+        ))
+        results.append(merchant_results)
+
+    with transaction.atomic():
+        ScreeningRun.objects.bulk_create(runs)
+        for run, merchant_results in zip(runs, results):
+            for result in merchant_results:
+                result.run = run
+        ScreeningResult.objects.bulk_create([result for merchant_results in results for result in merchant_results])
+
+    statuses = {}
+    for merchant, run, merchant_results in zip(merchants, runs, results):
+        merchant.current_screening_run = run
+        merchant.screening_status = aggregate_result_status(r.status for r in merchant_results)
+        merchant.screening_fingerprint = run.fingerprint
+        statuses[merchant.pk] = run.overall_status
+    logger.info(f"Batch screening complete for {len(runs)} merchant(s)")
+    return statuses
+
+
+def rescreen_merchant(merchant, force=False):
     """
     Re-run screening for an existing merchant.
     Useful for periodic rescreening requirements.
+
+    Skipped when the business name, owners and list version are unchanged
+    since the last screening, unless force is set.
     """
-    # Clear old results
-    merchant.screening_results.all().delete()
+    if not force and merchant.current_screening_run_id and merchant.screening_fingerprint:
+        fingerprint = compute_screening_fingerprint(merchant)
+        if fingerprint == merchant.screening_fingerprint:
+            logger.info(f"Rescreening skipped for {merchant.business_name}: screened identity unchanged")
+            return merchant.current_screening_run.overall_status
 
-    # Run new screening
     return screen_merchant(merchant)
+
+
+def archive_screening_runs(batch_size=1000):
+    """
+    Archive screening runs that are no longer any merchant's current run.
+
+    Works through superseded runs in primary-key batches so a large backlog
+    never holds long locks.
+
+    Returns:
+        int: Number of runs archived
+    """
+    current_runs = Merchant.objects.filter(current_screening_run__isnull=False).values('current_screening_run')
+    archived = 0
+    last_pk = 0
+
+    while True:
+        batch = list(
+            ScreeningRun.objects.filter(archived_at__isnull=True, pk__gt=last_pk)
+            .exclude(pk__in=current_runs)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            break
+
+        archived += ScreeningRun.objects.filter(pk__in=batch, archived_at__isnull=True).update(
+            archived_at=timezone.now()
+        )
+        last_pk = batch[-1]
+
+    logger.info(f"Archived {archived} superseded screening run(s)")
+    return archived
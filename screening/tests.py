@@ -5,12 +5,14 @@ from django.test import TestCase
 from decimal import Decimal
 
 from merchants.models import Merchant, BeneficialOwner
-from .models import ScreeningResult
+from .models import ScreeningResult, ScreeningRun
 from .services import (
     screen_entity,
     screen_merchant,
     rescreen_merchant,
+    archive_screening_runs,
     calculate_similarity,
+    compute_screening_fingerprint,
     MOCK_SANCTIONS_LIST,
     MOCK_PEP_LIST,
 )
@@ -255,11 +257,64 @@ class ScreenMerchantTestCase(TestCase):
         print(f"✓ Multiple screening results created: {result_count}")
 
 
+class StoredScreeningStatusTestCase(TestCase):
+    """Tests for the screening status denormalized onto Merchant."""
+
+    def test_screening_stores_status_on_merchant(self):
+        """Screening should persist the aggregate status on the merchant row."""
+        merchant = Merchant.objects.create(
+            business_name="Stored Status Co",
+            registration_number="STAT001",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@stored.com",
+            phone="+65 1234 5678",
+            address="Singapore",
+        )
+        self.assertEqual(merchant.get_screening_status(), "NOT_SCREENED")
+
+        BeneficialOwner.objects.create(
+            merchant=merchant,
+            full_name="John Politician",
+            nationality="PH",
+            ownership_percentage=Decimal("51.00"),
+            id_document_type="PASSPORT",
+            id_document_number="PH1234567",
+            is_pep=True,
+        )
+        screen_merchant(merchant)
+        merchant.refresh_from_db()
+
+        self.assertEqual(merchant.screening_status, "MATCH")
+        self.assertTrue(Merchant.objects.filter(screening_status="MATCH", pk=merchant.pk).exists())
+        print(f"✓ Stored screening status: {merchant.screening_status}")
+
+    def test_get_screening_status_runs_no_queries(self):
+        """Reading the screening status should not hit the database."""
+        merchant = Merchant.objects.create(
+            business_name="Query Free Co",
+            registration_number="STAT002",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@queryfree.com",
+            phone="+65 1234 5678",
+            address="Singapore",
+        )
+        screen_merchant(merchant)
+        merchant = Merchant.objects.get(pk=merchant.pk)
+
+        with self.assertNumQueries(0):
+            status = merchant.get_screening_status()
+
+        self.assertEqual(status, "CLEAR")
+        print("✓ get_screening_status reads a column")
+
+
 class RescreenMerchantTestCase(TestCase):
     """Tests for merchant rescreening functionality."""
 
-    def test_rescreen_clears_old_results(self):
-        """Rescreening should clear previous results."""
+    def test_rescreen_appends_new_run(self):
+        """Rescreening should add a new current run and keep the old one as history."""
         merchant = Merchant.objects.create(
             business_name="Rescreen Test",
             registration_number="RESCAN001",
@@ -272,19 +327,153 @@ class RescreenMerchantTestCase(TestCase):
 
         # Initial screening
         screen_merchant(merchant)
-        initial_count = merchant.screening_results.count()
-        initial_ids = list(merchant.screening_results.values_list("id", flat=True))
+        initial_run_id = merchant.current_screening_run_id
+        initial_ids = set(merchant.get_current_screening_results().values_list("id", flat=True))
 
         # Rescreen
+        rescreen_merchant(merchant, force=True)
+
+        # Should have new current results, old ones kept
+        new_ids = set(merchant.get_current_screening_results().values_list("id", flat=True))
+
+        self.assertNotEqual(merchant.current_screening_run_id, initial_run_id)
+        self.assertEqual(len(initial_ids), len(new_ids))
+        self.assertFalse(initial_ids & new_ids)  # No overlap
+        self.assertEqual(merchant.screening_results.count(), len(initial_ids) + len(new_ids))
+        self.assertEqual(merchant.screening_runs.count(), 2)
+        print("✓ Rescreening appends a new run and keeps history")
+
+    def test_rescreen_skipped_when_identity_unchanged(self):
+        """Rescreening an unchanged merchant should keep existing results."""
+        merchant = Merchant.objects.create(
+            business_name="Unchanged Corp",
+            registration_number="RESCAN002",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@unchanged.com",
+            phone="+65 1234 5678",
+            address="Singapore",
+        )
+        BeneficialOwner.objects.create(
+            merchant=merchant,
+            full_name="John Politician",
+            nationality="PH",
+            ownership_percentage=Decimal("60.00"),
+            id_document_type="PASSPORT",
+            id_document_number="PH7654321",
+            is_pep=True,
+        )
+
+        initial_status = screen_merchant(merchant)
+        initial_run_id = merchant.current_screening_run_id
+
+        status = rescreen_merchant(merchant)
+
+        self.assertEqual(status, initial_status)
+        self.assertEqual(merchant.current_screening_run_id, initial_run_id)
+        self.assertEqual(merchant.screening_runs.count(), 1)
+        print(f"✓ Unchanged merchant rescreen skipped: {status}")
+
+    def test_rescreen_runs_when_identity_changes(self):
+        """Changing the business name or owners should trigger a real rescreen."""
+        merchant = Merchant.objects.create(
+            business_name="Changing Corp",
+            registration_number="RESCAN003",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@changing.com",
+            phone="+65 1234 5678",
+            address="Singapore",
+        )
+        screen_merchant(merchant)
+        fingerprint = merchant.screening_fingerprint
+
+        merchant.business_name = "Shell Corp Ltd"
+        merchant.save()
+        status = rescreen_merchant(merchant)
+
+        self.assertEqual(status, "MATCH")
+        self.assertNotEqual(merchant.screening_fingerprint, fingerprint)
+
+        BeneficialOwner.objects.create(
+            merchant=merchant,
+            full_name="Jane Doe",
+            nationality="SG",
+            ownership_percentage=Decimal("100.00"),
+            id_document_type="PASSPORT",
+            id_document_number="E7777777",
+        )
         rescreen_merchant(merchant)
 
-        # Should have new results
-        new_count = merchant.screening_results.count()
-        new_ids = list(merchant.screening_results.values_list("id", flat=True))
+        self.assertTrue(merchant.get_current_screening_results().filter(screened_entity="Owner: Jane Doe").exists())
+        print("✓ Changed identity triggers rescreening")
 
-        self.assertEqual(initial_count, new_count)
-        self.assertFalse(set(initial_ids) & set(new_ids))  # No overlap
-        print("✓ Rescreening clears old results and creates new ones")
+    def test_status_reads_current_run_only(self):
+        """Screening status should ignore results from superseded runs."""
+        merchant = Merchant.objects.create(
+            business_name="Shell Corp Ltd",
+            registration_number="RESCAN004",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@renamed.com",
+            phone="+65 1234 5678",
+            address="Singapore",
+        )
+        screen_merchant(merchant)
+        self.assertEqual(merchant.get_screening_status(), "MATCH")
+
+        merchant.business_name = "Renamed Legitimate Co"
+        merchant.save()
+        rescreen_merchant(merchant)
+
+        self.assertEqual(merchant.get_screening_status(), "CLEAR")
+        self.assertTrue(merchant.screening_results.filter(status="MATCH").exists())
+        print("✓ Screening status reflects current run only")
+
+
+class ArchiveScreeningRunsTestCase(TestCase):
+    """Tests for batched archiving of superseded screening runs."""
+
+    def test_archive_skips_current_runs(self):
+        """Only superseded runs should be archived, in batches."""
+        merchant = Merchant.objects.create(
+            business_name="Archive Test Co",
+            registration_number="ARCH001",
+            country="SG",
+            business_category="ECOMMERCE",
+            email="test@archive.com",
+            phone="+65 1234 5678",
+            address="Singapore",
+        )
+        for _ in range(4):
+            rescreen_merchant(merchant, force=True)
+
+        archived = archive_screening_runs(batch_size=2)
+
+        self.assertEqual(archived, 3)
+        current = ScreeningRun.objects.get(pk=merchant.current_screening_run_id)
+        self.assertIsNone(current.archived_at)
+        self.assertEqual(archive_screening_runs(batch_size=2), 0)
+        print(f"✓ Archived {archived} superseded run(s)")
+
+    def test_fingerprint_ignores_formatting_and_owner_order(self):
+        """Fingerprint should normalize names and not depend on owner order."""
+        merchant = Merchant(business_name="Acme  Trading", country="SG")
+        other = Merchant(business_name="ACME trading ", country="SG")
+        owners = [
+            BeneficialOwner(full_name="Jane Doe", nationality="SG", id_document_type="PASSPORT", id_document_number="E1"),
+            BeneficialOwner(full_name="John Roe", nationality="SG", id_document_type="PASSPORT", id_document_number="E2"),
+        ]
+
+        self.assertEqual(
+            compute_screening_fingerprint(merchant, owners, list_version="v1"),
+            compute_screening_fingerprint(other, list(reversed(owners)), list_version="v1"),
+        )
+        self.assertNotEqual(
+            compute_screening_fingerprint(merchant, owners, list_version="v1"),
+            compute_screening_fingerprint(merchant, owners, list_version="v2"),
+        )
+        print("✓ Fingerprint is stable across formatting and owner order")
 
 
 class ScreeningResultModelTestCase(TestCase):
@@ -0,0 +1,28 @@
+"""
+Admin configuration for the task queue.
+"""
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    """Admin for background tasks."""
+
+    list_display = ('name', 'key', 'status', 'attempts', 'max_attempts', 'run_after', 'locked_by', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'key')
+    readonly_fields = (
+        'name', 'key', 'payload', 'status', 'attempts', 'locked_by', 'locked_until', 'last_error',
+        'created_at', 'finished_at',
+    )
+    actions = ['retry_tasks']
+
+    def retry_tasks(self, request, queryset):
+        retried = queryset.filter(status='FAILED').update(
+            status='QUEUED', attempts=0, run_after=timezone.now(), finished_at=None,
+        )
+        self.message_user(request, f"{retried} task(s) queued for retry.")
+    retry_tasks.short_description = 'Retry selected failed tasks'
@@ -0,0 +1,36 @@
+"""
+Run a background task worker.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from taskqueue.queue import run_pending, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Claim and run queued background tasks. Start several to run tasks in parallel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help='Tasks claimed per poll')
+        parser.add_argument('--idle-sleep', type=float, default=1.0, help='Seconds to wait when no task is due')
+        parser.add_argument('--once', action='store_true', help='Exit once no task is due')
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        total = 0
+        self.stdout.write(f"Task worker {worker} started.")
+        try:
+            while True:
+                close_old_connections()
+                ran = run_pending(worker, options['batch_size'])
+                total += ran
+                if ran:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['idle_sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Task worker {worker} ran {total} task(s)."))
@@ -0,0 +1,238 @@
+"""
+Database-backed background task queue.
+
+Handlers are registered by name with @task and queued with enqueue, which
+writes a Task row in the caller's transaction so work is only queued for
+data that commits. Workers (manage.py run_task_worker) claim due tasks with
+SELECT ... FOR UPDATE SKIP LOCKED where the database supports it, and with a
+compare-and-swap on the attempt counter otherwise (SQLite). A claim is a
+lease: a task whose worker dies is claimed again once TASK_VISIBILITY_TIMEOUT
+passes. Failed tasks are retried with exponential backoff up to their
+max_attempts.
+
+A task can be delayed, and a delayed task can coalesce with the same
+task still queued for its key: the queued one is pushed back instead of a
+second being added, so a burst of edits runs the task once, after the burst.
+
+With TASK_QUEUE_EAGER (the default) enqueue runs the handler inline instead,
+so deployments without workers and the test suite behave synchronously.
+Tasks queued with background=True are still stored in eager mode and run on
+a thread once they commit (and their delay passes), for work that must not
+hold up the caller. A failed one is retried on a timer after its backoff.
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed task stays invisible to other workers
+TASK_VISIBILITY_TIMEOUT = getattr(settings, 'TASK_VISIBILITY_TIMEOUT', 300)
+TASK_MAX_ATTEMPTS = getattr(settings, 'TASK_MAX_ATTEMPTS', 5)
+# Delay before the first retry, doubled on every further attempt
+TASK_RETRY_BACKOFF_SECONDS = getattr(settings, 'TASK_RETRY_BACKOFF_SECONDS', 10)
+
+_handlers = {}
+
+
+def task(name):
+    """Register a function as the handler for tasks of this name."""
+    def register(func):
+        _handlers[name] = func
+        return func
+    return register
+
+
+def is_eager():
+    # Read per call so override_settings applies
+    return getattr(settings, 'TASK_QUEUE_EAGER', True)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(name, key='', max_attempts=None, background=False, delay=0, coalesce=False, **payload):
+    """
+    Queue a task, or run it straight away in eager mode.
+
+    Args:
+        name: Registered task name
+        key: What the task is about, for progress lookups with latest_task
+        max_attempts: Runs before the task is marked FAILED
+        background: Never run inline; in eager mode, run on a thread after commit
+        delay: Seconds before the task may run; delayed tasks are never run inline
+        coalesce: Push back a task of this name and key that hasn't started
+            yet, with this payload, instead of queueing another
+        **payload: JSON-serializable keyword arguments for the handler
+
+    Returns:
+        Task: The queued task, or None when it ran eagerly
+    """
+    if name not in _handlers:
+        raise ValueError(f"No handler registered for task '{name}'")
+    if is_eager() and not background and not delay:
+        _handlers[name](**payload)
+        return None
+    run_after = timezone.now() + timedelta(seconds=delay)
+    queued = _coalesce(name, key, run_after, payload) if coalesce and key else None
+    if queued is None:
+        queued = Task.objects.create(
+            name=name,
+            key=key,
+            payload=payload,
+            max_attempts=max_attempts or TASK_MAX_ATTEMPTS,
+            run_after=run_after,
+        )
+    if is_eager():
+        # No workers to pick it up, so run it here once it is visible and due
+        if delay:
+            transaction.on_commit(lambda: _start_background(queued.pk, delay))
+        else:
+            transaction.on_commit(lambda: _start_background(queued.pk))
+    return queued
+
+
+def _coalesce(name, key, run_after, payload):
+    """Reschedule the newest not yet started task of this name and key, if any."""
+    waiting = Task.objects.filter(name=name, key=key, status='QUEUED', attempts=0)
+    pending = waiting.order_by('-pk').values_list('pk', flat=True).first()
+    # A worker claiming it meanwhile counts an attempt, so the update then misses
+    if pending is None or not waiting.filter(pk=pending).update(run_after=run_after, payload=payload):
+        return None
+    return Task.objects.get(pk=pending)
+
+
+def _start_background(task_id, delay=0):
+    if delay:
+        # Pushed-back tasks aren't due when an earlier timer fires, so only the last timer runs them
+        thread = threading.Timer(delay, _run_in_background, args=(task_id,))
+    else:
+        thread = threading.Thread(target=_run_in_background, args=(task_id,))
+    thread.daemon = True
+    thread.start()
+
+
+def _run_in_background(task_id):
+    try:
+        for claimed in claim_tasks(worker_name(), pks=[task_id]):
+            if not run_task(claimed):
+                _retry_in_background(task_id)
+    except Exception:
+        logger.exception(f"Background run of task #{task_id} failed")
+    finally:
+        connection.close()
+
+
+def _retry_in_background(task_id):
+    # Without a worker nothing else claims the retry, so wait out its backoff on a new timer
+    run_after = Task.objects.filter(pk=task_id, status='QUEUED').values_list('run_after', flat=True).first()
+    if run_after is not None:
+        _start_background(task_id, max((run_after - timezone.now()).total_seconds(), 0))
+
+
+def latest_task(key):
+    """The most recently queued task for a key, or None."""
+    return Task.objects.filter(key=key).order_by('-pk').first()
+
+
+def _claimable(now):
+    return Task.objects.filter(
+        Q(status='QUEUED', run_after__lte=now) | Q(status='RUNNING', locked_until__lt=now)
+    )
+
+
+def claim_tasks(worker, limit=1, pks=None):
+    """
+    Lease up to limit due tasks, including ones whose previous lease expired.
+
+    Args:
+        worker: Name recorded as the lease holder
+        limit: Most tasks to claim
+        pks: Only consider these tasks
+
+    Returns:
+        list: Claimed Task objects, with attempts already counted
+    """
+    now = timezone.now()
+    lease = {
+        'status': 'RUNNING',
+        'locked_by': worker,
+        'locked_until': now + timedelta(seconds=TASK_VISIBILITY_TIMEOUT),
+        'attempts': F('attempts') + 1,
+    }
+    due = _claimable(now).order_by('run_after', 'pk')
+    if pks is not None:
+        due = due.filter(pk__in=pks)
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            claimed = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            Task.objects.filter(pk__in=claimed).update(**lease)
+    else:
+        # Compare-and-swap: a row whose attempts changed was claimed by someone else
+        claimed = [
+            pk for pk, attempts in due.values_list('pk', 'attempts')[:limit]
+            if _claimable(now).filter(pk=pk, attempts=attempts).update(**lease)
+        ]
+    return list(Task.objects.filter(pk__in=claimed).order_by('run_after', 'pk'))
+
+
+def run_task(claimed):
+    """
+    Run a claimed task and record the outcome.
+
+    Outcomes are only written while the claim is still this worker's, so a
+    task reclaimed after its lease expired isn't overwritten by a late finish.
+
+    Returns:
+        bool: Whether the handler succeeded
+    """
+    lease = Task.objects.filter(pk=claimed.pk, locked_by=claimed.locked_by, attempts=claimed.attempts)
+    try:
+        if claimed.attempts > claimed.max_attempts:
+            raise TimeoutError("Lease expired on the final attempt")
+        handler = _handlers.get(claimed.name)
+        if handler is None:
+            raise LookupError(f"No handler registered for task '{claimed.name}'")
+        handler(**claimed.payload)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if claimed.attempts >= claimed.max_attempts:
+            lease.update(status='FAILED', last_error=error, locked_until=None, finished_at=now)
+            logger.error(f"Task {claimed} failed after {claimed.attempts} attempt(s)")
+        else:
+            delay = TASK_RETRY_BACKOFF_SECONDS * 2 ** (claimed.attempts - 1)
+            lease.update(
+                status='QUEUED', last_error=error, locked_until=None, run_after=now + timedelta(seconds=delay),
+            )
+            logger.warning(f"Task {claimed} failed on attempt {claimed.attempts}, retrying in {delay}s")
+        return False
+
+    lease.update(status='DONE', last_error='', locked_until=None, finished_at=timezone.now())
+    return True
+
+
+def run_pending(worker=None, limit=10):
+    """
+    Claim and run up to limit due tasks.
+
+    Returns:
+        int: Tasks run, successful or not
+    """
+    worker = worker or worker_name()
+    claimed = claim_tasks(worker, limit)
+    for claimed_task in claimed:
+        run_task(claimed_task)
+    return len(claimed)
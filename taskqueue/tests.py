@@ -0,0 +1,211 @@
+"""
+Tests for the database-backed task queue.
+"""
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import queue
+from .models import Task
+from .queue import claim_tasks, enqueue, latest_task, run_pending, run_task, task
+
+calls = []
+
+
+@task('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task('tests.fail')
+def fail(value):
+    raise RuntimeError(f"failed on {value}")
+
+
+@override_settings(TASK_QUEUE_EAGER=False)
+class TaskQueueTestCase(TestCase):
+    """Tests for queueing, claiming, retrying and lease expiry."""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_eager_mode_runs_inline(self):
+        """Eager mode should run the handler at once and store nothing."""
+        with override_settings(TASK_QUEUE_EAGER=True):
+            self.assertIsNone(enqueue('tests.record', value=1))
+        self.assertEqual(calls, [1])
+        self.assertFalse(Task.objects.exists())
+        print("✓ Eager mode runs tasks inline")
+
+    def test_background_task_stored_and_started_on_commit(self):
+        """Background tasks in eager mode should be stored and run on a thread after commit."""
+        with override_settings(TASK_QUEUE_EAGER=True), \
+                mock.patch('taskqueue.queue._start_background') as start, \
+                self.captureOnCommitCallbacks(execute=True):
+            queued = enqueue('tests.record', background=True, value=8)
+            start.assert_not_called()
+        start.assert_called_once_with(queued.pk)
+        self.assertEqual(calls, [])
+        self.assertEqual(Task.objects.get().status, 'QUEUED')
+        print("✓ Background tasks stored and started after commit")
+
+    def test_failed_background_task_retried_on_timer(self):
+        """A background task that fails in eager mode should be re-armed for its backoff."""
+        queued = enqueue('tests.fail', max_attempts=2, value=9)
+
+        with mock.patch('taskqueue.queue._start_background') as start:
+            queue._run_in_background(queued.pk)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'QUEUED')
+        [(task_id, delay), _] = start.call_args
+        self.assertEqual(task_id, queued.pk)
+        self.assertGreater(delay, 0)
+
+        Task.objects.filter(pk=queued.pk).update(run_after=timezone.now())
+        with mock.patch('taskqueue.queue._start_background') as start:
+            queue._run_in_background(queued.pk)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'FAILED')
+        start.assert_not_called()
+        print("✓ Failed background tasks re-armed until they run out of attempts")
+
+    def test_delayed_tasks_coalesce_per_key(self):
+        """A delayed task should wait, and coalescing should push back the waiting one."""
+        with override_settings(TASK_QUEUE_EAGER=True), \
+                mock.patch('taskqueue.queue._start_background') as start, \
+                self.captureOnCommitCallbacks(execute=True):
+            first = enqueue('tests.record', key='thing:3', delay=60, coalesce=True, value=1)
+            second = enqueue('tests.record', key='thing:3', delay=120, coalesce=True, value=2)
+        start.assert_called_with(first.pk, 120)
+        self.assertEqual(calls, [])
+
+        queued = Task.objects.get()
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(queued.payload, {'value': 2})
+        self.assertGreater(queued.run_after, timezone.now() + timedelta(seconds=100))
+        self.assertEqual(run_pending('worker-a'), 0)
+
+        # A task that has started is left alone
+        Task.objects.update(status='RUNNING', attempts=1)
+        enqueue('tests.record', key='thing:3', delay=60, coalesce=True, value=3)
+        self.assertEqual(Task.objects.count(), 2)
+        print("✓ Delayed tasks wait and coalesce per key")
+
+    def test_unknown_task_rejected(self):
+        """Queueing a task with no handler should fail at once."""
+        with self.assertRaises(ValueError):
+            enqueue('tests.missing')
+        print("✓ Unknown task names rejected")
+
+    def test_queued_task_runs_once(self):
+        """A worker should run a queued task and mark it done."""
+        queued = enqueue('tests.record', key='thing:1', value=2)
+        self.assertEqual(latest_task('thing:1'), queued)
+        self.assertTrue(queued.in_progress)
+
+        self.assertEqual(run_pending('worker-a'), 1)
+        self.assertEqual(run_pending('worker-a'), 0)
+
+        queued.refresh_from_db()
+        self.assertEqual(calls, [2])
+        self.assertEqual(queued.status, 'DONE')
+        self.assertEqual(queued.attempts, 1)
+        self.assertIsNotNone(queued.finished_at)
+        print("✓ Queued task runs once")
+
+    def test_claimed_task_invisible_to_other_workers(self):
+        """A leased task should not be claimed again until its lease expires."""
+        queued = enqueue('tests.record', value=3)
+        self.assertEqual([claimed.pk for claimed in claim_tasks('worker-a')], [queued.pk])
+        self.assertEqual(claim_tasks('worker-b'), [])
+
+        Task.objects.filter(pk=queued.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        reclaimed = claim_tasks('worker-b')
+        self.assertEqual([claimed.pk for claimed in reclaimed], [queued.pk])
+        self.assertEqual(reclaimed[0].attempts, 2)
+        print("✓ Leases hide claimed tasks until they expire")
+
+    def test_late_finish_after_reclaim_ignored(self):
+        """A worker whose lease was taken over should not overwrite the new claim."""
+        enqueue('tests.record', value=4)
+        [stale] = claim_tasks('worker-a')
+        Task.objects.filter(pk=stale.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        [current] = claim_tasks('worker-b')
+
+        run_task(stale)
+
+        current.refresh_from_db()
+        self.assertEqual(current.status, 'RUNNING')
+        self.assertEqual(current.locked_by, 'worker-b')
+        print("✓ Late finish from an expired lease ignored")
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        """Failing tasks should be retried later and marked FAILED after max_attempts."""
+        queued = enqueue('tests.fail', max_attempts=2, value=5)
+
+        run_pending('worker-a')
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'QUEUED')
+        self.assertGreater(queued.run_after, timezone.now())
+        self.assertIn("failed on 5", queued.last_error)
+        self.assertEqual(run_pending('worker-a'), 0)
+
+        Task.objects.filter(pk=queued.pk).update(run_after=timezone.now())
+        run_pending('worker-a')
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'FAILED')
+        self.assertEqual(queued.attempts, 2)
+        self.assertFalse(queued.in_progress)
+        print("✓ Failed tasks retried with backoff, then marked FAILED")
+
+    def test_lease_expired_on_final_attempt_fails(self):
+        """A task whose last allowed attempt lost its lease should fail without running."""
+        queued = enqueue('tests.record', max_attempts=1, value=6)
+        claim_tasks('worker-a')
+        Task.objects.filter(pk=queued.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        run_pending('worker-b')
+
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'FAILED')
+        self.assertEqual(calls, [])
+        print("✓ Expired final attempt marked FAILED")
+
+    def test_compare_and_swap_claim_loses_race(self):
+        """Without SKIP LOCKED, a row claimed between read and update should be skipped."""
+        queued = enqueue('tests.record', value=7)
+        claimable = queue._claimable
+        lookups = []
+
+        def claimed_in_between(now):
+            if lookups:
+                Task.objects.filter(pk=queued.pk).update(
+                    status='RUNNING', locked_by='worker-b', attempts=F('attempts') + 1,
+                    locked_until=now + timedelta(minutes=5),
+                )
+            lookups.append(now)
+            return claimable(now)
+
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', False), \
+                mock.patch('taskqueue.queue._claimable', side_effect=claimed_in_between):
+            self.assertEqual(claim_tasks('worker-a'), [])
+        self.assertEqual(Task.objects.get().locked_by, 'worker-b')
+        print("✓ Compare-and-swap claim skips rows taken by another worker")
+
+    def test_worker_command_drains_queue(self):
+        """run_task_worker --once should run every due task and exit."""
+        for value in range(3):
+            enqueue('tests.record', value=value)
+        out = StringIO()
+
+        call_command('run_task_worker', '--once', '--batch-size', '2', stdout=out)
+
+        self.assertEqual(sorted(calls), [0, 1, 2])
+        self.assertIn("ran 3 task(s)", out.getvalue())
+        print("✓ Worker command drains the queue")
@@ -21,6 +21,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'merchants',
     'screening',
+    'taskqueue',
 ]
 
 MIDDLEWARE = [
@@ -88,6 +89,21 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Background tasks run inline unless workers are deployed with
+# `python manage.py run_task_worker`, in which case set this to False
+TASK_QUEUE_EAGER = True
+TASK_VISIBILITY_TIMEOUT = 300
+
+# Serve dashboard counts from counters maintained on every merchant write
+# instead of aggregating merchants per page load. Run
+# `python manage.py reconcile_dashboard_counters` after turning this on
+DASHBOARD_COUNTERS = False
+
+# Seconds a dashboard live-update stream stays open before the browser
+# reconnects and is sent a fresh snapshot. Each open stream holds a server
+# thread for this long.
+DASHBOARD_EVENTS_MAX_SECONDS = 60
+
 # Logging for audit trail
 LOGGING = {
     'version': 1,
@@ -121,5 +137,10 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'taskqueue': {
+            'handlers': ['file', 'console'],
+            'level': 'INFO',
+            'propagate': True,
+        },
     },
 }